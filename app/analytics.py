@@ -0,0 +1,218 @@
+# app/analytics.py
+#
+# Cross-user equipment usage, to guide catalog curation. Rather than walking
+# every user's subcollections, it scans the workouts, workout_archive and
+# exercise_stats collection groups. Each scan is split with get_partitions()
+# into up to --partitions ranges of the document name space, read in
+# parallel into per-partition tallies that are merged at the end:
+#
+#   brand        sets / exercise logs / workouts / users per machine brand
+#   machine      the same per brand + exercise
+#   attachment   the same per cable attachment
+#   exercise     the same per exercise, whatever the equipment
+#   stats        users with an exercise_stats doc per key, and how many of
+#                them updated it in the last ACTIVE_DAYS days
+#
+# The TOP_N rows of each table go to one summary doc, analytics/usage, which
+# the Admin page reads with a single get. Archive bundles kept on disk
+# (TERRAPUMP_ARCHIVE_DIR) aren't in Firestore, so they aren't counted.
+#
+#   python -m app.analytics
+#   python -m app.analytics --partitions 16 --top 100
+
+import argparse
+import datetime
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from firebase_admin import firestore
+from .archive import COLLECTION as ARCHIVE_COLLECTION, unpack
+from .firebase_config import db
+from .resilience import call_with_retry
+from .workout_log import workout_items
+
+PARTITIONS = int(os.environ.get("TERRAPUMP_ANALYTICS_PARTITIONS", "8"))
+TOP_N = 50
+ACTIVE_DAYS = 30
+SUMMARY = ("analytics", "usage")
+TABLES = ("brand", "machine", "attachment", "exercise")
+
+
+def summary_ref(db):
+    return db.collection(SUMMARY[0]).document(SUMMARY[1])
+
+
+def _uid(snap) -> str:
+    # users/{uid}/<group>/{doc}
+    return snap.reference.parent.parent.id
+
+# --- Partitioned scans ---
+
+def partitions(db, group: str, count: int) -> list[tuple]:
+    # [(start_ref | None, end_ref | None)]; one PartitionQuery RPC
+    parts = call_with_retry(
+        lambda t: list(db.collection_group(group).get_partitions(count, retry=None, timeout=t)), "read")
+    return [(p.start_at, p.end_at) for p in parts] or [(None, None)]
+
+
+def _partition_query(db, group: str, start, end):
+    q = db.collection_group(group).order_by("__name__")
+    if start is not None:
+        q = q.start_at([start])
+    if end is not None:
+        q = q.end_before([end])
+    return q
+
+
+def scan(db, group: str, fold, new_tally, count: int = PARTITIONS) -> list:
+    # fold(tally, snapshot) over every doc of the group, one tally per partition
+    bounds = partitions(db, group, count)
+
+    def run(bound):
+        tally = new_tally()
+        for snap in _partition_query(db, group, *bound).stream():
+            fold(tally, snap)
+        return tally
+
+    with ThreadPoolExecutor(max_workers=min(len(bounds), count) or 1,
+                            thread_name_prefix=f"terrapump-scan-{group}") as pool:
+        return list(pool.map(run, bounds))
+
+# --- Tallies ---
+
+def _usage_tally() -> dict:
+    # table -> name -> {"sets", "logs", "workouts", "users"}, plus the
+    # same counters over everything under "*"
+    tally = {t: defaultdict(lambda: {"sets": 0, "logs": 0, "workouts": 0, "users": set()}) for t in TABLES}
+    tally["*"] = {"sets": 0, "logs": 0, "workouts": 0, "users": set()}
+    return tally
+
+
+def _fold_workout(tally: dict, uid: str, workout: dict):
+    items = workout_items(workout)
+    total = tally["*"]
+    total["workouts"] += 1
+    total["users"].add(uid)
+    seen = set()
+    for item in items:
+        total["sets"] += item.sets
+        total["logs"] += 1
+        attachment = item.attachment if item.attachment and item.attachment.lower() != "none" else None
+        names = {"exercise": item.exercise}
+        if item.brand:
+            names |= {"brand": item.brand, "machine": f"{item.brand} · {item.exercise}"}
+        if attachment:
+            names["attachment"] = attachment
+        for table, name in names.items():
+            if not name:
+                continue
+            row = tally[table][name]
+            row["sets"] += item.sets
+            row["logs"] += 1
+            row["users"].add(uid)
+            if (table, name) not in seen:
+                seen.add((table, name))
+                row["workouts"] += 1
+
+
+def _fold_hot(tally, snap):
+    _fold_workout(tally, _uid(snap), snap.to_dict() or {})
+
+
+def _fold_archive(tally, snap):
+    uid = _uid(snap)
+    for workout in unpack(snap.to_dict() or {}).values():
+        _fold_workout(tally, uid, workout)
+
+
+def _stats_tally() -> dict:
+    return defaultdict(lambda: {"users": set(), "active": set()})
+
+
+def _fold_stats(since: datetime.datetime):
+    def fold(tally, snap):
+        data, uid = snap.to_dict() or {}, _uid(snap)
+        row = tally[snap.id]
+        row["users"].add(uid)
+        updated = data.get("updated_at")
+        if isinstance(updated, datetime.datetime):
+            if updated.tzinfo is None:
+                updated = updated.replace(tzinfo=datetime.timezone.utc)
+            if updated >= since:
+                row["active"].add(uid)
+    return fold
+
+
+def _merge(tallies: list[dict]) -> dict:
+    out = defaultdict(lambda: {"users": set()})
+    for tally in tallies:
+        for name, row in tally.items():
+            acc = out[name]
+            for k, v in row.items():
+                if isinstance(v, set):
+                    acc.setdefault(k, set()).update(v)
+                else:
+                    acc[k] = acc.get(k, 0) + v
+    return out
+
+
+def _top(rows: dict, top: int, sort_by: str) -> list[dict]:
+    flat = [{"name": name, **{k: len(v) if isinstance(v, set) else v for k, v in row.items()}}
+            for name, row in rows.items()]
+    flat.sort(key=lambda r: (-r[sort_by], r["name"]))
+    return flat[:top]
+
+# --- Job ---
+
+def compute_usage(db, count: int = PARTITIONS, top: int = TOP_N, now: datetime.datetime | None = None) -> dict:
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    t0 = time.perf_counter()
+    hot = scan(db, "workouts", _fold_hot, _usage_tally, count)
+    archived = scan(db, ARCHIVE_COLLECTION, _fold_archive, _usage_tally, count)
+    stats = scan(db, "exercise_stats", _fold_stats(now - datetime.timedelta(days=ACTIVE_DAYS)), _stats_tally, count)
+    usage = hot + archived
+
+    summary = {t: _top(_merge([u[t] for u in usage]), top, "sets") for t in TABLES}
+    summary["stats"] = _top(_merge(stats), top, "users")
+    totals = _merge([{"*": u["*"]} for u in usage]).get("*", {"users": set()})
+    summary["totals"] = {
+        "users":     len(totals["users"]),
+        "workouts":  totals.get("workouts", 0),
+        "logs":      totals.get("logs", 0),
+        "sets":      totals.get("sets", 0),
+        "exercises": len(set().union(*(u["exercise"] for u in usage))),
+    }
+    summary["partitions"] = {"workouts": len(hot), ARCHIVE_COLLECTION: len(archived), "exercise_stats": len(stats)}
+    summary["seconds"] = round(time.perf_counter() - t0, 2)
+    return summary
+
+
+def run_analytics(db, count: int = PARTITIONS, top: int = TOP_N) -> dict:
+    summary = compute_usage(db, count, top)
+    summary_ref(db).set(summary | {"computed_at": firestore.SERVER_TIMESTAMP})
+    return summary
+
+
+def load_summary(db) -> dict | None:
+    doc = summary_ref(db).get()
+    return doc.to_dict() if doc.exists else None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Cross-user equipment usage for the Admin page")
+    ap.add_argument("--partitions", type=int, default=PARTITIONS, help="parallel partitions per collection group")
+    ap.add_argument("--top", type=int, default=TOP_N, help="rows kept per table")
+    args = ap.parse_args(argv)
+    summary = run_analytics(db, args.partitions, args.top)
+    t = summary["totals"]
+    print(f"{t['users']} users · {t['workouts']} workouts · {t['sets']} sets · {t['exercises']} exercises "
+          f"in {summary['seconds']}s")
+    print("  partitions: " + ", ".join(f"{g} {n}" for g, n in summary["partitions"].items()))
+    for table in TABLES:
+        head = ", ".join(f"{r['name']} ({r['sets']})" for r in summary[table][:5])
+        print(f"  {table:<11}{head}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+# app/api.py
+#
+# Headless JSON API next to the Streamlit app, for clients that only need a
+# slice of the data (a phone shortcut logging today's weight shouldn't pay
+# for a page rerun and a full entries load). Runs on Tornado, which ships
+# with Streamlit, and reuses the same data functions and shared cache:
+#
+#   GET   /api/v1/health
+#   GET   /api/v1/entries?since=&until=&limit=&cursor=   newest first
+#   GET   /api/v1/entries/<YYYY-MM-DD>
+#   PUT   /api/v1/entries/<YYYY-MM-DD>                    replace the day
+#   PATCH /api/v1/entries/<YYYY-MM-DD>                    merge fields
+#   GET   /api/v1/workouts?limit=&cursor=                 headers, newest first
+#   GET   /api/v1/workouts/active
+#   GET   /api/v1/workouts/<id>                           hot or archived
+#   GET   /api/v1/stats?limit=&cursor=                    recently updated first
+#   GET   /api/v1/stats/<key>
+#
+# Every call but /health needs "Authorization: Bearer <Firebase ID token>"
+# (the fake backend's "fake-<uid>" tokens in tests/test_api.py). GET
+# responses carry an ETag and answer a matching If-None-Match with 304.
+# Calls are charged to the user's read / write budget (budget.py): over
+# it, a call answers 429 with Retry-After, or saved data flagged with
+# X-TerraPump-Stale. Lists return {"items": [...], "next_cursor": ...};
+# pass next_cursor back for the next page. Workout and stats cursors are
+# opaque (timestamp, doc id) pairs, so docs sharing a timestamp aren't
+# skipped between pages; bytes fields come back base64-encoded.
+#
+# Writes invalidate entries/<uid> in the shared cache, which only reaches
+# the Streamlit process through a backend both can see: run both with the
+# same TERRAPUMP_CACHE_URL (file://, diskcache:// or redis://). The API
+# refuses to start on memory:// unless --standalone says nothing else
+# serves this data.
+#
+#   TERRAPUMP_CACHE_URL=redis://localhost:6379/0 python -m app.api --port 8600
+
+import argparse
+import asyncio
+import base64
+import binascii
+import datetime
+import json
+import os
+import firebase_admin.auth
+import firebase_admin.exceptions
+import tornado.web
+from firebase_admin import firestore
+from .archive import find_archived
+from .budget import BudgetExceeded, budget_scope, pop_throttled
+from .entries_store import fetch_entry_window, save_entry
+from .entry_windows import get_entry_windows
+from .firebase_config import BACKEND, auth, db
+from .shared_cache import get_shared_cache, invalidate
+from .utils import fetch_entry_rows_cached
+from .workout_log import WorkoutLog, workout_entries
+
+API_PORT = int(os.environ.get("TERRAPUMP_API_PORT", "8600"))
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+ENTRY_FIELDS = {
+    "Weight": float, "Calories": int, "Protein": int, "Carbs": int, "Fats": int,
+    "Steps": int, "Training": str, "Cardio": int, "SleepHours": float,
+}
+
+
+def verify_token(token: str) -> str:
+    # -> uid; raises ValueError on a bad or expired token
+    if BACKEND == "firebase":
+        try:
+            return firebase_admin.auth.verify_id_token(token)["uid"]
+        except firebase_admin.exceptions.FirebaseError as e:
+            raise ValueError(str(e)) from e
+    return auth.verify_id_token(token)["uid"]
+
+
+def _jsonable(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    return value
+
+
+def _date(value: str) -> str:
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise tornado.web.HTTPError(400, reason=f"bad date: {value!r}")
+
+
+def _cursor(value: str) -> tuple[datetime.datetime, str]:
+    # next_cursor of list_workouts / list_stats -> (timestamp, doc id)
+    try:
+        ts, doc_id = json.loads(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)))
+        return datetime.datetime.fromisoformat(ts), str(doc_id)
+    except (TypeError, ValueError, binascii.Error):
+        raise tornado.web.HTTPError(400, reason="bad cursor")
+
+
+def _cursor_of(field: str, id_key: str):
+    def cursor_of(item: dict) -> str:
+        raw = json.dumps([_jsonable(item.get(field)), item[id_key]], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode("ascii").rstrip("=")
+    return cursor_of
+
+
+def _page(items: list, limit: int, cursor_of) -> dict:
+    # items already fetched with limit + 1
+    more = len(items) > limit
+    items = items[:limit]
+    return {"items": items, "next_cursor": cursor_of(items[-1]) if more and items else None}
+
+
+def _user_ref(uid: str):
+    return db.collection("users").document(uid)
+
+# --- Data (blocking; handlers run these on the executor) ---
+
+def list_entries(uid: str, since: str | None, until: str | None, limit: int, cursor: str | None) -> dict:
+    if since or until:
+        rows = get_entry_windows().rows(uid, since, until)
+    else:
+        rows = fetch_entry_rows_cached(uid)
+    rows = sorted(rows, key=lambda r: str(r.get("Date") or r.get("doc_id"))[:10], reverse=True)
+    if cursor:
+        rows = [r for r in rows if str(r.get("Date") or r.get("doc_id"))[:10] < cursor]
+    return _page(rows[:limit + 1], limit, lambda r: str(r.get("Date") or r.get("doc_id"))[:10])
+
+
+def get_entry(uid: str, date_str: str) -> dict | None:
+    rows = fetch_entry_window(uid, date_str, date_str)
+    return rows[0] if rows else None
+
+
+def put_entry(uid: str, date_str: str, fields: dict, merge: bool) -> dict:
+    current = (get_entry(uid, date_str) or {}) if merge else {}
+    payload = {k: v for k, v in current.items() if k in ENTRY_FIELDS} | fields
+    payload |= {"Date": date_str, "timestamp": firestore.SERVER_TIMESTAMP}
+    save_entry(uid, date_str, payload)
+    invalidate(f"entries/{uid}")
+    return {k: v for k, v in payload.items() if k != "timestamp"}
+
+
+def list_workouts(uid: str, limit: int, cursor: tuple | None) -> dict:
+    q = (_user_ref(uid).collection("workouts")
+         .order_by("start", direction=firestore.Query.DESCENDING)
+         .order_by("__name__", direction=firestore.Query.DESCENDING).select(["name", "start"]))
+    if cursor:
+        q = q.start_after({"start": cursor[0], "__name__": cursor[1]})
+    items = [{"id": d.id, **(d.to_dict() or {})} for d in q.limit(limit + 1).stream()]
+    return _page(items, limit, _cursor_of("start", "id"))
+
+
+def get_workout(uid: str, workout_id: str) -> dict | None:
+    doc = _user_ref(uid).collection("workouts").document(workout_id).get()
+    if doc.exists:
+        w, archived = doc.to_dict() or {}, False
+    else:
+        w = find_archived(_user_ref(uid), workout_id)
+        if w is None:
+            return None
+        archived = True
+    return {"id": workout_id, "name": w.get("name"), "start": w.get("start"),
+            "archived": archived, "exercises": workout_entries(w)}
+
+
+def get_active_workout(uid: str) -> dict | None:
+    doc = _user_ref(uid).get()
+    log = WorkoutLog.decode((doc.to_dict() or {}).get("active_log")) if doc.exists else None
+    if log is None:
+        return None
+    return {"name": log.name, "start": log.start_dt, "exercises": log.entries()}
+
+
+def list_stats(uid: str, limit: int, cursor: tuple | None) -> dict:
+    q = (_user_ref(uid).collection("exercise_stats")
+         .order_by("updated_at", direction=firestore.Query.DESCENDING)
+         .order_by("__name__", direction=firestore.Query.DESCENDING))
+    if cursor:
+        q = q.start_after({"updated_at": cursor[0], "__name__": cursor[1]})
+    items = [{"key": d.id, **(d.to_dict() or {})} for d in q.limit(limit + 1).stream()]
+    return _page(items, limit, _cursor_of("updated_at", "key"))
+
+
+def get_stats(uid: str, key: str) -> dict | None:
+    doc = _user_ref(uid).collection("exercise_stats").document(key).get()
+    return {"key": key, **(doc.to_dict() or {})} if doc.exists else None
+
+# --- Handlers ---
+
+class ApiHandler(tornado.web.RequestHandler):
+    # GETs get Tornado's ETag handling: compute_etag() hashes the body and
+    # finish() turns a matching If-None-Match into a 304
+    uid = None
+
+    def set_default_headers(self):
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.set_header("Cache-Control", "private, no-cache")
+
+    def prepare(self):
+        header = self.request.headers.get("Authorization", "")
+        if not header.startswith("Bearer "):
+            raise tornado.web.HTTPError(401, reason="missing bearer token")
+        try:
+            self.uid = verify_token(header[len("Bearer "):].strip())
+        except ValueError:
+            raise tornado.web.HTTPError(401, reason="invalid token")
+
+    async def call(self, fn, *args):
+        # runs fn on the executor, charged to this user's read / write budget
+        def scoped():
+            with budget_scope(self.uid):
+                pop_throttled()
+                return fn(*args), pop_throttled()
+        try:
+            result, throttled = await asyncio.get_running_loop().run_in_executor(None, scoped)
+        except BudgetExceeded as e:
+            raise tornado.web.HTTPError(429, reason=str(e)) from e
+        if throttled:
+            # over budget, answered from saved data
+            self.set_header("X-TerraPump-Stale", ",".join(sorted(throttled)))
+        return result
+
+    def send(self, obj, status: int = 200):
+        if obj is None:
+            raise tornado.web.HTTPError(404)
+        self.set_status(status)
+        self.finish(json.dumps(_jsonable(obj), separators=(",", ":"), sort_keys=True))
+
+    def limit(self) -> int:
+        try:
+            return max(1, min(int(self.get_query_argument("limit", str(DEFAULT_LIMIT))), MAX_LIMIT))
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="bad limit")
+
+    def body(self) -> dict:
+        try:
+            data = json.loads(self.request.body or b"{}")
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="body is not JSON")
+        if not isinstance(data, dict):
+            raise tornado.web.HTTPError(400, reason="body must be an object")
+        return data
+
+    def write_error(self, status_code, **kwargs):
+        cause = getattr(kwargs.get("exc_info", (None, None, None))[1], "__cause__", None)
+        if isinstance(cause, BudgetExceeded):
+            self.set_header("Retry-After", str(int(cause.retry_after) + 1))
+        self.finish(json.dumps({"error": self._reason, "status": status_code}))
+
+
+class NotFoundHandler(ApiHandler):
+    def prepare(self):
+        raise tornado.web.HTTPError(404)
+
+
+class HealthHandler(ApiHandler):
+    def prepare(self):
+        pass
+
+    def get(self):
+        self.send({"ok": True, "backend": BACKEND})
+
+
+class EntriesHandler(ApiHandler):
+    async def get(self):
+        since, until = self.get_query_argument("since", None), self.get_query_argument("until", None)
+        cursor = self.get_query_argument("cursor", None)
+        self.send(await self.call(
+            list_entries, self.uid, since and _date(since), until and _date(until),
+            self.limit(), cursor and _date(cursor)))
+
+
+class EntryHandler(ApiHandler):
+    async def get(self, date_str):
+        self.send(await self.call(get_entry, self.uid, _date(date_str)))
+
+    def _fields(self) -> dict:
+        fields = {}
+        for k, v in self.body().items():
+            if k not in ENTRY_FIELDS:
+                raise tornado.web.HTTPError(400, reason=f"unknown field: {k}")
+            try:
+                fields[k] = ENTRY_FIELDS[k](v)
+            except (TypeError, ValueError):
+                raise tornado.web.HTTPError(400, reason=f"bad value for {k}")
+        return fields
+
+    async def put(self, date_str):
+        self.send(await self.call(put_entry, self.uid, _date(date_str), self._fields(), False))
+
+    async def patch(self, date_str):
+        self.send(await self.call(put_entry, self.uid, _date(date_str), self._fields(), True))
+
+
+class WorkoutsHandler(ApiHandler):
+    async def get(self):
+        cursor = self.get_query_argument("cursor", None)
+        self.send(await self.call(list_workouts, self.uid, self.limit(), cursor and _cursor(cursor)))
+
+
+class ActiveWorkoutHandler(ApiHandler):
+    async def get(self):
+        self.send(await self.call(get_active_workout, self.uid))
+
+
+class WorkoutHandler(ApiHandler):
+    async def get(self, workout_id):
+        self.send(await self.call(get_workout, self.uid, workout_id))
+
+
+class StatsListHandler(ApiHandler):
+    async def get(self):
+        cursor = self.get_query_argument("cursor", None)
+        self.send(await self.call(list_stats, self.uid, self.limit(), cursor and _cursor(cursor)))
+
+
+class StatsHandler(ApiHandler):
+    async def get(self, key):
+        self.send(await self.call(get_stats, self.uid, key))
+
+
+def make_app() -> tornado.web.Application:
+    return tornado.web.Application([
+        (r"/api/v1/health", HealthHandler),
+        (r"/api/v1/entries", EntriesHandler),
+        (r"/api/v1/entries/([0-9-]+)", EntryHandler),
+        (r"/api/v1/workouts", WorkoutsHandler),
+        (r"/api/v1/workouts/active", ActiveWorkoutHandler),
+        (r"/api/v1/workouts/([^/]+)", WorkoutHandler),
+        (r"/api/v1/stats", StatsListHandler),
+        (r"/api/v1/stats/([^/]+)", StatsHandler),
+    ], default_handler_class=NotFoundHandler)
+
+
+async def serve(port: int):
+    make_app().listen(port)
+    print(f"TerraPump API on :{port} ({BACKEND} backend)")
+    await asyncio.Event().wait()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="TerraPump headless JSON API")
+    ap.add_argument("--port", type=int, default=API_PORT)
+    ap.add_argument("--standalone", action="store_true",
+                    help="allow a process-local cache (no Streamlit app serves the same data)")
+    args = ap.parse_args(argv)
+    if not get_shared_cache().backend.shared and not args.standalone:
+        ap.error("TERRAPUMP_CACHE_URL is process-local, so saves here would not reach the Streamlit "
+                 "app's cache; point both at a shared backend (file://, diskcache://, redis://) "
+                 "or pass --standalone")
+    asyncio.run(serve(args.port))
+
+
+if __name__ == "__main__":
+    main()
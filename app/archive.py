@@ -0,0 +1,382 @@
+# app/archive.py
+#
+# Cold storage for old workouts. archive_user() moves workouts that started
+# before a cutoff out of users/{uid}/workouts into compressed bundles, one
+# per year (split into parts when a year doesn't fit in one document):
+#
+#   {"year": 2023, "part": 0, "codec": "gzip", "count": 187,
+#    "index": [{"id", "name", "start"}, ...],   # listed without unpacking
+#    "data":  <codec-compressed JSON {workout_id: workout doc}>,
+#    "archived_at": ...}
+#
+# Bundles live in users/{uid}/workout_archive/{year}-{part}, or, with
+# TERRAPUMP_ARCHIVE_DIR set, as JSON files under <dir>/<uid>/ (bytes and
+# datetimes tagged the way the packed data is). A summary doc,
+# users/{uid}/rollups/archive ({"bundles": {bundle_id: count}, "count"}),
+# is written in the same batch as each bundle, so counting the archive and
+# finding a year's bundles is a single small get however many years it
+# spans. Indexes stay in their bundles (one doc holding them all would
+# outgrow Firestore's 1 MiB): listing reads the "index" field of every
+# bundle in one query, opening an archived workout only its year's.
+# Past Workouts lists those indexes next to the hot collection and unpacks
+# a bundle only when an archived workout is opened. list_archived_cached()
+# keeps the listing in the shared cache under "workouts/<uid>", which
+# archiving and deletes invalidate.
+#
+# TERRAPUMP_ARCHIVE_CODEC: gzip (default) or zstd (pip install zstandard).
+#
+#   python -m app.worker --all --tasks archive --archive-days 365
+
+import base64
+import datetime
+import gzip
+import json
+import os
+from .firebase_config import db
+from .shared_cache import invalidate, shared_cached
+from .workout_log import from_epoch, to_epoch
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get("TERRAPUMP_ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_DIR = os.environ.get("TERRAPUMP_ARCHIVE_DIR", "")
+ARCHIVE_CODEC = os.environ.get("TERRAPUMP_ARCHIVE_CODEC", "gzip").lower()
+# Firestore caps documents at 1 MiB; leave room for the index
+MAX_BUNDLE_BYTES = 700_000
+COLLECTION = "workout_archive"
+SUMMARY_DOC = ("rollups", "archive")
+BATCH_LIMIT = 400
+
+# --- Codecs ---
+
+def _zstd():
+    import zstandard
+    return zstandard
+
+
+def compress(raw: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=10).compress(raw)
+    return gzip.compress(raw, compresslevel=9)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return _zstd().ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _default_codec() -> str:
+    if ARCHIVE_CODEC == "zstd":
+        try:
+            _zstd()
+            return "zstd"
+        except ImportError:
+            pass
+    return "gzip"
+
+# workout docs hold datetimes and the packed set bytes; JSON tags them
+
+def _to_json(value):
+    if isinstance(value, bytes):
+        return {"$b": base64.b64encode(value).decode()}
+    if isinstance(value, datetime.datetime):
+        return {"$t": value.isoformat()}
+    if isinstance(value, dict):
+        return {k: _to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    return value
+
+
+def _from_json(value):
+    if isinstance(value, dict):
+        if "$b" in value and len(value) == 1:
+            return base64.b64decode(value["$b"])
+        if "$t" in value and len(value) == 1:
+            return datetime.datetime.fromisoformat(value["$t"])
+        return {k: _from_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_from_json(v) for v in value]
+    return value
+
+
+def pack(workouts: dict[str, dict], codec: str) -> bytes:
+    raw = json.dumps(_to_json(workouts), separators=(",", ":")).encode()
+    return compress(raw, codec)
+
+
+def unpack(bundle: dict) -> dict[str, dict]:
+    return _from_json(json.loads(decompress(bundle["data"], bundle.get("codec", "gzip"))))
+
+# --- Stores ---
+
+class FirestoreArchive:
+    def __init__(self, user_ref):
+        self.col = user_ref.collection(COLLECTION)
+        self.summary_ref = user_ref.collection(SUMMARY_DOC[0]).document(SUMMARY_DOC[1])
+        self._bundles = None
+
+    def _summary(self) -> dict[str, int]:
+        # bundle_id -> workouts in it
+        if self._bundles is None:
+            doc = self.summary_ref.get()
+            if doc.exists:
+                bundles = (doc.to_dict() or {}).get("bundles", {})
+                # summaries written before they held counts held whole indexes
+                self._bundles = {k: len(v) if isinstance(v, list) else int(v) for k, v in bundles.items()}
+            else:
+                # archived before the summary doc existed; the next write adds it
+                self._bundles = {d.id: int((d.to_dict() or {}).get("count", 0))
+                                 for d in self.col.select(["count"]).stream()}
+        return self._bundles
+
+    def bundle_ids(self) -> list[str]:
+        return sorted(self._summary())
+
+    def index(self, bundle_id: str) -> list[dict]:
+        doc = self.col.document(bundle_id).get(["index"])
+        return (doc.to_dict() or {}).get("index", []) if doc.exists else []
+
+    def indexes(self) -> dict[str, list[dict]]:
+        return {d.id: (d.to_dict() or {}).get("index", []) for d in self.col.select(["index"]).stream()}
+
+    def counts(self) -> int:
+        return sum(self._summary().values())
+
+    def get(self, bundle_id: str) -> dict | None:
+        doc = self.col.document(bundle_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def _write(self, bundle_id: str, bundle: dict | None):
+        bundles = {k: v for k, v in self._summary().items() if k != bundle_id}
+        if bundle is not None:
+            bundles[bundle_id] = len(bundle["index"])
+        batch = db.batch()
+        if bundle is None:
+            batch.delete(self.col.document(bundle_id))
+        else:
+            batch.set(self.col.document(bundle_id), bundle)
+        batch.set(self.summary_ref, {"bundles": bundles, "count": sum(bundles.values()),
+                                     "updated_at": datetime.datetime.now(datetime.timezone.utc)})
+        batch.commit()
+        self._bundles = bundles
+
+    def put(self, bundle_id: str, bundle: dict):
+        self._write(bundle_id, bundle)
+
+    def delete(self, bundle_id: str):
+        self._write(bundle_id, None)
+
+
+class LocalArchive:
+    # <root>/<uid>/<bundle_id>.bundle, plus index.json for listing
+    def __init__(self, root: str, uid: str):
+        self.dir = os.path.join(root, uid)
+
+    def _path(self, bundle_id: str) -> str:
+        return os.path.join(self.dir, f"{bundle_id}.bundle")
+
+    def _read_index(self) -> dict:
+        try:
+            with open(os.path.join(self.dir, "index.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index: dict):
+        os.makedirs(self.dir, exist_ok=True)
+        path = os.path.join(self.dir, "index.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(f"{path}.tmp", path)
+
+    def bundle_ids(self) -> list[str]:
+        return sorted(self._read_index())
+
+    def index(self, bundle_id: str) -> list[dict]:
+        return self.indexes().get(bundle_id, [])
+
+    def indexes(self) -> dict[str, list[dict]]:
+        return {bid: [e | {"start": _from_json(e["start"])} for e in entries]
+                for bid, entries in self._read_index().items()}
+
+    def counts(self) -> int:
+        return sum(len(v) for v in self._read_index().values())
+
+    def get(self, bundle_id: str) -> dict | None:
+        try:
+            with open(self._path(bundle_id)) as f:
+                return _from_json(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def put(self, bundle_id: str, bundle: dict):
+        os.makedirs(self.dir, exist_ok=True)
+        path = self._path(bundle_id)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(_to_json(bundle), f, separators=(",", ":"))
+        os.replace(f"{path}.tmp", path)
+        self._write_index(self._read_index() | {bundle_id: _to_json(bundle["index"])})
+
+    def delete(self, bundle_id: str):
+        try:
+            os.remove(self._path(bundle_id))
+        except OSError:
+            pass
+        index = self._read_index()
+        index.pop(bundle_id, None)
+        self._write_index(index)
+
+
+def store_for(user_ref):
+    return LocalArchive(ARCHIVE_DIR, user_ref.id) if ARCHIVE_DIR else FirestoreArchive(user_ref)
+
+# --- Bundling ---
+
+def _start_dt(workout: dict) -> datetime.datetime | None:
+    return from_epoch(to_epoch(workout.get("start")))
+
+
+def _index_row(workout_id: str, workout: dict) -> dict:
+    return {"id": workout_id, "name": workout.get("name", "Workout"), "start": workout.get("start")}
+
+
+def _bundles_for_year(year: int, workouts: dict[str, dict], codec: str) -> list[dict]:
+    # halve the year's workouts (in start order) until every part fits
+    ordered = sorted(workouts.items(), key=lambda kv: _start_dt(kv[1]) or datetime.datetime.min)
+    parts = [ordered]
+    while True:
+        packed = [pack(dict(p), codec) for p in parts]
+        if all(len(d) <= MAX_BUNDLE_BYTES for d in packed) or all(len(p) == 1 for p in parts):
+            break
+        parts = [half for p in parts for half in (p[:len(p) // 2], p[len(p) // 2:]) if half]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [{
+        "year": year, "part": i, "codec": codec, "count": len(p),
+        "index": [_index_row(wid, w) for wid, w in p],
+        "data": data, "archived_at": now,
+    } for i, (p, data) in enumerate(zip(parts, packed))]
+
+
+def _year_bundles(bundle_ids, year: int) -> list[str]:
+    return sorted(bid for bid in bundle_ids if bid.split("-")[0] == str(year))
+
+
+def _write_year(store, bundle_ids: list[str], year: int, workouts: dict[str, dict], codec: str):
+    # rewrites every part of `year` from `workouts`, dropping parts left over
+    old = _year_bundles(bundle_ids, year)
+    new = _bundles_for_year(year, workouts, codec) if workouts else []
+    for b in new:
+        store.put(f"{year}-{b['part']:02d}", b)
+    for bid in old[len(new):]:
+        store.delete(bid)
+
+
+def archive_user(db, user_ref, older_than: datetime.datetime, codec: str | None = None) -> dict:
+    # bundles are written before the hot docs are deleted, so an interrupted
+    # run leaves duplicates (the hot copy wins when listing), never gaps
+    codec = codec or _default_codec()
+    store = store_for(user_ref)
+    by_year = {}
+    refs = []
+    for doc in user_ref.collection("workouts").where("start", "<", older_than).stream():
+        w = doc.to_dict() or {}
+        start = _start_dt(w)
+        if start is None:
+            continue
+        by_year.setdefault(start.year, {})[doc.id] = w
+        refs.append(doc.reference)
+    if not refs:
+        return {"archived": 0}
+
+    bundle_ids = store.bundle_ids()
+    for year, workouts in by_year.items():
+        merged = {}
+        for bid in _year_bundles(bundle_ids, year):
+            bundle = store.get(bid)
+            if bundle:
+                merged.update(unpack(bundle))
+        merged.update(workouts)
+        _write_year(store, bundle_ids, year, merged, codec)
+
+    batch, n = db.batch(), 0
+    for ref in refs:
+        batch.delete(ref)
+        n += 1
+        if n == BATCH_LIMIT:
+            batch.commit()
+            batch, n = db.batch(), 0
+    if n:
+        batch.commit()
+    invalidate(f"workouts/{user_ref.id}")
+    return {"archived": len(refs), "years": sorted(by_year)}
+
+
+def archive_cutoff(days: int = ARCHIVE_AFTER_DAYS, now: datetime.datetime | None = None) -> datetime.datetime:
+    return (now or datetime.datetime.now()) - datetime.timedelta(days=days)
+
+# --- Reading ---
+
+def list_archived(user_ref) -> list[dict]:
+    # [{"id", "name", "start", "bundle"}], newest first
+    rows = [row | {"bundle": bid}
+            for bid, index in store_for(user_ref).indexes().items() for row in index]
+    rows.sort(key=lambda r: _start_dt(r) or datetime.datetime.min, reverse=True)
+    return rows
+
+
+@shared_cached(lambda uid: f"workouts/{uid}", ttl=3600)
+def list_archived_cached(uid: str) -> list[dict]:
+    return list_archived(db.collection("users").document(uid))
+
+
+def archived_count(user_ref) -> int:
+    return store_for(user_ref).counts()
+
+
+def find_archived(user_ref, workout_id: str) -> dict | None:
+    # workout ids are the start's isoformat, so only bundles of that year (or
+    # a neighbour, for a start near New Year in another timezone) are opened
+    try:
+        year = datetime.datetime.fromisoformat(workout_id).year
+    except ValueError:
+        return None
+    store = store_for(user_ref)
+    bundle_ids = store.bundle_ids()
+    for y in (year, year - 1, year + 1):
+        for bid in _year_bundles(bundle_ids, y):
+            if any(row["id"] == workout_id for row in store.index(bid)):
+                return load_archived(user_ref, bid, workout_id)
+    return None
+
+
+def load_archived(user_ref, bundle_id: str, workout_id: str) -> dict | None:
+    bundle = store_for(user_ref).get(bundle_id)
+    return unpack(bundle).get(workout_id) if bundle else None
+
+
+def iter_archived(user_ref):
+    # (workout_id, workout doc) for every archived workout
+    store = store_for(user_ref)
+    for bid in store.bundle_ids():
+        bundle = store.get(bid)
+        if bundle:
+            yield from unpack(bundle).items()
+
+
+def delete_archived(user_ref, bundle_id: str, workout_id: str) -> bool:
+    store = store_for(user_ref)
+    bundle = store.get(bundle_id)
+    if not bundle:
+        return False
+    workouts = {}
+    bundle_ids = store.bundle_ids()
+    year = bundle["year"]
+    for bid in _year_bundles(bundle_ids, year):
+        b = bundle if bid == bundle_id else store.get(bid)
+        if b:
+            workouts.update(unpack(b))
+    if workouts.pop(workout_id, None) is None:
+        return False
+    _write_year(store, bundle_ids, year, workouts, bundle.get("codec", "gzip"))
+    invalidate(f"workouts/{user_ref.id}")
+    return True
@@ -0,0 +1,222 @@
+# app/bench.py
+#
+# Micro-benchmarks for the pandas / NumPy data-shaping paths, run on
+# synthetic histories (synthetic.py) from a month to twenty years:
+#
+#   entries_frame     rows -> DataFrame, as fetch_all_entries() builds it
+#   fetch_entries     fetch_entry_rows() + DataFrame against the in-memory
+#                     fake (store read and row assembly included)
+#   series_dict       build_series_dict()
+#   quick_stats       the Quick Stats tiles (last('7D') / ffill + charts)
+#   weight_chart      the Graphs weight frame and chart
+#   weight_trend      the full EWMA / rolling-rate fit (trend.fit)
+#   calendar_chart    the Graphs training calendar
+#
+# Each case records median / p90 wall time over repeated runs and the peak
+# traced allocation of one run. --save appends the results, tagged with the
+# git commit, to TERRAPUMP_BENCH_HISTORY; --compare checks them against the
+# last saved run and exits 1 when a case got slower (or hungrier) than
+# --threshold.
+#
+#   python -m app.bench
+#   python -m app.bench --days 30,365,7300 --cases quick_stats,calendar_chart
+#   python -m app.bench --save --compare --threshold 0.15
+
+import os
+
+# the fake store backs fetch_entries; must be set before app.firebase_config
+os.environ.setdefault("TERRAPUMP_BACKEND", "fake")
+
+import argparse
+import datetime
+import json
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import pandas as pd
+from .charts import build_series_dict, calendar_chart, frame_version, quick_stats, weight_chart
+from .entries_store import fetch_entry_rows
+from .firebase_config import BACKEND, db
+from .trend import fit, weigh_ins
+from .synthetic import synthetic_entries, seed_user
+
+HISTORY = os.environ.get("TERRAPUMP_BENCH_HISTORY", ".terrapump_bench.jsonl")
+DEFAULT_DAYS = (30, 365, 1825, 7300)
+MIN_TIME = 0.2      # seconds of timed runs per case, at least
+MAX_RUNS = 50
+
+# --- Cases: setup(days) -> zero-argument callable to time ---
+
+def _frame(days: int) -> pd.DataFrame:
+    return pd.DataFrame(synthetic_entries(days, seed=days))
+
+
+def _entries_frame(days):
+    rows = synthetic_entries(days, seed=days)
+    return lambda: pd.DataFrame(rows)
+
+
+def _fetch_entries(days):
+    uid = f"bench-{days}"
+    if not db.collection("users").document(uid).get().exists:
+        seed_user(db, uid, f"{uid}@bench.local", days, seed=days)
+    return lambda: pd.DataFrame(fetch_entry_rows(uid))
+
+
+def _series_dict(days):
+    df = _frame(days)
+    return lambda: build_series_dict(df)
+
+
+def _quick_stats(days):
+    series = build_series_dict(_frame(days))
+    # the undecorated builder: st.cache_resource would time a cache hit
+    return lambda: quick_stats.__wrapped__(series, "bench")
+
+
+def _weight_chart(days):
+    df = _frame(days)
+    return lambda: weight_chart.__wrapped__(df, frame_version(df, ["Date", "Weight"]))
+
+
+def _weight_trend(days):
+    df = _frame(days)
+    return lambda: fit(*weigh_ins(df["Date"], df["Weight"]))
+
+
+def _calendar_chart(days):
+    df = _frame(days)
+    return lambda: calendar_chart.__wrapped__(df, frame_version(df, ["Date", "Training"]))
+
+
+CASES = {
+    "entries_frame":  _entries_frame,
+    "fetch_entries":  _fetch_entries,
+    "series_dict":    _series_dict,
+    "quick_stats":    _quick_stats,
+    "weight_chart":   _weight_chart,
+    "weight_trend":   _weight_trend,
+    "calendar_chart": _calendar_chart,
+}
+
+# --- Measuring ---
+
+def measure(fn, min_time: float = MIN_TIME, max_runs: int = MAX_RUNS) -> dict:
+    fn()   # warm-up: imports, lazy caches
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_runs and (len(times) < 3 or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return {
+        "runs":      len(times),
+        "median_ms": round(statistics.median(times), 3),
+        "p90_ms":    round(times[min(int(len(times) * 0.9), len(times) - 1)], 3),
+        "min_ms":    round(times[0], 3),
+        "peak_mb":   round(peak / 1e6, 3),
+    }
+
+
+def run(cases: list[str], days_list: list[int], min_time: float) -> dict:
+    results = {}
+    for name in cases:
+        for days in days_list:
+            key = f"{name}/{days}d"
+            results[key] = measure(CASES[name](days), min_time)
+            r = results[key]
+            print(f"{key:<24}{r['median_ms']:>11.2f}{r['p90_ms']:>11.2f}{r['peak_mb']:>10.2f}{r['runs']:>6}")
+    return results
+
+# --- History and regressions ---
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def load_last(path: str) -> dict | None:
+    try:
+        with open(path) as f:
+            lines = [line for line in f if line.strip()]
+    except OSError:
+        return None
+    return json.loads(lines[-1]) if lines else None
+
+
+def save(path: str, results: dict):
+    record = {
+        "at":      datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit":  _git_commit(),
+        "python":  sys.version.split()[0],
+        "pandas":  pd.__version__,
+        "results": results,
+    }
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def compare(results: dict, previous: dict, threshold: float) -> list[str]:
+    # cases slower / bigger than `previous` by more than `threshold` (0.2 = 20%)
+    regressions = []
+    for key, r in results.items():
+        old = previous["results"].get(key)
+        if not old:
+            continue
+        for metric in ("median_ms", "peak_mb"):
+            if old[metric] > 0 and r[metric] > old[metric] * (1 + threshold):
+                regressions.append(f"{key} {metric}: {old[metric]:.2f} -> {r[metric]:.2f} "
+                                   f"(+{(r[metric] / old[metric] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="TerraPump data-shaping micro-benchmarks")
+    ap.add_argument("--cases", default=",".join(CASES), help=f"comma-separated subset of {','.join(CASES)}")
+    ap.add_argument("--days", default=",".join(map(str, DEFAULT_DAYS)), help="history lengths in days")
+    ap.add_argument("--min-time", type=float, default=MIN_TIME, help="seconds of timed runs per case")
+    ap.add_argument("--save", action="store_true", help=f"append results to the history file ({HISTORY})")
+    ap.add_argument("--compare", action="store_true", help="compare with the last saved run")
+    ap.add_argument("--threshold", type=float, default=0.2, help="regression threshold (0.2 = +20%%)")
+    args = ap.parse_args(argv)
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        ap.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+    if "fetch_entries" in cases and BACKEND != "fake":
+        ap.error("fetch_entries seeds users; run it with TERRAPUMP_BACKEND=fake")
+    days_list = [int(d) for d in args.days.split(",") if d.strip()]
+
+    previous = load_last(HISTORY) if args.compare else None
+    print(f"{'case':<24}{'median ms':>11}{'p90 ms':>11}{'peak MB':>10}{'runs':>6}")
+    results = run(cases, days_list, args.min_time)
+    if args.save:
+        save(HISTORY, results)
+
+    if args.compare:
+        if previous is None:
+            print("no previous run to compare with")
+            return 0
+        regressions = compare(results, previous, args.threshold)
+        print(f"compared with {previous.get('commit') or '?'} ({previous['at']}): "
+              f"{len(regressions)} regression(s)")
+        for line in regressions:
+            print(f"  {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+# app/budget.py
+#
+# Firestore read / write budgets, so one heavy session (Refresh Graphs on
+# repeat, tab hopping) can't run up the bill for everyone. govern() wraps
+# the client like perf.instrument() and resilience.resilient() do; every
+# RPC is charged to token buckets:
+#
+#   per user     the uid of the current budget_scope() (the session's rerun,
+#                an API request, a prefetch thread)
+#   per process  everything, scoped or not
+#
+# Buckets hold a minute's worth of reads or writes plus BURST extra and
+# refill continuously. A call is refused (BudgetExceeded) once a bucket is
+# empty; reads are charged by documents returned (a stream as it yields
+# them, one up front for Firestore's minimum), so one big query can leave
+# a bucket in debt. Loaders with a cached copy (the
+# shared cache's last-good values, entry windows) serve that instead and
+# note it for the sidebar; other calls surface the error. A rate of 0
+# turns that bucket off.
+#
+# A user idle for TERRAPUMP_BUDGET_IDLE seconds whose buckets have filled
+# back up is forgotten (a fresh bucket would be the same), counters
+# included; past TERRAPUMP_BUDGET_MAX_USERS the least recently seen user
+# goes regardless. The process totals are kept.
+#
+#   TERRAPUMP_BUDGET_USER_READS      reads / minute per user (default 600)
+#   TERRAPUMP_BUDGET_USER_WRITES     writes / minute per user (default 120)
+#   TERRAPUMP_BUDGET_PROCESS_READS   reads / minute per process (default 0)
+#   TERRAPUMP_BUDGET_PROCESS_WRITES  writes / minute per process (default 0)
+#   TERRAPUMP_BUDGET_BURST           extra minutes of burst (default 15;
+#                                    a full history load is one big read)
+#   TERRAPUMP_BUDGET_IDLE            seconds before an idle user is dropped
+#                                    (default 900)
+#   TERRAPUMP_BUDGET_MAX_USERS       users tracked at most (default 10000)
+
+import contextlib
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+USER_READS = float(os.environ.get("TERRAPUMP_BUDGET_USER_READS", "600"))
+USER_WRITES = float(os.environ.get("TERRAPUMP_BUDGET_USER_WRITES", "120"))
+PROCESS_READS = float(os.environ.get("TERRAPUMP_BUDGET_PROCESS_READS", "0"))
+PROCESS_WRITES = float(os.environ.get("TERRAPUMP_BUDGET_PROCESS_WRITES", "0"))
+BURST_MINUTES = float(os.environ.get("TERRAPUMP_BUDGET_BURST", "15"))
+IDLE_SECONDS = float(os.environ.get("TERRAPUMP_BUDGET_IDLE", "900"))
+MAX_USERS = int(os.environ.get("TERRAPUMP_BUDGET_MAX_USERS", "10000"))
+PRUNE_INTERVAL = 60
+
+_READS = {"get", "stream"}
+_WRITES = {"set", "update", "delete", "create", "add"}
+_CHAIN = {
+    "collection", "collection_group", "document", "where", "order_by", "limit",
+    "limit_to_last", "offset", "select", "start_at", "start_after", "end_at",
+    "end_before", "count", "sum", "avg",
+}
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, kind: str, scope: str, retry_after: float):
+        self.kind = kind
+        self.scope = scope
+        self.retry_after = retry_after
+        super().__init__(f"{scope} {kind} budget exhausted; retry in {retry_after:.0f}s")
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_minutes: float = BURST_MINUTES):
+        self.rate = per_minute / 60
+        self.capacity = per_minute * (1 + burst_minutes)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def retry_after(self) -> float:
+        # seconds until the bucket is positive again, or 0 if it is
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens > 0 else (1 - self.tokens) / self.rate
+
+    def charge(self, n: float):
+        self._refill(time.monotonic())
+        self.tokens -= n
+
+    def full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class Governor:
+    def __init__(self, user_reads=USER_READS, user_writes=USER_WRITES,
+                 process_reads=PROCESS_READS, process_writes=PROCESS_WRITES,
+                 idle_seconds=IDLE_SECONDS, max_users=MAX_USERS):
+        self.limits = {"user": {"read": user_reads, "write": user_writes},
+                       "process": {"read": process_reads, "write": process_writes}}
+        self.idle_seconds = idle_seconds
+        self.max_users = max_users
+        self._process = {k: TokenBucket(v) for k, v in self.limits["process"].items() if v > 0}
+        self._users = {}       # uid -> {"read": TokenBucket, "write": TokenBucket}
+        self.usage = {}        # uid | "*" -> {"reads", "writes", "denied_reads", "denied_writes"}
+        self._seen = OrderedDict()   # uid -> monotonic time last charged or checked, oldest first
+        self._pruned_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _touch(self, uid: str):
+        now = time.monotonic()
+        self._seen[uid] = now
+        self._seen.move_to_end(uid)
+        while len(self._seen) > self.max_users:
+            self._forget(next(iter(self._seen)))
+        if now - self._pruned_at > PRUNE_INTERVAL:
+            self._pruned_at = now
+            self.prune(now)
+
+    def _forget(self, uid: str):
+        self._seen.pop(uid, None)
+        self._users.pop(uid, None)
+        self.usage.pop(uid, None)
+
+    def prune(self, now: float | None = None) -> int:
+        # drop idle users whose buckets have refilled; called with the lock held
+        now = time.monotonic() if now is None else now
+        idle = []
+        for uid, seen in self._seen.items():
+            if now - seen < self.idle_seconds:
+                break
+            if all(b.full() for b in self._users.get(uid, {}).values()):
+                idle.append(uid)
+        for uid in idle:
+            self._forget(uid)
+        return len(idle)
+
+    def _buckets(self, uid: str | None, kind: str) -> list[tuple[str, TokenBucket]]:
+        found = [("process", self._process[kind])] if kind in self._process else []
+        if uid is not None:
+            self._touch(uid)
+        if uid is not None and self.limits["user"][kind] > 0:
+            user = self._users.get(uid)
+            if user is None:
+                user = self._users[uid] = {k: TokenBucket(v) for k, v in self.limits["user"].items() if v > 0}
+            found.append(("user", user[kind]))
+        return found
+
+    def _count(self, uid: str | None, field: str, n: int = 1):
+        for who in ("*", uid) if uid is not None else ("*",):
+            row = self.usage.setdefault(who, {"reads": 0, "writes": 0, "denied_reads": 0, "denied_writes": 0})
+            row[field] += n
+
+    def check(self, uid: str | None, kind: str):
+        with self._lock:
+            for scope, bucket in self._buckets(uid, kind):
+                wait = bucket.retry_after()
+                if wait > 0:
+                    self._count(uid, f"denied_{kind}s")
+                    raise BudgetExceeded(kind, scope, wait)
+
+    def charge(self, uid: str | None, kind: str, n: int):
+        with self._lock:
+            for _, bucket in self._buckets(uid, kind):
+                bucket.charge(n)
+            self._count(uid, f"{kind}s", n)
+
+    def report(self) -> dict:
+        # {"limits", "process": usage, "users": {uid: usage + tokens left}}
+        with self._lock:
+            users = {}
+            for uid, row in self.usage.items():
+                if uid == "*":
+                    continue
+                buckets = self._users.get(uid, {})
+                users[uid] = row | {f"{k}_left": int(max(b.tokens, 0)) for k, b in buckets.items()}
+            return {"limits": self.limits, "process": dict(self.usage.get("*", {})), "users": users}
+
+
+governor = Governor()
+
+# --- Current user (per thread: a Streamlit rerun, an API call, ...) ---
+
+_scope = threading.local()
+
+
+@contextlib.contextmanager
+def budget_scope(uid: str | None):
+    prev = getattr(_scope, "uid", None)
+    _scope.uid = uid
+    try:
+        yield
+    finally:
+        _scope.uid = prev
+
+
+def current_uid() -> str | None:
+    return getattr(_scope, "uid", None)
+
+# --- Client wrapper ---
+
+def _unwrap(v):
+    return v._target if isinstance(v, _Governed) else v
+
+
+def _charged(uid: str | None, docs):
+    # stream(): the call paid for the first document, the rest as they come
+    for n, doc in enumerate(docs):
+        if n:
+            governor.charge(uid, "read", 1)
+        yield doc
+
+
+def _docs(result) -> int:
+    # Firestore bills a query that matches nothing as one read
+    if isinstance(result, list):
+        return max(len(result), 1)
+    return 1
+
+
+class _Governed:
+    __slots__ = ("_target", "_queued")
+
+    def __init__(self, target, batch=False):
+        self._target = target
+        self._queued = 0 if batch else None
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            args = [_unwrap(a) for a in args]
+            kwargs = {k: _unwrap(v) for k, v in kwargs.items()}
+            uid = current_uid()
+            if self._queued is not None:
+                # batch ops queue locally; the commit pays for all of them
+                if name == "commit":
+                    governor.check(uid, "write")
+                    result = attr(*args, **kwargs)
+                    governor.charge(uid, "write", self._queued)
+                    self._queued = 0
+                    return result
+                self._queued += 1
+                return attr(*args, **kwargs)
+            if name in _READS:
+                governor.check(uid, "read")
+                result = attr(*args, **kwargs)
+                if name == "stream":
+                    governor.charge(uid, "read", 1)
+                    return _charged(uid, result)
+                governor.charge(uid, "read", _docs(result))
+                return result
+            if name in _WRITES:
+                governor.check(uid, "write")
+                result = attr(*args, **kwargs)
+                governor.charge(uid, "write", 1)
+                return result
+            result = attr(*args, **kwargs)
+            if name == "batch":
+                return _Governed(result, batch=True)
+            if name in _CHAIN:
+                return _Governed(result)
+            return result
+        return call
+
+
+def govern(client):
+    return _Governed(client)
+
+# --- Throttled-data notices (per script thread, like resilience.note_stale) ---
+
+_throttled = threading.local()
+
+
+def note_throttled(source: str):
+    if not hasattr(_throttled, "sources"):
+        _throttled.sources = set()
+    _throttled.sources.add(source)
+
+
+def is_throttled(source: str) -> bool:
+    return source in getattr(_throttled, "sources", set())
+
+
+def pop_throttled() -> set[str]:
+    sources = getattr(_throttled, "sources", set())
+    _throttled.sources = set()
+    return sources
+
+
+def last_good(source: str, max_entries: int = 1024):
+    # for loaders outside the shared cache: remember each call's last result
+    # and serve it (noting `source`) when the call is over budget
+    def deco(fn):
+        values = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            try:
+                value = fn(*args)
+            except BudgetExceeded:
+                with lock:
+                    if args not in values:
+                        raise
+                    value = values[args]
+                note_throttled(source)
+                return value
+            with lock:
+                values[args] = value
+                values.move_to_end(args)
+                while len(values) > max_entries:
+                    values.popitem(last=False)
+            return value
+        return wrapper
+    return deco
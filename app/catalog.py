@@ -0,0 +1,225 @@
+# app/catalog.py
+
+import csv
+import io
+import json
+import pandas as pd
+from firebase_admin import firestore
+from .utils import slugify
+
+# Firestore caps a single batch at 500 writes
+BATCH_LIMIT = 500
+
+CATALOG_COLUMNS = ["kind", "brand", "name", "type", "default_weight", "subtype"]
+# a subtype cell holding only this removes the stored subtype
+CLEAR = "-"
+
+
+class CatalogApplyError(Exception):
+    # a batch failed; `written` changes (the batches before it) are applied
+    def __init__(self, written: int, cause: Exception):
+        self.written = written
+        super().__init__(f"{cause} (after {written} changes)")
+
+# --- Parsing ---
+
+# Rows: kind ("machine"/"exercise"), brand (machines only), name, type,
+# default_weight, subtype. JSON can be a list of rows or
+# {"machines": [...], "exercises": [...]}. A blank or missing type,
+# default_weight or subtype is None: left as stored, defaulted on insert.
+def parse_catalog_file(filename: str, raw: bytes) -> list[dict]:
+    text = raw.decode("utf-8-sig")
+    if filename.lower().endswith(".json"):
+        payload = json.loads(text)
+        if isinstance(payload, dict):
+            records = []
+            for section, kind in (("machines", "machine"), ("exercises", "exercise")):
+                part = payload.get(section, [])
+                if not isinstance(part, list):
+                    raise ValueError(f"'{section}' must be a list of objects")
+                records += [(r, kind) for r in part]
+        elif isinstance(payload, list):
+            records = [(r, None) for r in payload]
+        else:
+            raise ValueError("expected a list of rows or {\"machines\": [...], \"exercises\": [...]}")
+    else:
+        records = [(r, None) for r in csv.DictReader(io.StringIO(text))]
+
+    rows, errors = [], []
+    for n, (rec, section_kind) in enumerate(records, 1):
+        if not isinstance(rec, dict):
+            errors.append(f"row {n}: expected an object, got {type(rec).__name__}")
+            continue
+        rec = {str(k).strip().lower(): v for k, v in rec.items() if k}
+        if section_kind:
+            rec["kind"] = section_kind
+        kind = str(rec.get("kind") or ("machine" if rec.get("brand") else "exercise")).strip().lower()
+        name = str(rec.get("name") or "").strip()
+        brand = str(rec.get("brand") or "").strip()
+        if kind not in ("machine", "exercise"):
+            errors.append(f"row {n}: unknown kind '{kind}'")
+            continue
+        if not name:
+            errors.append(f"row {n}: missing name")
+            continue
+        if kind == "machine" and not brand:
+            errors.append(f"row {n}: machine '{name}' has no brand")
+            continue
+        try:
+            wt = _cell(rec.get("default_weight"))
+            wt = float(wt) if wt is not None else None
+        except (TypeError, ValueError):
+            errors.append(f"row {n}: bad default_weight '{rec.get('default_weight')}'")
+            continue
+        subtype = _cell(rec.get("subtype"))
+        rows.append({
+            "kind":           kind,
+            "brand":          brand,
+            "name":           name,
+            "type":           _cell(rec.get("type")),
+            "default_weight": wt,
+            "subtype":        subtype.lower() if subtype is not None else None,
+        })
+    if errors:
+        raise ValueError("; ".join(errors))
+    return rows
+
+
+def _cell(value) -> str | None:
+    # stripped text, or None for a blank / missing cell
+    text = str(value).strip() if value is not None else ""
+    return text or None
+
+# --- Snapshot of what's in Firestore now ---
+
+def load_catalog_snapshot(db) -> dict:
+    brands = {b.id: (b.to_dict() or {}) for b in db.collection("brands").stream()}
+    machines = {}
+    # one collection-group query instead of a stream per brand
+    for m in db.collection_group("machines").stream():
+        parent = m.reference.parent.parent
+        if parent is None or parent.id not in brands:
+            continue
+        machines[(parent.id, m.id)] = m.to_dict() or {}
+    library = {d.id: (d.to_dict() or {}) for d in db.collection("exercise_library").stream()}
+    return {"brands": brands, "machines": machines, "library": library}
+
+# --- Diffing ---
+
+def _payload(row: dict, insert: bool) -> dict:
+    # only the cells the row fills in; an insert gets the old defaults for the rest
+    machine = row["kind"] == "machine"
+    payload = {"name": row["name"]}
+    if row["type"] is not None or insert:
+        payload["type"] = row["type"] or ("Machine" if machine else "")
+    if row["default_weight"] is not None or insert:
+        payload["default_starting_weight" if machine else "default_weight"] = row["default_weight"] or 0.0
+    if row["subtype"] not in (None, CLEAR):
+        payload["subtype"] = row["subtype"]
+    return payload
+
+
+def _changed_fields(new: dict, old: dict) -> list[str]:
+    changed = []
+    for k, v in new.items():
+        cur = old.get(k)
+        if isinstance(v, float):
+            try:
+                if cur is not None and float(cur) == v:
+                    continue
+            except (TypeError, ValueError):
+                pass
+        elif cur == v:
+            continue
+        changed.append(k)
+    return changed
+
+
+# Each change is {"op": insert|update|delete, "path", "data", "fields"}, keyed
+# by slugify ids; unchanged docs are left out. Deletes are opt-in and only
+# inside brands (or the library) that the upload actually touches.
+def diff_catalog(rows: list[dict], snapshot: dict, allow_deletes: bool = False) -> list[dict]:
+    brands = snapshot["brands"]
+    # existing brands may be keyed by slug id or only match by display name
+    brand_ids = {bid: bid for bid in brands}
+    for bid, bdata in brands.items():
+        brand_ids.setdefault(slugify(bdata.get("name", bid)), bid)
+
+    changes, seen_machines, seen_library = [], set(), set()
+    new_brands, touched_brands = {}, set()
+
+    for row in rows:
+        if row["kind"] == "machine":
+            bslug = slugify(row["brand"])
+            bid = brand_ids.get(bslug, bslug)
+            if bid not in brands and bid not in new_brands:
+                new_brands[bid] = row["brand"]
+            touched_brands.add(bid)
+            mid = slugify(row["name"])
+            key, old = (bid, mid), snapshot["machines"].get((bid, mid))
+            path = f"brands/{bid}/machines/{mid}"
+            seen = seen_machines
+        else:
+            mid = slugify(row["name"])
+            key, old = mid, snapshot["library"].get(mid)
+            path = f"exercise_library/{mid}"
+            seen = seen_library
+        if key in seen:
+            continue  # first occurrence in the file wins
+        seen.add(key)
+
+        payload = _payload(row, insert=old is None)
+        if old is None:
+            changes.append({"op": "insert", "path": path, "data": payload, "fields": list(payload)})
+        else:
+            fields = _changed_fields(payload, old)
+            # a merge=True set never removes a field, so clearing is explicit
+            if row["subtype"] == CLEAR and str(old.get("subtype") or "").strip():
+                payload["subtype"] = firestore.DELETE_FIELD
+                fields.append("subtype")
+            if fields:
+                changes.append({"op": "update", "path": path, "data": payload, "fields": fields})
+
+    for bid, bname in new_brands.items():
+        changes.insert(0, {"op": "insert", "path": f"brands/{bid}", "data": {"name": bname}, "fields": ["name"]})
+
+    if allow_deletes:
+        for (bid, mid) in snapshot["machines"]:
+            if bid in touched_brands and (bid, mid) not in seen_machines:
+                changes.append({"op": "delete", "path": f"brands/{bid}/machines/{mid}", "data": None, "fields": []})
+        if seen_library:
+            for lid in snapshot["library"]:
+                if lid not in seen_library:
+                    changes.append({"op": "delete", "path": f"exercise_library/{lid}", "data": None, "fields": []})
+    return changes
+
+
+def catalog_report(changes: list[dict]) -> pd.DataFrame:
+    return pd.DataFrame(
+        [{"Action": c["op"], "Document": c["path"], "Fields": ", ".join(c["fields"])} for c in changes],
+        columns=["Action", "Document", "Fields"],
+    )
+
+# --- Apply ---
+
+# Batches commit one at a time, so a failure leaves the earlier ones applied
+# (CatalogApplyError says how many). Every write is a merge or a delete of
+# the file's own values, so diffing the same file again lists only what's
+# left and applying that finishes the job.
+def apply_catalog_changes(db, changes: list[dict]) -> int:
+    written = 0
+    for i in range(0, len(changes), BATCH_LIMIT):
+        batch = db.batch()
+        for c in changes[i:i + BATCH_LIMIT]:
+            ref = db.document(c["path"])
+            if c["op"] == "delete":
+                batch.delete(ref)
+            else:
+                # merge so fields the upload doesn't manage are kept
+                batch.set(ref, c["data"], merge=True)
+        try:
+            batch.commit()
+        except Exception as e:
+            raise CatalogApplyError(written, e) from e
+        written += len(changes[i:i + BATCH_LIMIT])
+    return written
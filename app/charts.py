@@ -0,0 +1,130 @@
+# app/charts.py
+#
+# Chart builders for Quick Stats and Graphs. Each one is cached on the data
+# version of the frame it draws, so a rerun with unchanged data reuses the
+# same chart object instead of rebuilding it, and each chart only carries
+# the columns it encodes (datetime64 + float32 / small ints), which Streamlit
+# ships as Arrow instead of the whole entries frame.
+#
+# A reused chart serializes to the same element message, so with
+# global.minCachedMessageSize lowered in .streamlit/config.toml a full
+# rerun sends the browser only a hash reference for it, not the chart.
+
+import hashlib
+import altair as alt
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .trend import project, trend_frame
+from .utils import get_day_value
+
+QUICK_STATS = ['Weight (lbs)', 'Calories', 'Protein (g)', 'Steps']
+DAY_ORDER = ['Mon','Tue','Wed','Thu','Fri','Sat','Sun']
+
+
+def frame_version(df: pd.DataFrame, cols: list[str]) -> str:
+    # content hash over just the columns a chart depends on, row order included
+    if df.empty:
+        return "empty"
+    sub = df.reindex(columns=cols)
+    rows = pd.util.hash_pandas_object(sub, index=False).values.tobytes()
+    return hashlib.sha1(rows).hexdigest()
+
+
+def build_series_dict(df: pd.DataFrame) -> dict:
+    # Date-indexed numeric series for the Quick Stats tiles
+    dates = pd.to_datetime(df['Date']).dt.normalize()
+    return {
+        key: (
+            df.assign(_dt=dates)
+              .set_index('_dt')[key]
+              .pipe(pd.to_numeric, errors='coerce')
+        )
+        for key in ["Weight", "Calories", "Protein", "Steps"]
+    }
+
+
+@st.cache_resource(max_entries=64)
+def quick_stats(_series: dict, version: str) -> list[tuple]:
+    # [(label, current, delta, chart)] for the four metric tiles
+    today = _series['Weight'].index.max()
+    yesterday = today - pd.Timedelta(days=1)
+    tiles = []
+    for label in QUICK_STATS:
+        key = label.split()[0]
+        s = _series[key].last('7D').replace(0, np.nan).ffill()
+        cur  = float(get_day_value(s, today))
+        prev = float(get_day_value(s, yesterday))
+        df_trend = pd.DataFrame({
+            'Date':  s.index.to_numpy(dtype='datetime64[ns]'),
+            'Value': s.to_numpy(dtype='float32', na_value=np.nan),
+        })
+        chart = (
+            alt.Chart(df_trend)
+               .mark_line(point=True, strokeWidth=2)
+               .encode(
+                   x='Date:T', y='Value:Q',
+                   tooltip=['Date:T','Value:Q']
+               )
+               .properties(height=200)
+        )
+        tiles.append((label, round(cur,1), round(cur-prev,1), chart))
+    return tiles
+
+
+@st.cache_resource(max_entries=32)
+def weight_chart(_data: pd.DataFrame, version: str, _trend=None, target: float | None = None):
+    # None when there are no weigh-ins. _trend (trend.WeightTrend of the same
+    # data, so `version` covers it) adds the EWMA line and, with a target,
+    # the projection towards it
+    wdf = pd.DataFrame({
+        'DateNorm': pd.to_datetime(_data['Date']).dt.normalize(),
+        'Weight':   pd.to_numeric(_data['Weight'], errors='coerce').replace(0, np.nan).astype('float32'),
+    }).dropna(subset=['Weight'])
+    if wdf.empty:
+        return None
+
+    mn, mx = float(wdf['Weight'].min()), float(wdf['Weight'].max())
+    proj = project(_trend, target) if _trend is not None else None
+    if proj and proj['date']:
+        mn, mx = min(mn, target), max(mx, target)
+    pad = (mx - mn) * 0.05
+    y = alt.Y('Weight:Q', scale=alt.Scale(domain=[max(mn-pad,0), mx+pad]))
+    base = alt.Chart(wdf).encode(x='DateNorm:T')
+    line = base.mark_line(point=True, strokeWidth=3, color='#DA1A32').encode(y=y)
+    mean_rule = alt.Chart(pd.DataFrame({'mean':[float(wdf['Weight'].mean())]})).mark_rule(strokeDash=[4,4]).encode(y='mean:Q')
+    layers = [line, mean_rule]
+    if _trend is not None and len(_trend.days):
+        tdf = trend_frame(_trend).rename(columns={'Trend': 'Weight'})
+        layers.append(alt.Chart(tdf).mark_line(strokeWidth=2, color='#1E90FF').encode(
+            x='DateNorm:T', y=y, tooltip=['DateNorm:T', 'Weight:Q', alt.Tooltip('Rate:Q', title='lbs/week')]
+        ))
+    if proj and proj['date']:
+        pdf = pd.DataFrame({
+            'DateNorm': pd.to_datetime([_trend.last_date, proj['date']]),
+            'Weight':   np.array([proj['current'], target], dtype='float32'),
+        })
+        layers.append(alt.Chart(pdf).mark_line(strokeDash=[6,3], color='#1E90FF').encode(x='DateNorm:T', y=y))
+    return alt.layer(*layers).properties(width=700, height=350)
+
+
+@st.cache_resource(max_entries=32)
+def calendar_chart(_data: pd.DataFrame, version: str):
+    dates = pd.to_datetime(_data['Date']).dt.normalize()
+    training = _data['Training'] if 'Training' in _data.columns else np.nan
+    df_dates = pd.DataFrame({'DateNorm': dates, 'Training': training}).drop_duplicates()
+    all_days = pd.DataFrame({'DateNorm': pd.date_range(dates.min(), dates.max(), freq='D')})
+    calendar_df = all_days.merge(df_dates, on='DateNorm', how='left').fillna({'Training':'Rest'})
+    calendar_df['Type'] = pd.Categorical(
+        np.where(calendar_df['Training'] == 'Rest', 'Rest', 'Workout'), categories=['Rest','Workout']
+    )
+    calendar_df['Week'] = calendar_df['DateNorm'].dt.isocalendar().week.astype('uint8')
+    calendar_df['Day']  = pd.Categorical(calendar_df['DateNorm'].dt.day_name().str[:3], categories=DAY_ORDER)
+    calendar_df['Training'] = calendar_df['Training'].astype(str).astype('category')
+
+    return alt.Chart(calendar_df).mark_rect().encode(
+        x=alt.X('Day:O', sort=DAY_ORDER),
+        y='Week:O',
+        color=alt.Color('Type:N', scale=alt.Scale(domain=['Rest','Workout'], range=['#1E90FF','#DA1A32'])),
+        tooltip=['DateNorm:T','Training:N']
+    ).properties(width=700, height=250)
@@ -0,0 +1,162 @@
+# app/clients.py
+#
+# Process-wide network clients, built once and shared by every session:
+#
+# - FirestorePool: TERRAPUMP_FIRESTORE_CHANNELS Firestore clients, each
+#   opening its own gRPC channel with the library's default options. Each
+#   Streamlit session hashes to one client (Streamlit runs every rerun on a
+#   fresh thread, so the session id is the stable key; outside Streamlit
+#   it is the thread), so a session's refs and batches stay on one channel
+#   while sessions spread across the pool. The clients are built through
+#   the public constructor only; it takes no channel options, so keepalive
+#   and message sizes are the library's.
+# - AuthRestClient: the two Firebase Auth REST calls the app makes (sign in,
+#   sign up) over one pooled httpx client, HTTP/2 when h2 is installed, so
+#   logins reuse warm TLS connections instead of handshaking every time.
+#
+# pool_metrics() feeds the Admin page: refs and batches handed out per
+# Firestore client (gRPC multiplexes them over one channel, so this is
+# load spread, not connection reuse), and, for auth, responses that came
+# back on a connection an earlier request had already opened.
+
+import os
+import threading
+import weakref
+import zlib
+import httpx
+
+FIRESTORE_CHANNELS = int(os.environ.get("TERRAPUMP_FIRESTORE_CHANNELS", "2"))
+AUTH_MAX_CONNECTIONS = int(os.environ.get("TERRAPUMP_AUTH_MAX_CONNECTIONS", "10"))
+AUTH_TIMEOUT = float(os.environ.get("TERRAPUMP_AUTH_TIMEOUT", "10"))
+AUTH_URL = "https://identitytoolkit.googleapis.com/v1/accounts"
+
+# --- Firestore ---
+
+class FirestorePool:
+    def __init__(self, factory, size: int = FIRESTORE_CHANNELS):
+        self._clients = [factory() for _ in range(max(size, 1))]
+        self._refs = [0] * len(self._clients)
+
+    @staticmethod
+    def _session_key() -> str:
+        try:
+            from streamlit.runtime.scriptrunner import get_script_run_ctx
+            ctx = get_script_run_ctx(suppress_warning=True)
+        except ImportError:
+            ctx = None
+        return ctx.session_id if ctx is not None else f"thread-{threading.get_ident()}"
+
+    def _client(self):
+        # stateless, so nothing grows with the number of sessions
+        idx = zlib.crc32(self._session_key().encode()) % len(self._clients)
+        self._refs[idx] += 1
+        return self._clients[idx]
+
+    def collection(self, *args, **kwargs):
+        return self._client().collection(*args, **kwargs)
+
+    def collection_group(self, *args, **kwargs):
+        return self._client().collection_group(*args, **kwargs)
+
+    def document(self, *args, **kwargs):
+        return self._client().document(*args, **kwargs)
+
+    def batch(self, *args, **kwargs):
+        return self._client().batch(*args, **kwargs)
+
+    def close(self):
+        for client in self._clients:
+            client.close()
+
+    def stats(self) -> list[dict]:
+        return [{"client": i, "refs_handed_out": n} for i, n in enumerate(self._refs)]
+
+# --- Firebase Auth REST ---
+
+class AuthError(Exception):
+    pass
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class AuthRestClient:
+    # pyrebase-shaped: returns the REST response dict (localId, email,
+    # idToken, refreshToken, ...)
+
+    def __init__(self, api_key: str, max_connections: int = AUTH_MAX_CONNECTIONS, timeout: float = AUTH_TIMEOUT):
+        self.api_key = api_key
+        self.http2 = _http2_available()
+        # connections already counted; dropped with the connection itself
+        self._seen = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "new_connections": 0, "reused": 0,
+                         "pool_timeouts": 0, "errors": 0, "http2": 0}
+        self._http = httpx.Client(
+            http2=self.http2,
+            timeout=httpx.Timeout(timeout, pool=2.0),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections, keepalive_expiry=120),
+            event_hooks={"response": [self._on_response]},
+        )
+
+    def _on_response(self, response):
+        stream = response.extensions.get("network_stream")
+        with self._lock:
+            self.counters["requests"] += 1
+            if response.http_version == "HTTP/2":
+                self.counters["http2"] += 1
+            if stream is not None and stream in self._seen:
+                self.counters["reused"] += 1
+            else:
+                self.counters["new_connections"] += 1
+                if stream is not None:
+                    self._seen.add(stream)
+
+    def _post(self, action: str, payload: dict) -> dict:
+        try:
+            resp = self._http.post(f"{AUTH_URL}:{action}", params={"key": self.api_key},
+                                   json=payload | {"returnSecureToken": True})
+        except httpx.PoolTimeout as e:
+            with self._lock:
+                self.counters["pool_timeouts"] += 1
+            raise AuthError("auth connection pool exhausted") from e
+        if resp.status_code != 200:
+            with self._lock:
+                self.counters["errors"] += 1
+            try:
+                message = resp.json()["error"]["message"]
+            except (ValueError, KeyError, TypeError):
+                message = f"HTTP {resp.status_code}"
+            raise AuthError(message)
+        return resp.json()
+
+    def sign_in_with_email_and_password(self, email: str, password: str) -> dict:
+        return self._post("signInWithPassword", {"email": email, "password": password})
+
+    def create_user_with_email_and_password(self, email: str, password: str) -> dict:
+        return self._post("signUp", {"email": email, "password": password})
+
+    def pool_state(self) -> dict:
+        # httpcore's pool, when httpx exposes it
+        pool = getattr(getattr(self._http, "_transport", None), "_pool", None)
+        conns = list(getattr(pool, "connections", []) or [])
+        return {"open": len(conns), "idle": sum(1 for c in conns if c.is_idle()),
+                "max": AUTH_MAX_CONNECTIONS}
+
+    def close(self):
+        self._http.close()
+
+
+def pool_metrics(db_pool, auth) -> dict:
+    out = {}
+    if isinstance(db_pool, FirestorePool):
+        out["firestore"] = db_pool.stats()
+    if isinstance(auth, AuthRestClient):
+        out["auth"] = dict(auth.counters) | auth.pool_state() | {"http2_enabled": auth.http2}
+    return out
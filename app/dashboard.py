@@ -1,16 +1,19 @@
 APP_VERSION = "0.57"
 import sys, os
+import functools
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import datetime
 import pandas as pd
-import altair as alt
-import numpy as np
 from firebase_admin import firestore
+
+# cached entry frames are shared between sessions as shallow copies
+# (app/frame_cache.py); Copy-on-Write keeps one session's edits its own
+pd.set_option("mode.copy_on_write", True)
 from app.utils import (
-    fetch_all_entries,
-    get_day_value,
+    fetch_entries,
     clear_entry_state,
     hide_sidebar,
     show_login_page,
@@ -18,34 +21,154 @@ from app.utils import (
     slugify,
     fetch_exercise_library,
     fetch_attachments,
+    fetch_all_machines,
+    fetch_exercise_usage,
+    fetch_brand_ids,
     resolve_default_wt,
     build_stats_key,
-    load_exercise_stats,
     slug_variants,
     brand_id_from_display,
     _fmt_rep,
     _fmt_wt
 )
-from app.firebase_config import db, auth
-
-
-@st.cache_data(ttl=3600)
-def get_entries_cached(uid: str):
-    return fetch_all_entries(uid)
-
-def build_series_dict(df: pd.DataFrame):
-    dates = pd.to_datetime(df['Date']).dt.normalize()
-    return {
-        key: (
-            df.assign(_dt=dates)
-              .set_index('_dt')[key]
-              .pipe(pd.to_numeric, errors='coerce')
-        )
-        for key in ["Weight", "Calories", "Protein", "Steps"]
-    }
-
-
-def tab_dashboard(data: pd.DataFrame):
+from app.catalog import (
+    CATALOG_COLUMNS,
+    CatalogApplyError,
+    parse_catalog_file,
+    load_catalog_snapshot,
+    diff_catalog,
+    catalog_report,
+    apply_catalog_changes
+)
+from app.search import build_exercise_index, search_label
+from app.archive import list_archived_cached, load_archived, delete_archived
+from app.workout_log import WorkoutLog, LoggedExercise, WORKOUT_ENCODING, encode_workout_sets, workout_arrays, workout_items
+from app.workout_index import index_workout, unindex_workout, find_workouts, term_labels_cached
+from app.charts import build_series_dict, frame_version, quick_stats, weight_chart, calendar_chart
+from app.entries_store import save_entry
+from app.metrics import quick_stats_window, headline_metrics
+from app.trend import MAX_PROJECTION_DAYS, TrendCache, project
+from app.analytics import TABLES as USAGE_TABLES, load_summary, run_analytics
+from app.entry_windows import get_entry_windows
+from app.frame_cache import FrameCache, DEFAULT_BUDGET_MB, DEFAULT_SPILL_DIR
+from app.prefetch import session_prefetcher
+from app.perf import section, render_perf_panel
+from app.resilience import RETRYABLE, breaker_status, pop_stale
+from app.budget import BudgetExceeded, budget_scope, governor, is_throttled, last_good, pop_throttled
+from app.profiling import PROFILE_DIR, is_enabled, set_enabled, latest_summary, profile_rerun, profile_tab
+from app.shared_cache import get_shared_cache, invalidate, namespace_version
+from app.clients import pool_metrics
+from app.firebase_config import db, db_pool, auth
+
+EXERCISE_TYPES = ["Bodyweight","Barbell","Cable","Dumbbell","Machine","Plate-loaded"]
+
+
+@st.cache_resource
+def get_frame_cache():
+    # one budget for the whole process, shared by every session
+    return FrameCache(DEFAULT_BUDGET_MB * 1024 * 1024, spill_dir=DEFAULT_SPILL_DIR)
+
+@st.cache_resource
+def get_trend_cache():
+    # per-user weight trends, refit incrementally as weigh-ins are added
+    return TrendCache()
+
+def _entries_frame_key(uid: str) -> str:
+    # versioned by the shared cache, so a save on another replica retires
+    # this replica's frame too
+    return f"{uid}:v{namespace_version(f'entries/{uid}')}"
+
+def _with_stat_columns(df):
+    for col in ["Weight", "Calories", "Protein", "Steps"]:
+        if col not in df.columns:
+            df[col] = 0
+    return df
+
+def get_entries_cached(uid: str, start: str | None = None):
+    # entries from `start` ("YYYY-MM-DD") on, or the whole history. Ranged
+    # rows already live in the entry windows (app/entry_windows.py), which
+    # only read the days not loaded yet, so only the whole-history frame is
+    # kept in the frame cache
+    if start:
+        return _with_stat_columns(fetch_entries(uid, start))
+    cache = get_frame_cache()
+    key = _entries_frame_key(uid)
+    df = cache.get(key)
+    if df is None:
+        df = _with_stat_columns(fetch_entries(uid))
+        if not is_throttled("entries"):
+            # an over-budget read served saved rows; don't pin them
+            cache.put(key, df)
+    # a shallow copy of the frame every session shares (Copy-on-Write)
+    return df
+
+def invalidate_entries(uid: str):
+    get_frame_cache().invalidate(_entries_frame_key(uid))
+    invalidate(f"entries/{uid}")
+
+@st.cache_data(ttl=60)
+@last_good("quick stats")
+def get_quick_stats_rows_cached(uid: str):
+    # last week of entries only; Quick Stats never needs the full history
+    return quick_stats_window(uid)
+
+@st.cache_data(ttl=60)
+@last_good("metrics")
+def get_headline_metrics_cached(uid: str):
+    return headline_metrics(uid)
+
+# Catalog and usage loaders go through the shared cache (app/shared_cache.py),
+# so every replica reads them once and sees the others' invalidations.
+def get_library_cached():
+    return fetch_exercise_library()
+
+def get_attachments_cached():
+    return fetch_attachments()
+
+def get_brand_ids_cached():
+    return fetch_brand_ids()
+
+@st.cache_resource(ttl=3600, max_entries=2)
+def _exercise_index(catalog_version: int):
+    # built once per process and catalog version, shared by every session
+    return build_exercise_index(fetch_exercise_library(), fetch_all_machines(), fetch_attachments())
+
+def get_exercise_index():
+    return _exercise_index(namespace_version("catalog"))
+
+def get_exercise_usage_cached(uid: str):
+    return fetch_exercise_usage(uid)
+
+def _type_option(ex_type: str) -> str | None:
+    norm = lambda t: (t or "").lower().replace("-", "").replace(" ", "")
+    return next((t for t in EXERCISE_TYPES if norm(t) == norm(ex_type)), None)
+
+def _apply_search_pick():
+    # runs as a widget callback, so the selectors below can still be preset
+    item = st.session_state.get("ex_search_hits", {}).get(st.session_state.get("ex_search_pick"))
+    if not item:
+        return
+    if item["kind"] == "attachment":
+        st.session_state.exercise_type = "Cable"
+        st.session_state.cable_att     = item["name"]
+    else:
+        ex_type = _type_option(item["type"])
+        if ex_type:
+            st.session_state.exercise_type = ex_type
+        if item["kind"] == "machine":
+            st.session_state.brand_select   = (item.get("brand_id") or "").replace("_"," ").title()
+            st.session_state.machine_select = item["name"]
+        elif ex_type == "Cable":
+            st.session_state.cable_ex = item["name"]
+        else:
+            st.session_state.lib_select = item["name"]
+    st.session_state.ex_search      = ""
+    st.session_state.ex_search_pick = None
+
+@profile_tab
+def tab_dashboard(_=None):
+    uid = st.session_state.user["uid"]
+    data = pd.DataFrame(get_quick_stats_rows_cached(uid), columns=["Date", "Weight", "Calories", "Protein", "Steps"])
     # Ensure data columns
     for key in ["Weight", "Calories", "Protein", "Steps"]:
         if key not in data.columns:
@@ -59,56 +182,79 @@ def tab_dashboard(data: pd.DataFrame):
     if "workout_log" not in st.session_state:
         user_ref = db.collection("users").document(st.session_state.user["uid"])
         doc = user_ref.get()
-        active_log = doc.to_dict().get("active_log", [])
+        # compact map or the legacy [header, entry, ...] list
+        active_log = WorkoutLog.decode((doc.to_dict() or {}).get("active_log"))
 
         if active_log:
             # ✅ Resume saved workout
             st.session_state.workout_log = active_log
             st.session_state.workout_started = True
-            st.session_state.workout_start_time = active_log[0].get("start", datetime.datetime.now())
+            st.session_state.workout_start_time = active_log.start_dt
             st.session_state.sets_count = 1
             st.session_state.log_dirty = False
             st.toast("🔁 Resumed saved workout", icon="🔄")
         else:
-            st.session_state.workout_log = []
+            st.session_state.workout_log = None
             st.session_state.sets_count = 1
 
-    if "workout_log" not in st.session_state:
-        user_ref = db.collection("users").document(st.session_state.user["uid"])
-        doc = user_ref.get()
-        st.session_state.workout_log = doc.to_dict().get("active_log", [])
-
     # Header + Quick Stats (unchanged)
     st.markdown("<h1 style='text-align:center;'>TerraPump</h1>", unsafe_allow_html=True)
     st.markdown("---")
-    today = series['Weight'].index.max()
-    yesterday = today - pd.Timedelta(days=1)
     st.markdown("### Quick Stats")
     cols = st.columns(4)
-    labels = ['Weight (lbs)', 'Calories', 'Protein (g)', 'Steps']
-    for col, label in zip(cols, labels):
-        key = label.split()[0]
-        s = series[key].last('7D').replace(0, np.nan).ffill()
-        cur  = float(get_day_value(s, today))
-        prev = float(get_day_value(s, yesterday))
-        col.metric(label, round(cur,1), round(cur-prev,1))
-        df_trend = s.reset_index().rename(columns={'_dt':'Date', key:'Value'})
-        chart = (
-            alt.Chart(df_trend)
-               .mark_line(point=True, strokeWidth=2)
-               .encode(
-                   x='Date:T', y='Value:Q',
-                   tooltip=['Date:T','Value:Q']
-               )
-               .properties(height=200)
-        )
-        col.altair_chart(chart, use_container_width=True)
+    if not data.empty:
+        version = frame_version(data, ["Date", "Weight", "Calories", "Protein", "Steps"])
+        for col, (label, cur, delta, chart) in zip(cols, quick_stats(series, version)):
+            col.metric(label, cur, delta)
+            col.altair_chart(chart, use_container_width=True)
+    m = get_headline_metrics_cached(uid)
+    fmt = lambda v: f"{v:,.0f}" if v is not None else "–"
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Workouts (7d)", m["workouts_7d"], m["workouts_7d"] - m["workouts_prev_7d"])
+    c2.metric("Workouts (all time)", m["workouts_total"])
+    c3.metric("Avg Calories (30d)", fmt(m["avg_Calories_30d"]))
+    c4.metric("Avg Steps (30d)", fmt(m["avg_Steps_30d"]))
     st.markdown("---")
 
     # —————————————————————————————————————————
     st.markdown("### Workout")
     st.markdown("<div style='background:#222;border-radius:8px; padding:1rem;'>", unsafe_allow_html=True)
-    
+
+    workout_logger()
+
+    # —————————————————————————————————————————
+    past_workouts()
+
+
+def rerun_fragment():
+    # only legal while the fragment itself is being rerun; when it ran as
+    # part of a full script run (first render, tests) rerun everything
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+
+def _budget_warning(e: BudgetExceeded):
+    st.warning(f"⏳ You're over your {e.kind} limit for now. Try again in {e.retry_after:.0f} seconds.")
+
+def user_budget(fn):
+    # fragment reruns skip main(), so they set the session's budget scope too
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with budget_scope(st.session_state.user["uid"]):
+            try:
+                return fn(*args, **kwargs)
+            except BudgetExceeded as e:
+                _budget_warning(e)
+    return wrapper
+
+# Each section below is its own fragment: widgets inside it rerun only that
+# section instead of the whole tab (Quick Stats charts, catalog, history).
+@st.fragment
+@user_budget
+@section("workout_logger")
+def workout_logger():
     if not st.session_state.workout_started:
         name = st.text_input(
             "Name",
@@ -117,28 +263,55 @@ def tab_dashboard(data: pd.DataFrame):
         )
         if st.button("💪 Start Workout", key="side_start"):
             st.session_state.workout_started    = True
-            st.session_state.workout_start_time = datetime.datetime.now()
-            st.session_state.workout_log        = [{"name": name, "start": st.session_state.workout_start_time}]
+            st.session_state.workout_log        = WorkoutLog.new(name)
+            st.session_state.workout_start_time = st.session_state.workout_log.start_dt
             st.session_state.sets_count         = 1
+            # fresh prefetcher: warms recent stats while the first exercise is picked
+            st.session_state.pop("_stats_prefetcher", None)
+            session_prefetcher(db, st.session_state.user["uid"]).warm()
             st.success("Workout started!")
-            st.rerun()
+            rerun_fragment()
 
     else:
-        st.session_state.setdefault("workout_log", [{"name": "", "start": None}])
+        if st.session_state.get("workout_log") is None:
+            st.session_state.workout_log = WorkoutLog.new("")
+        log = st.session_state.workout_log
         new_name = st.text_input(
             "Workout Name",
-            value = st.session_state.workout_log[0]["name"],
+            value = log.name,
             key="workout_name"
         )
-        st.session_state.workout_log[0]["name"] = new_name
-        st.write(f"**Started at:** {st.session_state.workout_start_time:%Y-%m-%d %H:%M}")
+        log.name = new_name
+        st.write(f"**Started at:** {log.start_dt:%Y-%m-%d %H:%M}")
+        # 0) Quick search across library, machines and attachments
+        query = st.text_input("🔎 Find exercise", key="ex_search", placeholder="e.g. lat pull, chest press")
+        if query.strip():
+            usage = get_exercise_usage_cached(st.session_state.user["uid"])
+            hits  = get_exercise_index().search(query, limit=10, usage=usage)
+            st.session_state.ex_search_hits = {search_label(h): h for h in hits}
+            if hits:
+                st.selectbox(
+                    "Matches",
+                    list(st.session_state.ex_search_hits),
+                    index=None,
+                    placeholder="Pick a match to fill the selectors",
+                    key="ex_search_pick",
+                    on_change=_apply_search_pick
+                )
+            else:
+                st.caption("No matches.")
+
         # 1) Exercise type
+        st.session_state.setdefault("exercise_type", "Dumbbell")
         ex_type    = st.selectbox(
             "Exercise type",
-            ["Bodyweight","Barbell","Cable","Dumbbell","Machine","Plate-loaded"],
-            index=3,
+            EXERCISE_TYPES,
             key="exercise_type"
         )
+        prefetcher = session_prefetcher(db, st.session_state.user["uid"])
+        if st.session_state.get("_prefetch_type") != ex_type:
+            st.session_state._prefetch_type = ex_type
+            prefetcher.warm(ex_type)
 
         st.session_state.setdefault("unilateral", False)
         unilateral = st.checkbox(
@@ -152,7 +325,7 @@ def tab_dashboard(data: pd.DataFrame):
         default_wt    = type_defaults.get(ex_type, 0.0)
 
         # 3) Library fallback prep
-        library     = fetch_exercise_library()
+        library     = get_library_cached()
         type_key    = ex_type.lower().replace("-", "").replace(" ", "")
         filtered_lib = [
             e for e in library
@@ -184,7 +357,7 @@ def tab_dashboard(data: pd.DataFrame):
             if choice_ex != "–– pick one ––":
                 ex = choice_ex
                 # 2️⃣ Now pull only the attachments
-                all_atts   = fetch_attachments()
+                all_atts   = get_attachments_cached()
                 cable_atts = [
                     a for a in all_atts
                     if a.get("type","").strip().lower() == "cable"
@@ -207,7 +380,7 @@ def tab_dashboard(data: pd.DataFrame):
 
         # 4) BRAND + MACHINE selectors (outside the form)
         elif ex_type in ("Machine","Plate-loaded"):
-            brands  = [b.id for b in db.collection("brands").stream()]
+            brands  = get_brand_ids_cached()
             display = [b.replace("_"," ").title() for b in brands]
             mapping = dict(zip(display, brands))
 
@@ -330,7 +503,7 @@ def tab_dashboard(data: pd.DataFrame):
             # Make unique while preserving order
             legacy_keys = list(dict.fromkeys([k for k in legacy_keys if k]))
 
-            stats = load_exercise_stats(db, user_id, stats_key, legacy_fallbacks=legacy_keys)
+            stats = prefetcher.lookup(stats_key, legacy_fallbacks=legacy_keys)
 
         # Pull "previous" (last set only) — no averaging
             prev_sets = int(stats.get("prev_sets", stats.get("last_sets", 1)))
@@ -360,6 +533,10 @@ def tab_dashboard(data: pd.DataFrame):
                 w = float(prev_wt if isinstance(prev_wt, (int, float)) else default_wt)
                 prev_wt_left = prev_wt_right = w
 
+            # bilateral form after a unilateral session: prefill from the left side
+            prev_reps = prev_reps_left
+            prev_wt   = prev_wt_left
+
             # ℹ️ Display Previous Stats
             if stats:
                 all_sets    = int(stats.get("prev_sets", stats.get("last_sets", 1)))
@@ -447,7 +624,7 @@ def tab_dashboard(data: pd.DataFrame):
             submit = st.form_submit_button("✔ Add to Workout")
         
         if submit:
-            st.session_state.workout_log.append({
+            log.exercises.append(LoggedExercise.from_entry({
                 "exercise": ex,
                 "attachment" : attach_name,
                 "brand" : brand_name,
@@ -456,7 +633,7 @@ def tab_dashboard(data: pd.DataFrame):
                 "weights":  weight_list,
                 "unilateral" : unilateral,
                 "logged_at": datetime.datetime.now()
-            })
+            }))
             st.session_state.log_dirty = True
 
             
@@ -494,110 +671,134 @@ def tab_dashboard(data: pd.DataFrame):
                 "attachment": attach_name,
                 "updated_at": firestore.SERVER_TIMESTAMP
             }, merge=True)
+            prefetcher.forget(combined_slug)
+            invalidate(f"stats/{user_id}")
 
             st.session_state.sets_count = 1
             st.success(f"Added {ex}: {st.session_state.sets_count} sets (stats updated)")
 
-        # 9) Live log 
-        if len(st.session_state.workout_log) > 1:
-            st.markdown("#### 💪 Current Workout Log")
-
-            for idx, entry in enumerate(st.session_state.workout_log[1:], start=1):
-                brand = entry.get("brand")
-                attachment = entry.get("attachment")
-                exercise = entry.get("exercise", "Unnamed")
-                sets = entry.get("sets", 0)
-                reps = entry.get("reps", [])
-                weights = entry.get("weights", [])
-                unilateral = entry.get("unilateral", False)
-
-                brand_str = f"**Brand:** {brand}" if brand else ""
-                attach_str = f"**Attachment:** {attachment}" if attachment and attachment.lower() != "none" else ""
-
-                # 🚀 Start of Card
-                with st.container():
-                    st.markdown(f"### {exercise}")
-                    if brand_str:
-                        st.markdown(brand_str)
-                    if attach_str:
-                        st.markdown(attach_str)
-                    st.markdown(f"**Sets:** {sets}")
-
-                    for s in range(sets):
-                        if s >= len(reps) or s >= len(weights):
-                            continue
-
-                        # 🧠 Unilateral handling
-                        rep = reps[s]
-                        wt = weights[s]
-
-                        if unilateral and isinstance(rep, dict) and isinstance(wt, dict):
-                            st.markdown(
-                                f"- Set {s+1}: {wt['left']} lbs / {wt['right']} lbs – "
-                                f"{rep['left']} left / {rep['right']} right"
-                            )
-                        else:
-                            rep_str = rep if isinstance(rep, (int, float)) else str(rep)
-                            wt_str = wt if isinstance(wt, (int, float)) else str(wt)
-                            st.markdown(f"- Set {s+1}: {wt_str} lbs – {rep_str} reps")
-
-                    # ❌ Remove Button
-                    if st.button("❌ Remove", key=f"remove_ex_{idx}"):
-                        st.session_state.workout_log.pop(idx)
-                        st.session_state.log_dirty = True
-                        st.rerun()
-
-                    st.markdown("---")
-
-        # 10) Save button
-        if st.session_state.get("log_dirty") and len(st.session_state.workout_log) > 1:
-            if st.button("💾 Save Workout Progress"):
-                user_ref = db.collection("users").document(st.session_state.user["uid"])
-                user_ref.update({"active_log": st.session_state.workout_log})
-                st.session_state.log_dirty = False
-                st.success("Workout log saved!")
-        if "last_save" in st.session_state:
-            st.caption(f"Last saved at {st.session_state.last_save.strftime('%I:%M %p')}")
+        # 9) Live log + 10) Save (own fragment)
+        live_workout_log()
 
-        
         # 11) End Workout Button
         if st.button("🏁 End Workout", key="side_end"):
             user_id = st.session_state.user["uid"]
-            start   = st.session_state.workout_start_time
-            entries = st.session_state.workout_log[1:]
+            start   = log.start_dt
             db.collection("users") \
               .document(user_id) \
               .collection("workouts") \
               .document(start.isoformat()) \
               .set({
-                  "name":      st.session_state.workout_log[0]["name"],
+                  "name":      log.name,
                   "start":     start,
-                  "entries":   entries,
+                  "enc":       WORKOUT_ENCODING,
+                  "sets":      encode_workout_sets(log.exercises),
                   "timestamp": firestore.SERVER_TIMESTAMP
               })
+            index_workout(db, db.collection("users").document(user_id), start.isoformat(),
+                          start, log.name, log.exercises)
+            get_headline_metrics_cached.clear()
             st.success("✅ Workout saved!")
             user_ref = db.collection("users").document(user_id)
             user_ref.update({"active_log": firestore.DELETE_FIELD})
             st.session_state.workout_started = False
-            st.session_state.workout_log     = []
+            st.session_state.workout_log     = None
             st.rerun()
 
-    # —————————————————————————————————————————
+
+@st.fragment
+@user_budget
+@section("live_workout_log")
+def live_workout_log():
+    log = st.session_state.get("workout_log")
+    if log is None:
+        return
+    # 9) Live log 
+    if log.exercises:
+        st.markdown("#### 💪 Current Workout Log")
+
+        for idx, item in enumerate(log.exercises):
+            brand = item.brand
+            attachment = item.attachment
+            exercise = item.exercise
+            sets = item.sets
+
+            brand_str = f"**Brand:** {brand}" if brand else ""
+            attach_str = f"**Attachment:** {attachment}" if attachment and attachment.lower() != "none" else ""
+
+            # 🚀 Start of Card
+            with st.container():
+                st.markdown(f"### {exercise}")
+                if brand_str:
+                    st.markdown(brand_str)
+                if attach_str:
+                    st.markdown(attach_str)
+                st.markdown(f"**Sets:** {sets}")
+
+                for s, rec in enumerate(item.iter_sets(), 1):
+                    # 🧠 Unilateral handling
+                    if item.unilateral:
+                        st.markdown(
+                            f"- Set {s}: {rec.weight} lbs / {rec.weight_right} lbs – "
+                            f"{rec.reps} left / {rec.reps_right} right"
+                        )
+                    else:
+                        st.markdown(f"- Set {s}: {rec.weight} lbs – {rec.reps} reps")
+
+                # ❌ Remove Button
+                if st.button("❌ Remove", key=f"remove_ex_{idx}"):
+                    log.exercises.pop(idx)
+                    st.session_state.log_dirty = True
+                    rerun_fragment()
+
+                st.markdown("---")
+
+    # 10) Save button
+    if st.session_state.get("log_dirty") and log.exercises:
+        if st.button("💾 Save Workout Progress"):
+            user_ref = db.collection("users").document(st.session_state.user["uid"])
+            user_ref.update({"active_log": log.encode()})
+            st.session_state.log_dirty = False
+            st.success("Workout log saved!")
+    if "last_save" in st.session_state:
+        st.caption(f"Last saved at {st.session_state.last_save.strftime('%I:%M %p')}")
+
+
+@st.fragment
+@user_budget
+@section("past_workouts")
+def past_workouts():
     st.markdown("### Past Workouts")
 
-    user_ref = db.collection("users").document(st.session_state.user["uid"])
+    user_id = st.session_state.user["uid"]
+    user_ref = db.collection("users").document(user_id)
     workouts_ref = user_ref.collection("workouts")
 
-    # Get workout docs ordered by start date
-    docs = list(workouts_ref.order_by("start", direction=firestore.Query.DESCENDING).stream())
-
-    if not docs:
+    # Get workout headers ordered by start date; sets are only read for the
+    # workout that gets picked
+    docs = list(workouts_ref.order_by("start", direction=firestore.Query.DESCENDING)
+                .select(["name", "start"]).stream())
+    # archived workouts are listed from the bundle indexes; the hot copy
+    # wins if a workout is in both
+    hot_ids = {d.id for d in docs}
+    archived = [a for a in list_archived_cached(user_id) if a["id"] not in hot_ids]
+
+    # narrow the list to the sessions of one exercise / brand / attachment
+    term_names = term_labels_cached(user_id)
+    if term_names:
+        term = st.selectbox("Filter by exercise, brand or attachment", ["All workouts"] + list(term_names),
+                            format_func=lambda t: term_names.get(t, t), key="past_term")
+        if term != "All workouts":
+            ids = {w["id"] for w in find_workouts(user_ref, term)}
+            docs = [d for d in docs if d.id in ids]
+            archived = [a for a in archived if a["id"] in ids]
+
+    if not docs and not archived:
         st.info("You haven't saved any workouts yet.")
     else:
         data = []
-        for d in docs:
-            workout = d.to_dict()
-            workout["id"] = d.id
+        rows = [d.to_dict() | {"id": d.id} for d in docs] + archived
+        for workout in rows:
 
             # Convert Firestore timestamp
             raw_start = workout.get("start")
@@ -615,11 +816,13 @@ def tab_dashboard(data: pd.DataFrame):
             # Default fallback title
             workout["title"] = workout.get("name", "Workout")
             data.append(workout)
+        if archived:
+            data.sort(key=lambda w: w["start"].replace(tzinfo=None), reverse=True)
 
         # Dropdown
         placeholder = "–– pick one ––"
         labels = [placeholder] + [
-            f"{w['start'].strftime('%Y-%m-%d')} – {w['title']}" for w in data
+            f"{w['start'].strftime('%Y-%m-%d')} – {w['title']}{' 🗄️' if 'bundle' in w else ''}" for w in data
         ]
 
         sel = st.selectbox("Pick a past workout", labels, key="past_wkt")
@@ -634,44 +837,54 @@ def tab_dashboard(data: pd.DataFrame):
                 st.markdown("---")
                 st.markdown("### 🏋️ Exercises")
 
-                for i, ex in enumerate(workout.get("entries", []), 1):
-                    name = ex.get("exercise", "Unnamed")
-                    sets = ex.get("sets", 0)
-                    reps = ex.get("reps", [])
-                    unilateral = ex.get("unilateral", False)
-                    brand = ex.get("brand")
-                    attachment = ex.get("attachment")
+                if "bundle" in workout:
+                    arr = workout_arrays(load_archived(user_ref, workout["bundle"], workout["id"]) or {})
+                else:
+                    full = workouts_ref.document(workout["id"]).get()
+                    arr = workout_arrays(full.to_dict() or {}) if full.exists else workout_arrays({})
+                offsets = arr["offsets"]
+
+                for i, name in enumerate(arr["names"]):
+                    sets = int(arr["sets"][i])
+                    brand = arr["brands"][i]
+                    attachment = arr["attachments"][i]
+                    lo, hi = offsets[i], offsets[i + 1]
 
                     brand_str = f" ({brand})" if brand else ""
                     attach_str = f" – {attachment}" if attachment and attachment.lower() != "none" else ""
 
                     # 📦 Exercise Header
-                    st.markdown(f"**{i}. {name}{brand_str}{attach_str}**")
+                    st.markdown(f"**{i + 1}. {name}{brand_str}{attach_str}**")
                     st.markdown(f"*Sets:* **{sets}**")
 
                     # 🧱 Set-by-set Breakdown
-                    for s in range(sets):
-                        if s >= len(reps):
-                            continue
-                        rep_info = reps[s]
-
-                        if unilateral and isinstance(rep_info, dict):
-                            left = rep_info.get("left", "?")
-                            right = rep_info.get("right", "?")
-                            st.markdown(f"- Set {s+1}: {left} left / {right} right")
-                        else:
-                            st.markdown(f"- Set {s+1}: {rep_info} reps")
+                    if arr["unilateral"][i]:
+                        lines = [f"- Set {s}: {l} left / {r} right" for s, (l, r) in
+                                 enumerate(zip(arr["reps"][lo:hi].tolist(), arr["reps_right"][lo:hi].tolist()), 1)]
+                    else:
+                        lines = [f"- Set {s}: {r} reps" for s, r in enumerate(arr["reps"][lo:hi].tolist(), 1)]
+                    if lines:
+                        st.markdown("\n".join(lines))
 
                     st.markdown("---")
 
             # Delete workout
             if st.button("🗑️ Delete Workout", key=f"del_workout_{wk_idx}"):
-                workouts_ref.document(workout["id"]).delete()
+                if "bundle" in workout:
+                    doc = load_archived(user_ref, workout["bundle"], workout["id"]) or {}
+                    delete_archived(user_ref, workout["bundle"], workout["id"])
+                else:
+                    full = workouts_ref.document(workout["id"]).get()
+                    doc = (full.to_dict() or {}) if full.exists else {}
+                    workouts_ref.document(workout["id"]).delete()
+                unindex_workout(db, user_ref, workout["id"], workout_items(doc))
+                get_headline_metrics_cached.clear()
                 st.success("Workout deleted.")
-                st.rerun()
+                rerun_fragment()
 
 # --- Entries Tab ---
-def tab_entries(_):
+@profile_tab
+def tab_entries(_=None):
     st.title("Add or Edit Entries")
     st.markdown("---")
     user = st.session_state.get("user")
@@ -679,20 +892,15 @@ def tab_entries(_):
         st.warning("Log in to view this page.")
         return
     user_id = user["uid"]
+    form_date = st.date_input("Date", value=datetime.date.today(), on_change=clear_entry_state)
     try:
-        docs = db.collection("users").document(user_id).collection("entries").stream()
-        df = pd.DataFrame([doc.to_dict()|{"doc_id":doc.id} for doc in docs])
+        # just the picked day, through the entry windows
+        row = fetch_entries(user_id, str(form_date), str(form_date))
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return
-    for col in ["Date","Weight","Calories","Protein","Carbs","Fats","Steps","Training","Cardio"]:
-        if col not in df.columns:
-            df[col]=np.nan
-    df["DateNorm"] = pd.to_datetime(df["Date"],errors="coerce").dt.normalize()
-    form_date = st.date_input("Date", value=datetime.date.today(), on_change=clear_entry_state)
-    row = df[df["DateNorm"].dt.date==form_date]
     exists = not row.empty
-    data = row.iloc[0].to_dict() if exists else {}
+    data = row.iloc[0].dropna().to_dict() if exists else {}
     st.subheader(f"{'Edit' if exists else 'Add'} Entry for {form_date}")
     def s_int(k): return int(data.get(k,0) or 0)
     weight_def = float(data.get("Weight") or 0)
@@ -727,67 +935,73 @@ def tab_entries(_):
             "Weight":    weight
         }
         try:
-            db.collection("users").document(user_id).collection("entries").document(str(form_date)).set(payload)
+            save_entry(user_id, str(form_date), payload)
+            invalidate_entries(user_id)
+            get_quick_stats_rows_cached.clear()
+            get_headline_metrics_cached.clear()
             st.success(f"Entry {'updated' if exists else 'added'}!")
         except Exception as e:
             st.error(f"Save failed: {e}")
     st.markdown("---")
 
 # --- Graphs Tab ---
-def tab_graphs(data: pd.DataFrame):
+GRAPH_RANGES = {"3 months": 91, "6 months": 183, "1 year": 365, "All": None}
+
+@profile_tab
+def tab_graphs(_=None):
     st.title("Insights & Calendar")
     if st.button("🔄 Refresh Graphs"):
         st.cache_data.clear()
+        invalidate_entries(st.session_state.user["uid"])
         st.rerun()
     st.markdown("---")
+    span = st.radio("Range", list(GRAPH_RANGES), index=1, horizontal=True, key="graph_range")
+    start = (datetime.date.today() - datetime.timedelta(days=GRAPH_RANGES[span])).isoformat() \
+        if GRAPH_RANGES[span] else None
+    data = get_entries_cached(st.session_state.user["uid"], start)
 
-    for key in ["Weight", "Calories", "Protein", "Steps"]:
-        if key not in data.columns:
-            data[key] = 0
-
+    if (data.empty or "Date" not in data.columns) and start:
+        st.info("No entries in this range yet. Pick a longer one, or log today's stats in the Entries tab.")
+        return
     if data.empty or "Date" not in data.columns:
         st.info("No data yet. Use the Entries tab to log your first workout or daily stats.")
         st.markdown("---")
         return
     
-    # Weight over time
-    wdf = data.assign(
-        DateNorm=pd.to_datetime(data['Date']).dt.normalize(),
-        Weight=pd.to_numeric(data['Weight'], errors='coerce').replace(0, np.nan)
-    ).dropna(subset=['Weight'])
-
-    if wdf.empty:
+    # Weight over time, with the smoothed trend and a goal projection
+    weight_version = frame_version(data, ["Date", "Weight"])
+    # keyed by range name: `start` moves every day
+    trend = get_trend_cache().get(f"{st.session_state.user['uid']}:{span}", weight_version,
+                                  data["Date"], data["Weight"])
+    target = st.number_input("Target weight (lbs)", min_value=0.0, step=0.5, key="target_weight",
+                             help="Leave at 0 for no target")
+    proj = project(trend, target or None)
+    if proj:
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Trend weight", f"{proj['current']:.1f} lbs")
+        c2.metric("Rate (last 4 weeks)",
+                  f"{proj['rate_per_week']:+.2f} lbs/wk" if proj["rate_per_week"] is not None else "–")
+        if proj["date"]:
+            c3.metric("Projected to reach target", proj["date"].strftime("%b %d, %Y"), f"in {proj['days']} days",
+                      delta_color="off")
+        elif target:
+            c3.metric("Projected to reach target", "–",
+                      f"over {MAX_PROJECTION_DAYS // 365} years at this rate" if proj["too_far"] else "not trending towards it",
+                      delta_color="off")
+    chart = weight_chart(data, weight_version, trend, target or None)
+    if chart is None:
         st.write("No weight data to display.")
     else:
-        mn, mx = wdf['Weight'].min(), wdf['Weight'].max()
-        pad = (mx - mn) * 0.05
-        base = alt.Chart(wdf).encode(x='DateNorm:T')
-        line = base.mark_line(point=True, strokeWidth=3, color='#DA1A32').encode(
-            y=alt.Y('Weight:Q', scale=alt.Scale(domain=[max(mn-pad,0), mx+pad]))
-        )
-        mean_rule = alt.Chart(pd.DataFrame({'mean':[wdf['Weight'].mean()]})).mark_rule(strokeDash=[4,4]).encode(y='mean:Q')
-        st.altair_chart((line+mean_rule).properties(width=700, height=350), use_container_width=True)
+        st.altair_chart(chart, use_container_width=True)
     st.markdown("---")
 
     # Training calendar
-    data['DateNorm'] = pd.to_datetime(data['Date']).dt.normalize()
-    df_dates = data[['DateNorm','Training']].drop_duplicates()
-    all_days = pd.DataFrame({'DateNorm': pd.date_range(data['DateNorm'].min(), data['DateNorm'].max(), freq='D')})
-    calendar_df = all_days.merge(df_dates, on='DateNorm', how='left').fillna({'Training':'Rest'})
-    calendar_df['Type'] = calendar_df['Training'].apply(lambda x: 'Rest' if x=='Rest' else 'Workout')
-    calendar_df['Week'] = calendar_df['DateNorm'].dt.isocalendar().week
-    calendar_df['Day']  = calendar_df['DateNorm'].dt.day_name().str[:3]
-
-    cal = alt.Chart(calendar_df).mark_rect().encode(
-        x=alt.X('Day:O', sort=['Mon','Tue','Wed','Thu','Fri','Sat','Sun']),
-        y='Week:O',
-        color=alt.Color('Type:N', scale=alt.Scale(domain=['Rest','Workout'], range=['#1E90FF','#DA1A32'])),
-        tooltip=['DateNorm:T','Training:N']
-    ).properties(width=700, height=250)
+    cal = calendar_chart(data, frame_version(data, ["Date", "Training"]))
     st.altair_chart(cal, use_container_width=True)
     st.markdown("---")
 
 # --- About Tab ---
+@profile_tab
 def tab_about(_=None):
     st.title("👨‍💻 About the Developer")
     st.markdown("---")
@@ -810,6 +1024,7 @@ def tab_about(_=None):
     )
 
 ADMIN_UID = st.secrets["admin"]["uid"]
+@profile_tab
 def tab_admin(_=None):
     user = st.session_state.get("user")
     if not user or user["uid"] != ADMIN_UID:
@@ -817,6 +1032,97 @@ def tab_admin(_=None):
         return
     st.title("🛠️ Admin: Brands & Machines")
     st.markdown("---")
+
+    with st.expander("🧠 Entry frame cache"):
+        stats = get_frame_cache().stats()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Frames", stats["frames"])
+        c2.metric("Memory (MB)", f"{stats['bytes'] / 2**20:.1f} / {stats['budget_bytes'] / 2**20:.0f}")
+        c3.metric("Hits / Misses", f"{stats['hits']} / {stats['misses']}")
+        c4.metric("Evictions", stats["evictions"])
+        st.caption(f"Spilled to disk: {stats['spills']}  ·  served from disk: {stats['spill_hits']}")
+        windows = get_entry_windows().stats()
+        st.caption(f"Entry windows: {windows['users']} users · {windows['rows']:,} days held "
+                   f"({windows['bytes'] / 2**20:.1f} / {windows['max_bytes'] / 2**20:.0f} MB, "
+                   f"{windows['evictions']} users evicted) · {windows['hits']} served from memory · "
+                   f"{windows['reads']} range reads ({windows['rows_read']:,} days read)")
+        shared = get_shared_cache()
+        st.caption(
+            f"Shared cache ({type(shared.backend).__name__}): {shared.counters['hits']} hits · "
+            f"{shared.counters['misses']} misses · {shared.counters['invalidations']} invalidations"
+        )
+
+    with st.expander("🛡️ Firestore retries & circuit breakers"):
+        status = breaker_status()
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Read circuit", status["read"]["state"], f"{status['read']['trips']} trips", delta_color="off")
+        c2.metric("Write circuit", status["write"]["state"], f"{status['write']['trips']} trips", delta_color="off")
+        c3.metric("Retries / failures", f"{status['counters']['retries']} / {status['counters']['failures']}")
+        st.caption(f"Fast-failed while open: {status['counters']['fast_fails']}  ·  "
+                   f"stale reads served: {get_shared_cache().counters['stale']}")
+
+    with st.expander("🔌 Connection pools"):
+        pools = pool_metrics(db_pool, auth)
+        if not pools:
+            st.caption("Pooled clients are only used with the Firebase backend.")
+        if "firestore" in pools:
+            st.caption("Firestore clients: refs and batches handed out (sessions stick to one client)")
+            st.dataframe(pd.DataFrame(pools["firestore"]), hide_index=True)
+        if "auth" in pools:
+            a = pools["auth"]
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Auth requests", a["requests"], f"{a['reused']} on reused connections", delta_color="off")
+            c2.metric("Connections open", f"{a['open']} / {a['max']}", f"{a['idle']} idle", delta_color="off")
+            c3.metric("Pool timeouts", a["pool_timeouts"])
+            st.caption(f"New connections: {a['new_connections']}  ·  HTTP/2 responses: {a['http2']}"
+                       f"{'' if a['http2_enabled'] else ' (h2 not installed)'}  ·  errors: {a['errors']}")
+
+    with st.expander("🔬 Rerun profiler"):
+        on = st.toggle("Profile every rerun (all sessions on this server)", value=is_enabled(), key="admin_profile")
+        if on != is_enabled():
+            set_enabled(on)
+        st.caption(f"Flamegraphs (speedscope / collapsed) and top-N summaries go to `{os.path.abspath(PROFILE_DIR)}`.")
+        summary = latest_summary()
+        if summary:
+            st.code(summary, language=None)
+
+    with st.expander("🎟️ Read / write budgets"):
+        report = governor.report()
+        limits, proc = report["limits"], report["process"]
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Reads", f"{proc.get('reads', 0):,}", f"{proc.get('denied_reads', 0)} refused", delta_color="off")
+        c2.metric("Writes", f"{proc.get('writes', 0):,}", f"{proc.get('denied_writes', 0)} refused", delta_color="off")
+        c3.metric("Per-user limit / min", f"{limits['user']['read']:.0f} r · {limits['user']['write']:.0f} w")
+        c4.metric("Process limit / min", " · ".join(
+            f"{v:.0f} {k[0]}" if v else f"∞ {k[0]}" for k, v in limits["process"].items()))
+        if report["users"]:
+            users = pd.DataFrame.from_dict(report["users"], orient="index").rename_axis("uid").reset_index()
+            st.dataframe(users.sort_values("reads", ascending=False), hide_index=True, use_container_width=True)
+        st.caption("Counted since this server process started (a user's row since they were last idle); "
+                   "limits are set with TERRAPUMP_BUDGET_*.")
+
+    with st.expander("📊 Equipment usage (all users)"):
+        if st.button("🔄 Recompute usage", key="analytics_run"):
+            # a maintenance scan: charged to the process, not the admin's own budget
+            with st.spinner("Scanning every user's workouts and exercise stats…"), budget_scope(None):
+                usage = run_analytics(db)
+        else:
+            usage = load_summary(db)
+        if not usage:
+            st.caption("Not computed yet: press Recompute or run `python -m app.analytics`.")
+        else:
+            t = usage["totals"]
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("Users", t["users"])
+            c2.metric("Workouts", f"{t['workouts']:,}")
+            c3.metric("Sets", f"{t['sets']:,}")
+            c4.metric("Exercises", t["exercises"])
+            computed = usage.get("computed_at")
+            st.caption(f"Computed {computed:%Y-%m-%d %H:%M} UTC in {usage['seconds']}s" if computed else
+                       f"Computed in {usage['seconds']}s")
+            table = st.radio("Group by", [*USAGE_TABLES, "stats"], horizontal=True, key="analytics_table",
+                             format_func=lambda t: "stats keys" if t == "stats" else t)
+            st.dataframe(pd.DataFrame(usage[table]), hide_index=True, use_container_width=True)
     
     st.subheader("🔍 Existing Brands & Machines")
 
@@ -837,6 +1143,7 @@ def tab_admin(_=None):
             ):
                 if not machines:
                     db.collection("brands").document(brand_id).delete()
+                    invalidate("catalog")
                     st.success(f"Deleted brand {brand_name}")
                     st.rerun()
                 else:
@@ -867,10 +1174,10 @@ def tab_admin(_=None):
                     help="Delete this machine"
                 ):
                     machines_ref.document(mid).delete()
+                    invalidate("catalog")
                     st.success(f"Deleted {machine_name}")
                     st.rerun()
 
-
                 # Edit Machine
                 if cols[2].button(
                     "✏️",
@@ -896,6 +1203,7 @@ def tab_admin(_=None):
                             "type": new_type,
                             "default_starting_weight": new_start
                         })
+                        invalidate("catalog")
                         st.success(f"Updated {new_name}")
                         st.rerun()
     st.markdown("---")
@@ -913,6 +1221,7 @@ def tab_admin(_=None):
             bid = slugify(brand_name)
             try:
                 db.collection("brands").document(bid).set({"name": brand_name})
+                invalidate("catalog")
                 st.success(f"Brand '{brand_name}' created!")
             except Exception as e:
                 st.error(f"Failed to add brand: {e}")
@@ -950,6 +1259,7 @@ def tab_admin(_=None):
                     .collection("machines") \
                     .document(slugify(machine_name)) \
                     .set(payload)
+                    invalidate("catalog")
                     st.success("Machine added!")
                 except Exception as e:
                     st.error(f"Failed to add machine: {e}")
@@ -991,12 +1301,69 @@ def tab_admin(_=None):
                 db.collection("exercise_library") \
                 .document(slug) \
                 .set(payload)
+                invalidate("catalog")
                 st.success(f"Exercise '{ex_name}' added to library!")
             except Exception as e:
                 st.error(f"Failed to add exercise: {e}")
         st.markdown("---")
 
-
+    # — Bulk upload (CSV / JSON) —
+    st.subheader("📦 Bulk Upload Catalog")
+    st.caption(
+        "Columns: " + ", ".join(CATALOG_COLUMNS)
+        + ". `kind` is machine or exercise; machines need a brand. A blank cell leaves the stored "
+        "value alone (new entries get the usual defaults); a subtype of `-` removes it."
+    )
+    st.download_button(
+        "⬇️ CSV template",
+        ",".join(CATALOG_COLUMNS) + "\n",
+        file_name="catalog_template.csv",
+        mime="text/csv"
+    )
+    upload = st.file_uploader("Catalog file", type=["csv", "json"], key="catalog_upload")
+    allow_deletes = st.checkbox(
+        "Delete machines/exercises missing from the file",
+        value=False,
+        help="Only applies to brands that appear in the file, and to the library if the file has exercises"
+    )
+    if upload is not None:
+        try:
+            rows = parse_catalog_file(upload.name, upload.getvalue())
+        except ValueError as e:
+            st.error(f"Could not read file: {e}")
+            rows = []
+        if rows:
+            snapshot = load_catalog_snapshot(db)
+            changes  = diff_catalog(rows, snapshot, allow_deletes=allow_deletes)
+            counts   = {op: sum(c["op"] == op for c in changes) for op in ("insert", "update", "delete")}
+
+            # Dry-run report
+            st.markdown(
+                f"**Dry run:** {len(rows)} rows → "
+                f"{counts['insert']} inserts, {counts['update']} updates, {counts['delete']} deletes"
+            )
+            if not changes:
+                st.info("Catalog already matches the file. Nothing to do.")
+            else:
+                st.dataframe(catalog_report(changes), use_container_width=True, hide_index=True)
+                if st.button(f"✅ Apply {len(changes)} changes", key="catalog_apply"):
+                    try:
+                        # maintenance writes: charged to the process, so a large
+                        # file isn't cut off halfway by the admin's own budget
+                        with budget_scope(None):
+                            written = apply_catalog_changes(db, changes)
+                        invalidate("catalog")
+                        st.success(f"Applied {written} changes.")
+                    except CatalogApplyError as e:
+                        # earlier batches are in; the same file diffs to what's left
+                        invalidate("catalog")
+                        st.error(f"Bulk upload stopped partway: {e.written} of {len(changes)} changes "
+                                 f"were applied ({e.__cause__}). Upload the same file again to apply the rest.")
+                    except Exception as e:
+                        st.error(f"Bulk upload failed: {e}")
+
+
+@profile_rerun
 def main():
     st.set_page_config(page_title="TerraPump", page_icon=":bar_chart:", layout="wide")
     st.sidebar.caption(f"Version {APP_VERSION}")
@@ -1041,9 +1408,7 @@ def main():
         else:
             show_signup_page()
         return
-    # Fetch data
-    data = get_entries_cached(st.session_state.user['uid'])
-    
+    # Only Graphs needs the full entries history; it loads it itself
 
     # Sidebar navigation
     nav_items = [
@@ -1066,7 +1431,22 @@ def main():
         "About":               tab_about,
         "Admin":               tab_admin
     }
-    pages.get(st.session_state.page, tab_dashboard)(data)
+    render_perf_panel()
+    pop_stale()
+    pop_throttled()
+    try:
+        with section(f"rerun: {st.session_state.page}"), budget_scope(st.session_state.user["uid"]):
+            pages.get(st.session_state.page, tab_dashboard)()
+    except RETRYABLE:
+        st.error("⚠️ Can't reach the database right now. Try again in a moment.")
+    except BudgetExceeded as e:
+        _budget_warning(e)
+    stale = pop_stale()
+    if stale:
+        st.sidebar.warning(f"⚠️ Database unavailable: showing saved {', '.join(sorted(stale))} data.")
+    throttled = pop_throttled()
+    if throttled:
+        st.sidebar.info(f"⏳ Read limit reached: showing saved {', '.join(sorted(throttled))} data.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,255 @@
+# app/entries_store.py
+#
+# Storage layouts for daily entries.
+#
+#   daily   users/{uid}/entries/{YYYY-MM-DD}          one doc per day (original)
+#   monthly users/{uid}/entries_monthly/{YYYY-MM}     {"month", "days": {"DD": {...}}}
+#
+# TERRAPUMP_ENTRIES_LAYOUT picks the mode:
+#   daily   read + write daily docs only (default)
+#   dual    write both; read monthly, and also daily until the user is
+#           migrated (users/{uid}.entries_layout == "monthly")
+#   monthly read + write monthly docs only
+#
+# Migrate existing history with:
+#   python -m app.entries_store migrate --all   (or --uid <uid>)
+#
+# Windows range-query daily docs on Date as a "YYYY-MM-DD" string. Docs
+# written before that was enforced may hold a Timestamp or an unpadded
+# "2024-3-5", which a string range never matches; rewrite them once with:
+#   python -m app.entries_store normalize-dates --all   (or --uid <uid>)
+# Until then has_legacy_dates() spots the Timestamp ones and the windows
+# read such a user's whole history instead.
+
+import argparse
+import datetime
+import os
+import sys
+from collections import defaultdict
+from firebase_admin import firestore
+from .firebase_config import db
+
+LAYOUT = os.environ.get("TERRAPUMP_ENTRIES_LAYOUT", "daily").lower()
+MIGRATED = "monthly"
+
+
+def _user_ref(uid: str):
+    return db.collection("users").document(uid)
+
+
+def _daily_rows(uid: str) -> list[dict]:
+    docs = _user_ref(uid).collection("entries").stream()
+    return [doc.to_dict() | {"doc_id": doc.id} for doc in docs]
+
+
+def _monthly_rows(uid: str) -> list[dict]:
+    rows = []
+    for doc in _user_ref(uid).collection("entries_monthly").stream():
+        month = doc.id
+        for day, values in sorted(((doc.to_dict() or {}).get("days") or {}).items()):
+            date_str = f"{month}-{day}"
+            rows.append({"Date": date_str} | (values or {}) | {"doc_id": date_str})
+    return rows
+
+
+def _is_migrated(uid: str) -> bool:
+    doc = _user_ref(uid).get()
+    return doc.exists and (doc.to_dict() or {}).get("entries_layout") == MIGRATED
+
+
+def fetch_entry_rows(uid: str, layout: str | None = None) -> list[dict]:
+    layout = layout or LAYOUT
+    if layout == "daily":
+        return _daily_rows(uid)
+    rows = _monthly_rows(uid)
+    if layout == "dual" and not _is_migrated(uid):
+        # not migrated yet: daily docs hold the history, monthly only what
+        # was written since dual mode started (and wins for those days)
+        seen = {r["doc_id"] for r in rows}
+        rows += [r for r in _daily_rows(uid) if r["doc_id"] not in seen]
+    return rows
+
+
+# --- Date windows (Date is stored as "YYYY-MM-DD", so string ranges work) ---
+
+def _daily_window(uid: str, start: str, end: str) -> list[dict]:
+    docs = _user_ref(uid).collection("entries") \
+        .where("Date", ">=", start).where("Date", "<=", end).stream()
+    return [doc.to_dict() | {"doc_id": doc.id} for doc in docs]
+
+
+def _monthly_window(uid: str, start: str, end: str) -> list[dict]:
+    docs = _user_ref(uid).collection("entries_monthly") \
+        .where("month", ">=", start[:7]).where("month", "<=", end[:7]).stream()
+    rows = []
+    for doc in docs:
+        for day, values in sorted(((doc.to_dict() or {}).get("days") or {}).items()):
+            date_str = f"{doc.id}-{day}"
+            if start <= date_str <= end:
+                rows.append({"Date": date_str} | (values or {}) | {"doc_id": date_str})
+    return rows
+
+
+def fetch_entry_window(uid: str, start: str, end: str, layout: str | None = None) -> list[dict]:
+    # rows with start <= Date <= end (inclusive "YYYY-MM-DD" strings)
+    layout = layout or LAYOUT
+    if layout == "daily":
+        return _daily_window(uid, start, end)
+    rows = _monthly_window(uid, start, end)
+    if layout == "dual" and not _is_migrated(uid):
+        seen = {r["doc_id"] for r in rows}
+        rows += [r for r in _daily_window(uid, start, end) if r["doc_id"] not in seen]
+    return rows
+
+
+def latest_entry_date(uid: str, layout: str | None = None) -> str | None:
+    layout = layout or LAYOUT
+    found = []
+    if layout in ("daily", "dual"):
+        docs = _user_ref(uid).collection("entries") \
+            .order_by("Date", direction=firestore.Query.DESCENDING).limit(1).stream()
+        found += [str((d.to_dict() or {}).get("Date") or d.id)[:10] for d in docs]
+    if layout in ("dual", "monthly"):
+        docs = _user_ref(uid).collection("entries_monthly") \
+            .order_by("month", direction=firestore.Query.DESCENDING).limit(1).stream()
+        for d in docs:
+            days = ((d.to_dict() or {}).get("days") or {})
+            if days:
+                found.append(f"{d.id}-{max(days)}")
+    return max(found) if found else None
+
+
+def has_legacy_dates(uid: str, layout: str | None = None) -> bool:
+    # Firestore orders values by type before value, and every non-string
+    # type sorts before strings, so the first doc by Date tells
+    if (layout or LAYOUT) == "monthly":
+        return False
+    docs = _user_ref(uid).collection("entries").order_by("Date").limit(1).select(["Date"]).stream()
+    return any(not isinstance((d.to_dict() or {}).get("Date"), str) for d in docs)
+
+
+def _month_ref(uid: str, date_str: str):
+    return _user_ref(uid).collection("entries_monthly").document(date_str[:7])
+
+
+def entry_date(value) -> str:
+    # the "YYYY-MM-DD" key windows range-query on; raises ValueError otherwise
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime("%Y-%m-%d")
+    return datetime.date.fromisoformat(str(value)[:10]).isoformat()
+
+
+def save_entry(uid: str, date_str: str, payload: dict, layout: str | None = None):
+    layout = layout or LAYOUT
+    date_str = entry_date(date_str)
+    payload = payload | {"Date": entry_date(payload.get("Date", date_str))}
+    if layout in ("daily", "dual"):
+        _user_ref(uid).collection("entries").document(date_str).set(payload)
+    if layout in ("dual", "monthly"):
+        # merge touches only this day's fields inside the month's map
+        _month_ref(uid, date_str).set(
+            {"month": date_str[:7], "days": {date_str[8:10]: payload}}, merge=True
+        )
+
+# --- Migration ---
+
+def migrate_user(uid: str, delete_daily: bool = False) -> dict:
+    daily = _daily_rows(uid)
+    months = defaultdict(dict)
+    for row in daily:
+        date_str = _stored_date(row)
+        values = {k: v for k, v in row.items() if k != "doc_id"} | {"Date": date_str}
+        months[date_str[:7]][date_str[8:10]] = values
+
+    batch, n = db.batch(), 0
+    coll = _user_ref(uid).collection("entries_monthly")
+    for month, days in months.items():
+        # merge so days written in dual mode after the daily docs survive
+        existing = coll.document(month).get()
+        have = ((existing.to_dict() or {}).get("days") or {}) if existing.exists else {}
+        batch.set(coll.document(month), {"month": month, "days": days | have})
+        n += 1
+        if n == 400:
+            batch.commit()
+            batch, n = db.batch(), 0
+    batch.set(_user_ref(uid), {"entries_layout": MIGRATED}, merge=True)
+    batch.commit()
+
+    if delete_daily:
+        batch, n = db.batch(), 0
+        for row in daily:
+            batch.delete(_user_ref(uid).collection("entries").document(row["doc_id"]))
+            n += 1
+            if n == 400:
+                batch.commit()
+                batch, n = db.batch(), 0
+        batch.commit()
+    return {"uid": uid, "days": len(daily), "months": len(months)}
+
+
+def _stored_date(row: dict) -> str:
+    # the day a daily row is for: its Date (Timestamp, "YYYY-MM-DD" or an
+    # unpadded "2024-3-5"), else the doc id it was saved under
+    value = row.get("Date") or row["doc_id"]
+    try:
+        return entry_date(value)
+    except ValueError:
+        pass
+    try:
+        y, m, d = (int(p) for p in str(value).split("-")[:3])
+        return datetime.date(y, m, d).isoformat()
+    except ValueError:
+        return entry_date(row["doc_id"])
+
+
+def normalize_dates(uid: str) -> dict:
+    # rewrite daily docs whose Date isn't a "YYYY-MM-DD" string; rows that
+    # can't be parsed are left alone and counted
+    batch, n, fixed, skipped = db.batch(), 0, 0, 0
+    for row in _daily_rows(uid):
+        try:
+            date_str = _stored_date(row)
+        except (ValueError, TypeError):
+            skipped += 1
+            continue
+        if row.get("Date") == date_str:
+            continue
+        batch.update(_user_ref(uid).collection("entries").document(row["doc_id"]), {"Date": date_str})
+        fixed += 1
+        n += 1
+        if n == 400:
+            batch.commit()
+            batch, n = db.batch(), 0
+    if n:
+        batch.commit()
+    return {"uid": uid, "fixed": fixed, "skipped": skipped}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Move daily entry docs into monthly buckets")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    mig = sub.add_parser("migrate")
+    who = mig.add_mutually_exclusive_group(required=True)
+    who.add_argument("--uid", action="append", help="user id (repeatable)")
+    who.add_argument("--all", action="store_true", help="every user")
+    mig.add_argument("--delete-daily", action="store_true",
+                     help="remove daily docs afterwards (only once every reader is on dual/monthly)")
+    norm = sub.add_parser("normalize-dates")
+    who = norm.add_mutually_exclusive_group(required=True)
+    who.add_argument("--uid", action="append", help="user id (repeatable)")
+    who.add_argument("--all", action="store_true", help="every user")
+    args = ap.parse_args(argv)
+
+    uids = args.uid or [u.id for u in db.collection("users").stream()]
+    for uid in uids:
+        if args.cmd == "normalize-dates":
+            res = normalize_dates(uid)
+            print(f"{res['uid']}: {res['fixed']} dates rewritten, {res['skipped']} unreadable")
+            continue
+        res = migrate_user(uid, delete_daily=args.delete_daily)
+        print(f"{res['uid']}: {res['days']} days -> {res['months']} month docs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
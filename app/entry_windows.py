@@ -0,0 +1,201 @@
+# app/entry_windows.py
+#
+# Date-windowed entries for views that only draw part of the history. Each
+# process remembers, per user, which date spans it has already read; a
+# request range-queries only the gaps (entries_store.fetch_entry_window)
+# and merges the new span with the ones it overlaps or touches. Widening
+# "3 months" to "1 year" reads the nine months before, and "All" reads the
+# remainder once. An open-ended window (no start and no end) is one plain
+# read of the whole history.
+#
+# Rows are held within TERRAPUMP_WINDOW_MB (sizes estimated per row, the
+# retired copy included); past it, the least recently used users are
+# dropped. The windows are the only in-process copy of ranged rows: the
+# dashboard builds its ranged frames from them instead of caching those
+# frames again (whole-history reads go through the shared cache).
+#
+# Spans are tagged with the shared cache's entries/<uid> version, so a save
+# on any replica (invalidate("entries/<uid>")) retires them; the retired
+# rows are kept as the fallback for a user who is out of read budget. Dates
+# are the "YYYY-MM-DD" strings entries are keyed and range-queried by; a
+# user whose daily docs still hold a Timestamp Date (has_legacy_dates, one
+# small read per process) gets a whole-history read instead of ranges until
+# entries_store's normalize-dates has run for them.
+
+import datetime
+import os
+import sys
+import threading
+from collections import OrderedDict
+from .budget import BudgetExceeded, note_throttled
+from .entries_store import entry_date, fetch_entry_rows, fetch_entry_window, has_legacy_dates
+from .shared_cache import namespace_version
+
+MIN_DATE = "0001-01-01"
+MAX_DATE = "9999-12-31"
+MAX_MB = float(os.environ.get("TERRAPUMP_WINDOW_MB", "32"))
+
+
+def _next_day(date_str: str) -> str:
+    if date_str >= MAX_DATE:
+        return MAX_DATE
+    return (datetime.date.fromisoformat(date_str) + datetime.timedelta(days=1)).isoformat()
+
+
+def _prev_day(date_str: str) -> str:
+    if date_str <= MIN_DATE:
+        return MIN_DATE
+    return (datetime.date.fromisoformat(date_str) - datetime.timedelta(days=1)).isoformat()
+
+
+def merge_spans(spans: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    # inclusive (start, end) spans -> sorted, with overlapping or adjacent ones joined
+    out = []
+    for start, end in sorted(spans):
+        if out and start <= _next_day(out[-1][1]):
+            out[-1] = (out[-1][0], max(out[-1][1], end))
+        else:
+            out.append((start, end))
+    return out
+
+
+def missing_spans(spans: list[tuple[str, str]], start: str, end: str) -> list[tuple[str, str]]:
+    # parts of [start, end] no span in the (merged) `spans` covers
+    gaps, cur = [], start
+    for s, e in spans:
+        if e < cur:
+            continue
+        if s > end:
+            break
+        if s > cur:
+            gaps.append((cur, _prev_day(s)))
+        cur = _next_day(e)
+        if e >= end:
+            return gaps
+    if cur <= end:
+        gaps.append((cur, end))
+    return gaps
+
+
+def _row_date(row: dict) -> str:
+    value = row.get("Date") or row.get("doc_id")
+    try:
+        return entry_date(value)
+    except ValueError:
+        return str(value)[:10]
+
+
+def _row_bytes(row: dict) -> int:
+    # the dict and its values; keys are the same few strings in every row
+    return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+
+
+class EntryWindows:
+    def __init__(self, max_bytes: int = int(MAX_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        # uid -> {"version", "spans", "rows": {date: row}, "stale": {date: row},
+        #         "read": whether any earlier version was read, "bytes": rows + stale,
+        #         "legacy": whether daily docs hold non-string Dates (None = not probed)}
+        self._users = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "reads": 0, "rows_read": 0, "throttled": 0, "evictions": 0}
+
+    def _state(self, uid: str, version: int) -> dict:
+        with self._lock:
+            state = self._users.get(uid)
+            if state is None or state["version"] != version:
+                stale = (state["stale"] | state["rows"]) if state else {}
+                read = bool(state and (state["read"] or state["spans"]))
+                nbytes = sum(_row_bytes(r) for r in stale.values())
+                self._bytes += nbytes - (state["bytes"] if state else 0)
+                state = self._users[uid] = {"version": version, "spans": [], "rows": {}, "stale": stale,
+                                            "read": read, "bytes": nbytes,
+                                            "legacy": state["legacy"] if state else None}
+            self._users.move_to_end(uid)
+            self._evict(keep=uid)
+            return state
+
+    def _evict(self, keep: str):
+        # least recently used users first; the one being served stays
+        for uid in list(self._users):
+            if self._bytes <= self.max_bytes:
+                break
+            if uid != keep:
+                self._bytes -= self._users.pop(uid)["bytes"]
+                self.counters["evictions"] += 1
+
+    def rows(self, uid: str, start: str | None = None, end: str | None = None) -> list[dict]:
+        # rows with start <= Date <= end, oldest first; None leaves that side open
+        start, end = start or MIN_DATE, end or MAX_DATE
+        state = self._state(uid, namespace_version(f"entries/{uid}"))
+        with self._lock:
+            gaps = missing_spans(state["spans"], start, end)
+            self.counters["hits" if not gaps else "reads"] += 1
+        rows = state["rows"]
+        for gap in gaps:
+            try:
+                if state["legacy"] is None:
+                    state["legacy"] = has_legacy_dates(uid)
+                if state["legacy"]:
+                    # ranges would miss the Timestamp-dated docs
+                    gap = (MIN_DATE, MAX_DATE)
+                found = fetch_entry_rows(uid) if gap == (MIN_DATE, MAX_DATE) else fetch_entry_window(uid, *gap)
+            except BudgetExceeded:
+                # what this process last read, newer rows first; with
+                # nothing read yet there is nothing honest to serve
+                if not (state["read"] or state["spans"]):
+                    raise
+                with self._lock:
+                    self.counters["throttled"] += 1
+                    rows = state["stale"] | state["rows"]
+                note_throttled("entries")
+                break
+            with self._lock:
+                added = 0
+                for row in found:
+                    old = state["rows"].get(date := _row_date(row))
+                    added += _row_bytes(row) - (_row_bytes(old) if old is not None else 0)
+                    state["rows"][date] = row
+                state["spans"] = merge_spans(state["spans"] + [gap])
+                if gap == (MIN_DATE, MAX_DATE):
+                    # the whole history is at hand; re-check instead of probing
+                    state["legacy"] = any(not isinstance(r.get("Date"), str) for r in found)
+                if state["spans"] == [(MIN_DATE, MAX_DATE)]:
+                    added -= sum(_row_bytes(r) for r in state["stale"].values())
+                    state["stale"] = {}
+                state["bytes"] += added
+                if self._users.get(uid) is state:
+                    self._bytes += added
+                    self._evict(keep=uid)
+                self.counters["rows_read"] += len(found)
+            if gap == (MIN_DATE, MAX_DATE):
+                break
+        with self._lock:
+            return [row for date, row in sorted(rows.items()) if start <= date <= end]
+
+    def spans(self, uid: str) -> list[tuple[str, str]]:
+        with self._lock:
+            state = self._users.get(uid)
+            return list(state["spans"]) if state else []
+
+    def stats(self) -> dict:
+        with self._lock:
+            return self.counters | {
+                "users":     len(self._users),
+                "rows":      sum(len(s["rows"]) + len(s["stale"]) for s in self._users.values()),
+                "bytes":     self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_windows = None
+_windows_lock = threading.Lock()
+
+
+def get_entry_windows() -> EntryWindows:
+    global _windows
+    with _windows_lock:
+        if _windows is None:
+            _windows = EntryWindows()
+        return _windows
@@ -0,0 +1,540 @@
+# app/fake_firestore.py
+#
+# In-memory stand-in for the slice of the Firestore client (and pyrebase
+# auth) that TerraPump uses, so the app can run against synthetic data
+# without a project or the emulator: TERRAPUMP_BACKEND=fake. Documents are
+# plain dicts keyed by collection path; reads hand out copies like the real
+# client does.
+#
+# Fault injection: TERRAPUMP_FAKE_FAULTS (or FakeFirestore.faults) makes RPCs
+# fail with the transient errors the real service returns, e.g.
+#   TERRAPUMP_FAKE_FAULTS="unavailable=0.05,deadline=0.02,exhausted=0.02,latency_ms=15"
+
+import copy
+import datetime
+import hashlib
+import os
+import random
+import threading
+import time
+import uuid
+from firebase_admin import firestore
+from google.api_core import exceptions as gexc
+
+ASCENDING = firestore.Query.ASCENDING
+DESCENDING = firestore.Query.DESCENDING
+
+_OPS = {
+    "==":             lambda a, b: a == b,
+    "!=":             lambda a, b: a != b,
+    # range filters only match values of the filter's type, as in Firestore
+    "<":              lambda a, b: _same_type(a, b) and a < b,
+    "<=":             lambda a, b: _same_type(a, b) and a <= b,
+    ">":              lambda a, b: _same_type(a, b) and a > b,
+    ">=":             lambda a, b: _same_type(a, b) and a >= b,
+    "in":             lambda a, b: a in b,
+    "not-in":         lambda a, b: a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+_MISSING = object()
+
+
+class FaultPlan:
+    # per-RPC probabilities of each transient error, plus fixed added latency
+    ERRORS = {
+        "unavailable": gexc.ServiceUnavailable,
+        "deadline":    gexc.DeadlineExceeded,
+        "exhausted":   gexc.ResourceExhausted,
+    }
+
+    def __init__(self, unavailable=0.0, deadline=0.0, exhausted=0.0, latency_ms=0.0, seed=None):
+        self.rates = {"unavailable": unavailable, "deadline": deadline, "exhausted": exhausted}
+        self.latency_ms = latency_ms
+        self.injected = {k: 0 for k in self.rates}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_spec(cls, spec: str | None) -> "FaultPlan | None":
+        if not spec:
+            return None
+        kw = {}
+        for part in spec.split(","):
+            key, _, value = part.partition("=")
+            kw[key.strip()] = int(value) if key.strip() == "seed" else float(value)
+        return cls(**kw)
+
+    def maybe_fail(self, op: str):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            roll = self._rng.random()
+        for kind, rate in self.rates.items():
+            if roll < rate:
+                with self._lock:
+                    self.injected[kind] += 1
+                raise self.ERRORS[kind](f"injected {kind} on {op}")
+            roll -= rate
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _get_field(data: dict, path: str):
+    cur = data
+    for part in path.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return _MISSING
+        cur = cur[part]
+    return cur
+
+
+def _resolve(value):
+    # apply write sentinels the way the server would
+    if value is firestore.SERVER_TIMESTAMP:
+        return _now()
+    if isinstance(value, dict):
+        return {k: _resolve(v) for k, v in value.items() if v is not firestore.DELETE_FIELD}
+    if isinstance(value, list):
+        return [_resolve(v) for v in value]
+    return value
+
+
+def _merge(dst: dict, src: dict):
+    for k, v in src.items():
+        if v is firestore.DELETE_FIELD:
+            dst.pop(k, None)
+        elif isinstance(v, dict) and isinstance(dst.get(k), dict):
+            _merge(dst[k], v)
+        else:
+            dst[k] = _resolve(v)
+
+
+def _sort_key(v):
+    # Firestore orders mixed types by type first; good enough for our data
+    if v is _MISSING or v is None:
+        return (0, 0)
+    if isinstance(v, bool):
+        return (1, v)
+    if isinstance(v, (int, float)):
+        return (2, v)
+    if isinstance(v, datetime.datetime):
+        if v.tzinfo is None:
+            v = v.replace(tzinfo=datetime.timezone.utc)
+        return (3, v.timestamp())
+    if isinstance(v, str):
+        return (4, v)
+    return (5, str(v))
+
+
+def _same_type(a, b) -> bool:
+    return a is not None and _sort_key(a)[0] == _sort_key(b)[0]
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.id = ref.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        v = _get_field(self._data or {}, field_path)
+        if v is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(v)
+
+
+class FakeQuery:
+    def __init__(self, client, paths, filters=(), orders=(), limit=None, fields=None, cursor=None, end=None):
+        self._client = client
+        self._paths = paths          # callable -> iterable of collection paths
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._limit = limit
+        self._fields = fields
+        self._cursor = cursor
+        self._end = end
+
+    def _copy(self, **kw):
+        args = dict(filters=self._filters, orders=self._orders, limit=self._limit,
+                    fields=self._fields, cursor=self._cursor, end=self._end) | kw
+        return FakeQuery(self._client, self._paths, **args)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def start_after(self, values):
+        return self._copy(cursor=("after", values))
+
+    def start_at(self, values):
+        return self._copy(cursor=("at", values))
+
+    def end_before(self, values):
+        return self._copy(end=("before", values))
+
+    def end_at(self, values):
+        return self._copy(end=("at", values))
+
+    @staticmethod
+    def _field(t, field):
+        # "__name__" orders by document path
+        return f"{t[0]}/{t[1]}" if field == "__name__" else _get_field(t[2], field)
+
+    def _cursor_keys(self, values):
+        if isinstance(values, FakeSnapshot):
+            values = {f: self._field((*values.reference.path.rsplit("/", 1), values._data or {}), f)
+                      for f, _ in self._orders}
+        elif isinstance(values, (list, tuple)):
+            values = dict(zip([f for f, _ in self._orders], values))
+        values = {f: v.path if isinstance(v, FakeDocument) else v for f, v in values.items()}
+        name = values.get("__name__")
+        if isinstance(name, str) and "/" not in name:
+            # a bare id names a document of the queried collection, as in the client
+            values["__name__"] = f"{next(iter(self._paths()))}/{name}"
+        return [_sort_key(values.get(f, _MISSING)) for f, _ in self._orders]
+
+    def _cmp(self, t, keys) -> int:
+        # -1 / 0 / 1: t before / at / after the cursor in query order
+        for k, (f, d) in zip(keys, self._orders):
+            cur = _sort_key(self._field(t, f))
+            if cur != k:
+                return (1 if cur > k else -1) * (-1 if d == DESCENDING else 1)
+        return 0
+
+    def _matches(self):
+        out = []
+        with self._client._lock:
+            for cpath in list(self._paths()):
+                for doc_id, data in self._client._store.get(cpath, {}).items():
+                    if all(_OPS[op](_get_field(data, f) if _get_field(data, f) is not _MISSING else None, v)
+                           for f, op, v in self._filters):
+                        out.append((cpath, doc_id, data))
+        for field, direction in reversed(self._orders):
+            out.sort(key=lambda t: _sort_key(self._field(t, field)), reverse=direction == DESCENDING)
+        if self._cursor:
+            kind, values = self._cursor
+            keys = self._cursor_keys(values)
+            out = [t for t in out if self._cmp(t, keys) > (-1 if kind == "at" else 0)]
+        if self._end:
+            kind, values = self._end
+            keys = self._cursor_keys(values)
+            out = [t for t in out if self._cmp(t, keys) < (1 if kind == "at" else 0)]
+        if self._limit is not None:
+            out = out[:self._limit]
+        return out
+
+    def stream(self, *args, **kwargs):
+        self._client._fault("stream")
+        for cpath, doc_id, data in self._matches():
+            if self._fields is not None:
+                data = {f: data[f] for f in self._fields if f in data}
+            yield FakeSnapshot(FakeDocument(self._client, f"{cpath}/{doc_id}"), data)
+
+    def get(self, *args, **kwargs):
+        return list(self.stream())
+
+    def count(self, alias=None):
+        return FakeAggregation(self, "count", None, alias)
+
+    def sum(self, field_path, alias=None):
+        return FakeAggregation(self, "sum", field_path, alias)
+
+    def avg(self, field_path, alias=None):
+        return FakeAggregation(self, "avg", field_path, alias)
+
+
+class FakeQueryPartition:
+    def __init__(self, parent, start_at, end_at):
+        self._parent = parent
+        self.start_at = start_at
+        self.end_at = end_at
+
+    def query(self):
+        q = self._parent.order_by("__name__")
+        if self.start_at is not None:
+            q = q.start_at([self.start_at])
+        if self.end_at is not None:
+            q = q.end_before([self.end_at])
+        return q
+
+
+class FakeCollectionGroup(FakeQuery):
+    def get_partitions(self, partition_count, **kwargs):
+        # split points every n / partition_count documents in name order
+        self._client._fault("stream")
+        names = sorted(f"{t[0]}/{t[1]}" for t in self._matches())
+        step = max(1, -(-len(names) // max(1, partition_count)))
+        cuts = [FakeDocument(self._client, n) for n in names[step::step]]
+        for start, end in zip([None, *cuts], [*cuts, None]):
+            yield FakeQueryPartition(self, start, end)
+
+
+class FakeAggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class FakeAggregation:
+    def __init__(self, query, kind, field, alias):
+        self._query = query
+        self._specs = [(kind, field, alias or "field_1")]
+
+    def count(self, alias=None):
+        self._specs.append(("count", None, alias or f"field_{len(self._specs) + 1}"))
+        return self
+
+    def sum(self, field_path, alias=None):
+        self._specs.append(("sum", field_path, alias or f"field_{len(self._specs) + 1}"))
+        return self
+
+    def avg(self, field_path, alias=None):
+        self._specs.append(("avg", field_path, alias or f"field_{len(self._specs) + 1}"))
+        return self
+
+    def get(self, *args, **kwargs):
+        self._query._client._fault("aggregate")
+        rows = [t[2] for t in self._query._matches()]
+        results = []
+        for kind, field, alias in self._specs:
+            if kind == "count":
+                value = len(rows)
+            else:
+                nums = [v for v in (_get_field(r, field) for r in rows)
+                        if isinstance(v, (int, float)) and not isinstance(v, bool)]
+                if kind == "sum":
+                    value = sum(nums)
+                else:
+                    value = sum(nums) / len(nums) if nums else None
+            results.append(FakeAggregationResult(alias, value))
+        return [results]
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client, path):
+        super().__init__(client, lambda: [path])
+        self._path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        if "/" not in self._path:
+            return None
+        return FakeDocument(self._client, self._path.rsplit("/", 1)[0])
+
+    def document(self, document_id=None):
+        return FakeDocument(self._client, f"{self._path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, data, document_id=None, **kwargs):
+        ref = self.document(document_id)
+        ref.set(data)
+        return _now(), ref
+
+    def list_documents(self):
+        with self._client._lock:
+            ids = list(self._client._store.get(self._path, {}))
+        return [self.document(i) for i in ids]
+
+
+class FakeDocument:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self._cpath, self.id = path.rsplit("/", 1)
+
+    @property
+    def parent(self):
+        return FakeCollection(self._client, self._cpath)
+
+    def collection(self, name):
+        return FakeCollection(self._client, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, **kwargs):
+        self._client._fault("get")
+        with self._client._lock:
+            data = self._client._store.get(self._cpath, {}).get(self.id)
+            data = copy.deepcopy(data) if data is not None else None
+        if data is not None and field_paths:
+            data = {f: data[f] for f in field_paths if f in data}
+        return FakeSnapshot(self, data)
+
+    def set(self, document_data, merge=False, **kwargs):
+        self._client._fault("set")
+        return self._set(document_data, merge)
+
+    def _set(self, document_data, merge=False):
+        with self._client._lock:
+            coll = self._client._store.setdefault(self._cpath, {})
+            if merge and self.id in coll:
+                _merge(coll[self.id], document_data)
+            else:
+                coll[self.id] = _resolve(copy.deepcopy(document_data))
+        return _now()
+
+    def create(self, document_data, **kwargs):
+        self._client._fault("create")
+        return self._create(document_data)
+
+    def _create(self, document_data):
+        with self._client._lock:
+            if self.id in self._client._store.get(self._cpath, {}):
+                raise ValueError(f"Document already exists: {self.path}")
+        return self._set(document_data)
+
+    def update(self, field_updates, **kwargs):
+        self._client._fault("update")
+        return self._update(field_updates)
+
+    def _update(self, field_updates):
+        with self._client._lock:
+            coll = self._client._store.get(self._cpath, {})
+            if self.id not in coll:
+                raise KeyError(f"No document to update: {self.path}")
+            doc = coll[self.id]
+            for key, value in field_updates.items():
+                *parents, leaf = key.split(".")
+                cur = doc
+                for p in parents:
+                    cur = cur.setdefault(p, {})
+                if value is firestore.DELETE_FIELD:
+                    cur.pop(leaf, None)
+                else:
+                    cur[leaf] = _resolve(copy.deepcopy(value))
+        return _now()
+
+    def delete(self, **kwargs):
+        self._client._fault("delete")
+        return self._delete()
+
+    def _delete(self):
+        with self._client._lock:
+            self._client._store.get(self._cpath, {}).pop(self.id, None)
+        return _now()
+
+
+class FakeBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(lambda: ref._set(data, merge=merge))
+
+    def update(self, ref, data):
+        self._ops.append(lambda: ref._update(data))
+
+    def delete(self, ref):
+        self._ops.append(ref._delete)
+
+    def create(self, ref, data):
+        self._ops.append(lambda: ref._create(data))
+
+    def commit(self, **kwargs):
+        self._client._fault("commit")
+        if len(self._ops) > 500:
+            raise ValueError("maximum 500 writes allowed per request")
+        for op in self._ops:
+            op()
+        self._ops = []
+        return []
+
+
+class FakeFirestore:
+    def __init__(self):
+        self._store = {}          # collection path -> {doc_id: data}
+        self._lock = threading.RLock()
+        self.faults = FaultPlan.from_spec(os.environ.get("TERRAPUMP_FAKE_FAULTS"))
+
+    def _fault(self, op: str):
+        if self.faults is not None:
+            self.faults.maybe_fail(op)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def document(self, path):
+        return FakeDocument(self, path)
+
+    def collection_group(self, name):
+        def paths():
+            return [p for p in self._store if p.rsplit("/", 1)[-1] == name]
+        return FakeCollectionGroup(self, paths)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def close(self):
+        pass
+
+
+class FakeAuth:
+    # pyrebase-shaped auth against an in-memory account table
+
+    def __init__(self):
+        self._accounts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _uid(email):
+        return hashlib.sha1(email.lower().encode()).hexdigest()[:28]
+
+    def create_user_with_email_and_password(self, email, password):
+        with self._lock:
+            if email in self._accounts:
+                raise ValueError("EMAIL_EXISTS")
+            self._accounts[email] = (password, self._uid(email))
+        return self.sign_in_with_email_and_password(email, password)
+
+    def sign_in_with_email_and_password(self, email, password):
+        with self._lock:
+            acct = self._accounts.get(email)
+        if acct is None or acct[0] != password:
+            raise ValueError("INVALID_LOGIN_CREDENTIALS")
+        return {"localId": acct[1], "email": email, "idToken": f"fake-{acct[1]}"}
+
+    def verify_id_token(self, token):
+        # firebase_admin.auth.verify_id_token()-shaped; tokens are "fake-<uid>"
+        uid = token[len("fake-"):] if token.startswith("fake-") else ""
+        with self._lock:
+            if uid not in {a[1] for a in self._accounts.values()}:
+                raise ValueError("INVALID_ID_TOKEN")
+        return {"uid": uid}
+
+
+_client = None
+_auth = None
+_singleton_lock = threading.Lock()
+
+
+def fake_client() -> FakeFirestore:
+    # one store per process so seeding code and the app see the same data
+    global _client
+    with _singleton_lock:
+        if _client is None:
+            _client = FakeFirestore()
+        return _client
+
+
+def fake_auth() -> FakeAuth:
+    global _auth
+    with _singleton_lock:
+        if _auth is None:
+            _auth = FakeAuth()
+        return _auth
@@ -1,19 +1,43 @@
 # app/firebase_config.py
 
+import os
 import streamlit as st
 import firebase_admin
-from firebase_admin import credentials, firestore
-import pyrebase
+from firebase_admin import credentials
+from .budget import govern
+from .perf import instrument
+from .resilience import resilient
 
-svc_acct = dict(st.secrets["firebase_admin"])
-svc_acct["private_key"] = svc_acct["private_key"].replace("\\n", "\n")
-if not firebase_admin._apps:
-    cred = credentials.Certificate(svc_acct)
-    firebase_admin.initialize_app(cred)
-db = firestore.client()
+# "firebase" (default) talks to the real project; "emulator" points Firestore
+# at FIRESTORE_EMULATOR_HOST; "fake" keeps everything in memory. The last two
+# use the in-memory auth and are meant for load tests and benchmarks.
+BACKEND = os.environ.get("TERRAPUMP_BACKEND", "firebase").lower()
+db_pool = None
 
-pb_cfg        = st.secrets["firebase"]
-_pyfb         = pyrebase.initialize_app(pb_cfg)
-client_auth   = _pyfb.auth()
+if BACKEND == "fake":
+    from .fake_firestore import fake_client, fake_auth
+    db = govern(resilient(instrument(fake_client())))
+    client_auth = fake_auth()
+elif BACKEND == "emulator":
+    from google.cloud import firestore as gcf
+    from .fake_firestore import fake_auth
+    db = govern(resilient(instrument(gcf.Client(project=os.environ.get("GCLOUD_PROJECT", "terrapump-local")))))
+    client_auth = fake_auth()
+else:
+    from google.cloud import firestore as gcf
+    from .clients import AuthRestClient, FirestorePool
+    svc_acct = dict(st.secrets["firebase_admin"])
+    svc_acct["private_key"] = svc_acct["private_key"].replace("\\n", "\n")
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(svc_acct)
+        firebase_admin.initialize_app(cred)
+    # a pool of tuned channels and one pooled HTTP/2 auth client, shared by
+    # every session of this process (this module is imported once)
+    _cred = firebase_admin.get_app().credential.get_credential()
+    db_pool = FirestorePool(lambda: gcf.Client(project=svc_acct["project_id"], credentials=_cred))
+    db = govern(resilient(instrument(db_pool)))
+
+    pb_cfg        = st.secrets["firebase"]
+    client_auth   = AuthRestClient(pb_cfg["apiKey"])
 
 auth = client_auth
@@ -0,0 +1,184 @@
+# app/frame_cache.py
+#
+# Per-user cache for the entries DataFrame with a memory budget instead of
+# a fixed entry count. Sizes come from memory_usage(deep=True); when the
+# budget is exceeded the least recently used frames are evicted, optionally
+# spilled to Parquet so the next read skips Firestore.
+#
+# Sessions share one cached frame: get() and put() only ever hand out or
+# keep shallow copies (df.copy(deep=False)), so no caller holds the cached
+# object itself, and a rerun doesn't copy the whole history. That is only
+# safe with pandas Copy-on-Write (the default from pandas 3), where a write
+# to a shallow copy copies the touched column first; the app turns it on at
+# startup (dashboard.py) and FrameCache refuses to work without it.
+#
+# Keys may carry a version suffix ("<uid>:v<N>"). Putting a newer version
+# drops the older versions of that key, in memory and on disk, so a bump
+# doesn't leave the superseded Parquet spill behind.
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+
+DEFAULT_BUDGET_MB = float(os.environ.get("TERRAPUMP_FRAME_CACHE_MB", "256"))
+DEFAULT_TTL = int(os.environ.get("TERRAPUMP_FRAME_CACHE_TTL", "3600"))
+DEFAULT_SPILL_DIR = os.environ.get("TERRAPUMP_FRAME_SPILL_DIR") or None
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _safe(key: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in key)
+
+
+def _unversioned(key: str) -> str | None:
+    # "uid:v7" -> "uid"; None when the key has no version suffix
+    head, sep, version = key.rpartition(":v")
+    return head if sep and version.isdigit() else None
+
+
+class FrameCache:
+    def __init__(self, budget_bytes: int, ttl: int = DEFAULT_TTL, spill_dir: str | None = None):
+        if pd.get_option("mode.copy_on_write") is not True:
+            raise RuntimeError("FrameCache shares frames through shallow copies and needs "
+                               'pd.set_option("mode.copy_on_write", True)')
+        self.budget_bytes = int(budget_bytes)
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self._frames = OrderedDict()   # key -> (df, nbytes, stored_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "spills": 0, "spill_hits": 0}
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, f"{_safe(key)}.parquet")
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        now = time.time()
+        with self._lock:
+            hit = self._frames.get(key)
+            if hit is not None:
+                df, nbytes, stored_at = hit
+                if now - stored_at <= self.ttl:
+                    self._frames.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return df.copy(deep=False)
+                self._drop(key)
+
+        if self.spill_dir:
+            path = self._spill_path(key)
+            try:
+                stored_at = os.path.getmtime(path)
+                if now - stored_at <= self.ttl:
+                    df = pd.read_parquet(path)
+                    with self._lock:
+                        self.counters["spill_hits"] += 1
+                    if frame_nbytes(df) > self.budget_bytes:
+                        # would only be spilled straight back, refreshing
+                        # the file's mtime; serve it from disk each time
+                        return df
+                    self.put(key, df, stored_at=stored_at)
+                    return df.copy(deep=False)
+                os.remove(path)
+            except (OSError, ValueError, ImportError):
+                pass
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, key: str, df: pd.DataFrame, stored_at: float | None = None):
+        # the caller keeps `df`; later writes to it don't reach the cache
+        df = df.copy(deep=False)
+        nbytes = frame_nbytes(df)
+        evicted = []
+        base = _unversioned(key)
+        with self._lock:
+            self._drop(key)
+            if base is not None:
+                for old_key in [k for k in self._frames if _unversioned(k) == base]:
+                    self._drop(old_key)
+            if nbytes > self.budget_bytes:
+                # bigger than the whole budget: don't hold it in memory at all
+                evicted.append((key, df))
+            else:
+                self._frames[key] = (df, nbytes, stored_at or time.time())
+                self._bytes += nbytes
+                while self._bytes > self.budget_bytes:
+                    old_key, (old_df, _, _) = next(iter(self._frames.items()))
+                    self._drop(old_key)
+                    evicted.append((old_key, old_df))
+            self.counters["evictions"] += len(evicted)
+        # disk writes happen outside the lock
+        if base is not None:
+            self._remove_superseded(base, key)
+        for old_key, old_df in evicted:
+            self._spill(old_key, old_df)
+
+    def _remove_superseded(self, base: str, key: str):
+        if not self.spill_dir:
+            return
+        pattern = re.compile(re.escape(_safe(base)) + r"_v\d+\.parquet")
+        current = os.path.basename(self._spill_path(key))
+        try:
+            names = os.listdir(self.spill_dir)
+        except OSError:
+            return
+        for name in names:
+            if name != current and pattern.fullmatch(name):
+                try:
+                    os.remove(os.path.join(self.spill_dir, name))
+                except OSError:
+                    pass
+
+    def _spill(self, key: str, df: pd.DataFrame):
+        if not self.spill_dir:
+            return
+        try:
+            df.to_parquet(self._spill_path(key), index=False)
+            with self._lock:
+                self.counters["spills"] += 1
+        except (OSError, ValueError, TypeError, ImportError):
+            # mixed-type object columns can't always be written; just drop them
+            pass
+
+    def _drop(self, key: str):
+        hit = self._frames.pop(key, None)
+        if hit is not None:
+            self._bytes -= hit[1]
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._drop(key)
+        if self.spill_dir:
+            try:
+                os.remove(self._spill_path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._bytes = 0
+        if self.spill_dir:
+            for name in os.listdir(self.spill_dir):
+                if name.endswith(".parquet"):
+                    try:
+                        os.remove(os.path.join(self.spill_dir, name))
+                    except OSError:
+                        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return self.counters | {
+                "frames":       len(self._frames),
+                "bytes":        self._bytes,
+                "budget_bytes": self.budget_bytes,
+            }
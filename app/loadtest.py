@@ -0,0 +1,233 @@
+# app/loadtest.py
+#
+# Concurrent-session load test. Seeds N synthetic users into the in-memory
+# fake (default) or the Firestore emulator, then drives M scripted sessions
+# through the real dashboard script with Streamlit's AppTest: login, start a
+# workout, log a few exercises, End Workout, open Graphs. Reports throughput,
+# rerun latency percentiles and process RSS. Sessions reuse the seeded
+# users, so per-user read/write budgets are off unless --budgets is given.
+#
+#   python -m app.loadtest --users 20 --sessions 8 --years 3
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python -m app.loadtest --backend emulator
+#   python -m app.loadtest --faults unavailable=0.05,deadline=0.02   (fake only)
+
+import os
+import sys
+
+# must be decided before anything imports app.firebase_config
+if __name__ == "__main__":
+    _backend = "emulator" if "--backend" in sys.argv and "emulator" in sys.argv else "fake"
+    os.environ.setdefault("TERRAPUMP_BACKEND", _backend)
+
+import argparse
+import contextlib
+import resource
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from unittest.mock import MagicMock
+import streamlit as st
+from streamlit import config
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import app_test as _app_test, local_script_runner as _local_runner
+
+from .budget import governor
+from .fake_firestore import FaultPlan, fake_client
+from .firebase_config import db, auth
+from .resilience import breaker_status
+from .synthetic import seed_catalog, seed_user
+
+DASHBOARD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard.py")
+PASSWORD = "loadtest-pw"
+SECRETS = {"admin": {"uid": "loadtest-admin"}}
+
+
+def _share_apptest_runtime():
+    # AppTest sets up process-wide state for the length of each run and
+    # resets it afterwards, which breaks runs on other threads:
+    #   - a mock Runtime and st.secrets: share one runtime, set secrets once
+    #   - config.get_option patched to report global.appTest (which records
+    #     widget ids for the test tree); overlapping patches unwind out of
+    #     order and a run loses its widgets, so set the option once
+    #   - a fresh ScriptCache, so every run compiles the script, and a
+    #     compile racing other threads trips CPython's AST recursion check;
+    #     share one cache and compile up front, as a real server would once
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: cls._instance or shared)
+    Runtime.exists = classmethod(lambda cls: True)
+    secrets = Secrets()
+    secrets._secrets = SECRETS
+    st.secrets = secrets
+    config.set_option("global.appTest", True)
+    _app_test.patch_config_options = lambda overrides: contextlib.nullcontext()
+    script_cache = ScriptCache()
+    script_cache.get_bytecode(DASHBOARD)
+    _app_test.ScriptCache = _local_runner.ScriptCache = lambda: script_cache
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def seed(n_users: int, years: float) -> list[str]:
+    seed_catalog(db)
+    emails = []
+    for i in range(n_users):
+        email = f"load{i}@terrapump.test"
+        try:
+            user = auth.create_user_with_email_and_password(email, PASSWORD)
+        except ValueError:
+            user = auth.sign_in_with_email_and_password(email, PASSWORD)
+        seed_user(db, user["localId"], email, int(365 * years), seed=i)
+        emails.append(email)
+    return emails
+
+
+def _button(elements, label):
+    for b in elements:
+        if b.label == label:
+            return b
+    raise KeyError(label)
+
+
+def _new_app(timeout: float) -> AppTest:
+    return AppTest.from_file(DASHBOARD, default_timeout=timeout)
+
+
+def _reopen(at: AppTest, timeout: float) -> AppTest:
+    fresh = _new_app(timeout)
+    for key in ("user", "page", "workout_started", "workout_log", "sets_count"):
+        if key in at.session_state:
+            fresh.session_state[key] = at.session_state[key]
+    return fresh
+
+
+def run_session(email: str, n_exercises: int, timeout: float) -> list[tuple[str, float]]:
+    at = _new_app(timeout)
+    timings = []
+
+    def step(name, action):
+        t0 = time.perf_counter()
+        try:
+            action()
+        except KeyError as e:
+            # a widget the script should have drawn is missing; say why if it can
+            notes = [m.value for m in (*at.error, *at.warning)]
+            raise RuntimeError(f"{name}: no widget {e}" + (f" ({'; '.join(notes)})" if notes else "")) from None
+        timings.append((name, time.perf_counter() - t0))
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].message}")
+
+    step("open", at.run)
+    at.text_input(key="login_email").input(email)
+    at.text_input(key="login_password").input(PASSWORD)
+    step("login", lambda: _button(at.button, "Login").click().run())
+    step("start_workout", lambda: at.button(key="side_start").click().run())
+    types = ["Dumbbell", "Barbell", "Bodyweight"]
+    for i in range(n_exercises):
+        step("pick_type", lambda: at.selectbox(key="exercise_type").select(types[i % len(types)]).run())
+        step("add_set", lambda: _button(at.button, "➕ Add Set").click().run())
+        step("submit_exercise", lambda: _button(at.button, "✔ Add to Workout").click().run())
+    step("end_workout", lambda: at.button(key="side_end").click().run())
+    # End Workout calls st.rerun(); AppTest keeps the logger fragment's
+    # widgets from the aborted pass in its element tree and fails on their
+    # cleared state, so carry the session into a fresh AppTest
+    at = _reopen(at, timeout)
+    step("dashboard", at.run)
+    step("graphs", lambda: _button(at.sidebar.button, "📈 Graphs").click().run())
+    return timings
+
+
+def _pct(values, q):
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def report(timings, wall, n_sessions, failures):
+    print(f"\nsessions: {n_sessions - failures} ok / {failures} failed   wall: {wall:.1f}s")
+    all_ms = [t * 1000 for _, t in timings]
+    print(f"reruns: {len(all_ms)}   throughput: {len(all_ms) / wall:.1f} reruns/s, "
+          f"{(n_sessions - failures) / wall:.2f} sessions/s")
+    print(f"rss: {rss_mb():.0f} MB now, {peak_rss_mb():.0f} MB peak\n")
+    print(f"{'step':<18}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    steps = dict.fromkeys(name for name, _ in timings)
+    for name in list(steps) + ["ALL"]:
+        ms = sorted(all_ms if name == "ALL" else [t * 1000 for n, t in timings if n == name])
+        print(f"{name:<18}{len(ms):>6}{_pct(ms, 50):>10.1f}{_pct(ms, 95):>10.1f}{_pct(ms, 99):>10.1f}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="TerraPump concurrent-session load test")
+    ap.add_argument("--users", type=int, default=10, help="synthetic users to seed")
+    ap.add_argument("--years", type=float, default=2, help="history per user")
+    ap.add_argument("--sessions", type=int, default=4, help="concurrent sessions")
+    ap.add_argument("--rounds", type=int, default=1, help="sessions per worker")
+    ap.add_argument("--exercises", type=int, default=3, help="exercises logged per workout")
+    ap.add_argument("--timeout", type=float, default=60, help="per-rerun timeout (s)")
+    ap.add_argument("--backend", choices=["fake", "emulator"], default="fake")
+    ap.add_argument("--faults", help="fake backend: inject transient errors, e.g. unavailable=0.05,latency_ms=10")
+    ap.add_argument("--budgets", action="store_true",
+                    help="keep per-user read/write budgets (sessions share the seeded users, so they run out)")
+    args = ap.parse_args(argv)
+
+    if not args.budgets:
+        # every session logs in as one of --users, so their buckets drain
+        # --sessions times faster than a real user's would
+        governor.limits["user"] = {"read": 0, "write": 0}
+
+    _share_apptest_runtime()
+    t0 = time.perf_counter()
+    emails = seed(args.users, args.years)
+    print(f"seeded {len(emails)} users × {args.years}y in {time.perf_counter() - t0:.1f}s "
+          f"(rss {rss_mb():.0f} MB)")
+
+    if args.faults:
+        # after seeding, so only the sessions see them
+        fake_client().faults = FaultPlan.from_spec(args.faults)
+
+    timings, failures, lock = [], 0, threading.Lock()
+    total = args.sessions * args.rounds
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        futures = [pool.submit(run_session, emails[i % len(emails)], args.exercises, args.timeout)
+                   for i in range(total)]
+        for fut in as_completed(futures):
+            try:
+                result = fut.result()
+                with lock:
+                    timings.extend(result)
+            except Exception as e:
+                failures += 1
+                print(f"session failed: {e}", file=sys.stderr)
+    report(timings, time.perf_counter() - t0, total, failures)
+    if args.faults:
+        print(f"\ninjected: {fake_client().faults.injected}\nresilience: {breaker_status()}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
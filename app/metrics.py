@@ -0,0 +1,105 @@
+# app/metrics.py
+#
+# Headline numbers for the dashboard. Counts and averages come from
+# Firestore aggregation queries (count / sum / avg) over date-ranged
+# queries, so they cost a few aggregation reads however long the history
+# is; the Quick Stats tiles only read the last week of entries.
+#
+# Backends without sum/avg (older emulators) fall back to streaming the
+# ranged docs and computing the same values locally; so does the
+# month-bucketed entries layout, whose days can't be range-queried.
+# TERRAPUMP_AGGREGATION=local forces the fallback.
+
+import datetime
+import os
+from google.api_core.exceptions import FailedPrecondition, GoogleAPICallError, MethodNotImplemented
+from .archive import archived_count
+from .entries_store import LAYOUT, fetch_entry_window, latest_entry_date
+from .firebase_config import db
+from .resilience import is_unavailable
+
+AGGREGATION = os.environ.get("TERRAPUMP_AGGREGATION", "server").lower()
+_server_ok = AGGREGATION != "local"
+
+
+def _is_num(v) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def aggregate_rows(rows: list[dict], count=True, sums=(), avgs=()) -> dict:
+    # same keys/semantics as aggregate(): non-numeric values are skipped,
+    # avg of nothing is None
+    out = {"count": len(rows)} if count else {}
+    for f in sums:
+        out[f"sum_{f}"] = sum(v for v in (r.get(f) for r in rows) if _is_num(v))
+    for f in avgs:
+        nums = [v for v in (r.get(f) for r in rows) if _is_num(v)]
+        out[f"avg_{f}"] = sum(nums) / len(nums) if nums else None
+    return out
+
+
+def aggregate(query, count=True, sums=(), avgs=()) -> dict:
+    # -> {"count": n, "sum_<field>": x, "avg_<field>": y}
+    global _server_ok
+    if _server_ok:
+        specs = ([("count", None)] if count else []) \
+            + [("sum", f) for f in sums] + [("avg", f) for f in avgs]
+        try:
+            agg = query
+            for kind, field in specs:
+                alias = kind if field is None else f"{kind}_{field}"
+                agg = agg.count(alias=alias) if field is None else getattr(agg, kind)(field, alias=alias)
+            return {r.alias: r.value for r in agg.get()[0]}
+        except (AttributeError, NotImplementedError, GoogleAPICallError) as e:
+            if is_unavailable(e):
+                raise
+            if not isinstance(e, GoogleAPICallError) or isinstance(e, (FailedPrecondition, MethodNotImplemented)):
+                # not supported here; stop asking for the rest of the process
+                _server_ok = False
+            # anything else only costs this call its server aggregation
+    fields = list(dict.fromkeys([*sums, *avgs]))
+    rows = [doc.to_dict() or {} for doc in query.select(fields).stream()]
+    return aggregate_rows(rows, count, sums, avgs)
+
+
+def _day(d: datetime.date) -> str:
+    return d.isoformat()
+
+
+def quick_stats_window(uid: str, days: int = 7) -> list[dict]:
+    # entries for the `days` days up to the latest logged one (the window
+    # Quick Stats has always drawn), or [] for a user with no entries
+    last = latest_entry_date(uid)
+    if not last:
+        return []
+    end = datetime.date.fromisoformat(last)
+    return fetch_entry_window(uid, _day(end - datetime.timedelta(days=days - 1)), _day(end))
+
+
+def headline_metrics(uid: str, today: datetime.date | None = None) -> dict:
+    today = today or datetime.date.today()
+    user_ref = db.collection("users").document(uid)
+    workouts = user_ref.collection("workouts")
+
+    week_start = datetime.datetime.combine(today - datetime.timedelta(days=6), datetime.time.min)
+    prev_start = week_start - datetime.timedelta(days=7)
+    out = {
+        "workouts_total": aggregate(workouts)["count"] + archived_count(user_ref),
+        "workouts_7d":    aggregate(workouts.where("start", ">=", week_start))["count"],
+        "workouts_prev_7d": aggregate(
+            workouts.where("start", ">=", prev_start).where("start", "<", week_start)
+        )["count"],
+    }
+
+    start, end = _day(today - datetime.timedelta(days=29)), _day(today)
+    fields = ("Calories", "Protein", "Steps")
+    if LAYOUT == "daily":
+        month = aggregate(
+            user_ref.collection("entries").where("Date", ">=", start).where("Date", "<=", end),
+            avgs=fields,
+        )
+    else:
+        month = aggregate_rows(fetch_entry_window(uid, start, end), avgs=fields)
+    out["entries_30d"] = month["count"]
+    out |= {f"avg_{f}_30d": month[f"avg_{f}"] for f in fields}
+    return out
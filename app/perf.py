@@ -0,0 +1,115 @@
+# app/perf.py
+#
+# Opt-in rerun instrumentation: TERRAPUMP_PERF=1 wraps the Firestore client
+# so every RPC is counted, and `section()` records wall time + RPCs for a
+# block (a whole rerun, a fragment, ...). Off by default; when off the
+# client is returned untouched and section() only yields.
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+import streamlit as st
+
+ENABLED = os.environ.get("TERRAPUMP_PERF", "").lower() in ("1", "true", "yes")
+
+# calls that go over the wire; everything in _CHAIN just builds a reference
+# (count/sum/avg build an aggregation query; its get() is the RPC)
+_RPC = {"get", "stream", "set", "update", "delete", "create", "commit", "add"}
+_CHAIN = {
+    "collection", "collection_group", "document", "where", "order_by", "limit",
+    "limit_to_last", "offset", "select", "start_at", "start_after", "end_at",
+    "end_before", "batch", "aggregate", "count", "sum", "avg",
+}
+# a WriteBatch's set/update/delete are queued locally until commit()
+_BATCH_RPC = {"commit"}
+
+_local = threading.local()
+log = logging.getLogger("terrapump.perf")
+
+
+def _counts() -> dict:
+    if not hasattr(_local, "rpcs"):
+        _local.rpcs = {}
+    return _local.rpcs
+
+
+def rpc_total() -> int:
+    return sum(_counts().values())
+
+
+def _unwrap(v):
+    return v._target if isinstance(v, _Counted) else v
+
+
+class _Counted:
+    __slots__ = ("_target", "_rpc")
+
+    def __init__(self, target, rpc=_RPC):
+        self._target = target
+        self._rpc = rpc
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            args = [_unwrap(a) for a in args]
+            kwargs = {k: _unwrap(v) for k, v in kwargs.items()}
+            result = attr(*args, **kwargs)
+            if name in self._rpc:
+                c = _counts()
+                c[name] = c.get(name, 0) + 1
+                return result
+            if name == "batch":
+                return _Counted(result, _BATCH_RPC)
+            if name in _CHAIN:
+                return _Counted(result, self._rpc)
+            return result
+        return call
+
+
+def instrument(client):
+    return _Counted(client) if ENABLED else client
+
+
+@contextmanager
+def section(name: str):
+    if not ENABLED:
+        yield
+        return
+    t0, r0 = time.perf_counter(), rpc_total()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        rpcs = rpc_total() - r0
+        stats = st.session_state.setdefault("_perf", {})
+        row = stats.setdefault(name, {"runs": 0, "last_ms": 0.0, "total_ms": 0.0, "last_rpcs": 0, "total_rpcs": 0})
+        row["runs"] += 1
+        row["last_ms"] = round(ms, 1)
+        row["total_ms"] += ms
+        row["last_rpcs"] = rpcs
+        row["total_rpcs"] += rpcs
+        log.info("%s: %.1f ms, %d rpcs", name, ms, rpcs)
+
+
+def render_perf_panel():
+    # sidebar table; fragment-only reruns show up on the next full rerun
+    if not ENABLED:
+        return
+    stats = st.session_state.get("_perf", {})
+    if not stats:
+        return
+    with st.sidebar.expander("⏱️ Perf"):
+        for name, row in stats.items():
+            avg_ms = row["total_ms"] / row["runs"]
+            avg_rpc = row["total_rpcs"] / row["runs"]
+            st.caption(
+                f"**{name}** ×{row['runs']}: last {row['last_ms']} ms / {row['last_rpcs']} rpcs, "
+                f"avg {avg_ms:.1f} ms / {avg_rpc:.1f} rpcs"
+            )
+        if st.button("Reset", key="perf_reset"):
+            st.session_state._perf = {}
@@ -0,0 +1,150 @@
+# app/prefetch.py
+#
+# Speculative prefetch of exercise_stats for the workout logger. Picking an
+# exercise used to block on load_exercise_stats(), which with the legacy-key
+# fallbacks can be several round trips. Each session gets a StatsPrefetcher
+# whose background thread warms a local cache:
+#
+#   - when a workout starts: the user's RECENT_STATS most recently updated
+#     exercise_stats docs, plus the exercises of their last RECENT_WORKOUTS
+#     workouts
+#   - when the exercise type changes: the stats keys, under that type, of
+#     the exercises in those recent workouts
+#
+# Lookups are answered from the cache when it knows the key (including
+# "no such doc"), and fall back to Firestore, caching the answer, otherwise.
+# forget(key) after a write bumps a generation counter and records it for
+# the key; a read that started before that generation isn't stored, so a
+# warm still in flight can't put back the stats the write replaced.
+# The thread only touches Firestore and its own dict, never st.*.
+
+import os
+import threading
+import streamlit as st
+from firebase_admin import firestore
+from .budget import budget_scope
+from .utils import build_stats_key
+from .workout_log import workout_items
+
+RECENT_STATS = int(os.environ.get("TERRAPUMP_PREFETCH_STATS", "40"))
+RECENT_WORKOUTS = int(os.environ.get("TERRAPUMP_PREFETCH_WORKOUTS", "3"))
+_MISSING = object()
+
+
+def _item_key(item, ex_type: str) -> str | None:
+    # the stats key `item` would have under `ex_type`, or None if its shape
+    # doesn't fit the type (a cable exercise has an attachment, ...)
+    attachment = item.attachment if item.attachment and item.attachment.lower() != "none" else None
+    if ex_type in ("Machine", "Plate-loaded"):
+        return build_stats_key(ex_type, item.exercise, item.brand, None) if item.brand else None
+    if ex_type == "Cable":
+        return build_stats_key(ex_type, item.exercise, None, attachment) if attachment else None
+    return build_stats_key(ex_type, item.exercise, None, None) if not item.brand and not attachment else None
+
+
+class StatsPrefetcher:
+    def __init__(self, db, uid: str):
+        self.db = db
+        self.uid = uid
+        self._stats = {}          # key -> stats dict, or None for "no doc"
+        self._items = None        # LoggedExercises of the recent workouts
+        self._queue = []          # exercise types (None = the initial warm)
+        self._gen = 0             # bumped by forget()
+        self._forgotten = {}      # key -> generation it was last forgotten at
+        self._lock = threading.Lock()
+        self._thread = None
+        self.counters = {"hits": 0, "misses": 0, "prefetched": 0}
+
+    @property
+    def _user_ref(self):
+        return self.db.collection("users").document(self.uid)
+
+    def warm(self, ex_type: str | None = None):
+        with self._lock:
+            if ex_type not in self._queue:
+                self._queue.append(ex_type)
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="terrapump-prefetch", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._thread = None
+                    return
+                ex_type = self._queue.pop(0)
+            try:
+                # reads count against the user's budget (budget.py)
+                with budget_scope(self.uid):
+                    self._warm(ex_type)
+            except Exception:
+                # speculative: a failed (or over-budget) warm just leaves
+                # lookups to Firestore
+                pass
+
+    def _warm(self, ex_type):
+        stats_ref = self._user_ref.collection("exercise_stats")
+        if self._items is None:
+            gen = self._generation()
+            recent = (stats_ref.order_by("updated_at", direction=firestore.Query.DESCENDING)
+                      .limit(RECENT_STATS).stream())
+            self._store({d.id: d.to_dict() or {} for d in recent}, gen)
+            workouts = (self._user_ref.collection("workouts")
+                        .order_by("start", direction=firestore.Query.DESCENDING).limit(RECENT_WORKOUTS).stream())
+            self._items = [item for w in workouts for item in workout_items(w.to_dict() or {})]
+        types = [ex_type] if ex_type else ["Machine", "Cable", ""]
+        keys = {k for t in types for item in self._items if (k := _item_key(item, t))}
+        with self._lock:
+            keys = sorted(k for k in keys if k not in self._stats)
+        for key in keys:
+            gen = self._generation()
+            doc = stats_ref.document(key).get()
+            self._store({key: (doc.to_dict() or {}) if doc.exists else None}, gen)
+
+    def _generation(self) -> int:
+        with self._lock:
+            return self._gen
+
+    def _store(self, found: dict, gen: int):
+        # keeps what was read at generation `gen`, unless forgotten since
+        with self._lock:
+            fresh = {k: v for k, v in found.items() if self._forgotten.get(k, -1) <= gen}
+            for key, value in fresh.items():
+                self._stats.setdefault(key, value)
+            self.counters["prefetched"] += len(fresh)
+
+    def lookup(self, key: str, legacy_fallbacks: list[str] | None = None) -> dict:
+        # same answer as utils.load_exercise_stats(), from memory when known
+        fetched = False
+        for k in [key, *(legacy_fallbacks or [])]:
+            with self._lock:
+                value = self._stats.get(k, _MISSING)
+            if value is _MISSING:
+                gen = self._generation()
+                doc = self._user_ref.collection("exercise_stats").document(k).get()
+                value = (doc.to_dict() or {}) if doc.exists else None
+                fetched = True
+                with self._lock:
+                    if self._forgotten.get(k, -1) <= gen:
+                        self._stats[k] = value
+            if value is not None:
+                break
+        with self._lock:
+            self.counters["misses" if fetched else "hits"] += 1
+        return value or {}
+
+    def forget(self, key: str):
+        # after writing `key`, so the next lookup reads it back
+        with self._lock:
+            self._stats.pop(key, None)
+            self._gen += 1
+            self._forgotten[key] = self._gen
+
+
+def session_prefetcher(db, uid: str) -> StatsPrefetcher:
+    p = st.session_state.get("_stats_prefetcher")
+    if p is None or p.uid != uid:
+        p = st.session_state["_stats_prefetcher"] = StatsPrefetcher(db, uid)
+    return p
@@ -0,0 +1,248 @@
+# app/profiling.py
+#
+# Opt-in per-rerun profiler. TERRAPUMP_PROFILE=1 (or the Admin toggle)
+# profiles every main() rerun; each profile is tagged with the page and the
+# interaction that triggered it (widget keys whose value changed) and
+# written to TERRAPUMP_PROFILE_DIR:
+#
+#   <stamp>-<page>-<interaction>.speedscope.json   open in speedscope.app
+#   <stamp>-<page>-<interaction>.collapsed.txt     flamegraph.pl / speedscope
+#   <stamp>-<page>-<interaction>.top.txt           top-N hot functions
+#   all.collapsed.txt                              every rerun, appended
+#
+# The default "sample" mode walks the script thread's stack from a helper
+# thread every TERRAPUMP_PROFILE_INTERVAL_MS; TERRAPUMP_PROFILE=cprofile
+# uses cProfile instead and writes a .prof (pstats) next to the top-N.
+# When off, profiled() costs one flag check.
+
+import contextlib
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+import streamlit as st
+
+_MODE_ENV = os.environ.get("TERRAPUMP_PROFILE", "").lower()
+MODE = "cprofile" if _MODE_ENV == "cprofile" else "sample"
+PROFILE_DIR = os.environ.get("TERRAPUMP_PROFILE_DIR", ".terrapump_profiles")
+INTERVAL_MS = float(os.environ.get("TERRAPUMP_PROFILE_INTERVAL_MS", "2"))
+TOP_N = 25
+
+# process-wide switch; the env var sets it at start, the Admin page flips it
+_enabled = _MODE_ENV in ("1", "true", "yes", "sample", "cprofile")
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(on: bool):
+    global _enabled
+    _enabled = bool(on)
+
+
+def _slug(text: str, limit: int = 40) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")[:limit] or "none"
+
+
+def _frame_name(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler(threading.Thread):
+    # records the target thread's stack (root first, minus the `skip`
+    # Streamlit runner frames above the profiled block) every interval
+    def __init__(self, thread_id: int, interval: float, skip: int = 0):
+        super().__init__(name="terrapump-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.skip = skip
+        self.stacks = Counter()   # (code, ...) -> samples
+        self._done = threading.Event()
+
+    def run(self):
+        here = __file__
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename != here:
+                    stack.append(code)
+                frame = frame.f_back
+            stack = stack[::-1][self.skip:]
+            if stack:
+                self.stacks[tuple(stack)] += 1
+
+    def stop(self) -> Counter:
+        self._done.set()
+        self.join()
+        names = {c: _frame_name(c) for stack in self.stacks for c in stack}
+        return Counter({tuple(names[c] for c in stack): n for stack, n in self.stacks.items()})
+
+
+def _frames_above_caller() -> int:
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename in (__file__, contextlib.__file__):
+        frame = frame.f_back
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return max(depth - 1, 0)
+
+
+def _widget_snapshot() -> dict:
+    out = {}
+    for key, value in st.session_state.items():
+        if isinstance(key, str) and not key.startswith("_") and isinstance(value, (str, int, float, bool, type(None))):
+            out[key] = value
+    return out
+
+
+def _interaction(before: dict) -> str:
+    # keys that changed since the previous rerun of this session; clicked
+    # keyed buttons read True for exactly the rerun they triggered
+    prev = st.session_state.get("_profile_widgets", {})
+    changed = [k for k, v in before.items() if prev.get(k) != v and not (v is False and k not in prev)]
+    return "+".join(sorted(changed)[:3]) or "rerun"
+
+
+def _top_from_samples(stacks: Counter, interval_ms: float, n: int) -> str:
+    self_ms, total_ms = Counter(), Counter()
+    for stack, count in stacks.items():
+        self_ms[stack[-1]] += count * interval_ms
+        for name in set(stack):
+            total_ms[name] += count * interval_ms
+    lines = [f"{'self ms':>10}{'total ms':>10}  function"]
+    for name, ms in self_ms.most_common(n):
+        lines.append(f"{ms:>10.1f}{total_ms[name]:>10.1f}  {name}")
+    lines += ["", f"{'total ms':>10}  function (cumulative)"]
+    for name, ms in total_ms.most_common(n):
+        lines.append(f"{ms:>10.1f}  {name}")
+    return "\n".join(lines) + "\n"
+
+
+def _speedscope(stacks: Counter, interval_ms: float, title: str) -> dict:
+    names, index = [], {}
+    samples, weights = [], []
+    for stack, count in stacks.items():
+        ids = []
+        for name in stack:
+            if name not in index:
+                index[name] = len(names)
+                names.append(name)
+            ids.append(index[name])
+        samples.append(ids)
+        weights.append(count * interval_ms)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": [{"name": n} for n in names]},
+        "profiles": [{
+            "type": "sampled", "name": title, "unit": "milliseconds",
+            "startValue": 0, "endValue": sum(weights),
+            "samples": samples, "weights": weights,
+        }],
+        "name": title,
+        "exporter": "terrapump",
+    }
+
+
+def _write(base: str, files: dict[str, str], collapsed: str | None):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    for suffix, text in files.items():
+        with open(os.path.join(PROFILE_DIR, f"{base}.{suffix}"), "w") as f:
+            f.write(text)
+    if collapsed:
+        with _write_lock, open(os.path.join(PROFILE_DIR, "all.collapsed.txt"), "a") as f:
+            f.write(collapsed)
+
+
+@contextlib.contextmanager
+def profiled(name: str, page=None):
+    # page: str, or a callable read when the block ends (the page can change
+    # during a rerun). Nested blocks on the same thread are folded into the
+    # outer profile.
+    if not _enabled or getattr(_local, "active", False):
+        yield
+        return
+    _local.active = True
+    before = _widget_snapshot()
+    t0 = time.perf_counter()
+    if MODE == "cprofile":
+        prof = cProfile.Profile()
+        prof.enable()
+    else:
+        sampler = _Sampler(threading.get_ident(), INTERVAL_MS / 1000, _frames_above_caller())
+        sampler.start()
+    try:
+        yield
+    finally:
+        wall_ms = (time.perf_counter() - t0) * 1000
+        _local.active = False
+        page_name = (page() if callable(page) else page) or name
+        interaction = _interaction(before)
+        st.session_state["_profile_widgets"] = before
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        base = f"{stamp}-{_slug(page_name)}-{_slug(interaction)}"
+        header = f"# {name} · page={page_name} · interaction={interaction} · {wall_ms:.1f} ms\n"
+        if MODE == "cprofile":
+            prof.disable()
+            out = io.StringIO()
+            pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(TOP_N)
+            _write(base, {"top.txt": header + out.getvalue()}, None)
+            prof.dump_stats(os.path.join(PROFILE_DIR, f"{base}.prof"))
+        else:
+            stacks = sampler.stop()
+            tags = (f"page:{page_name}", f"interaction:{interaction}")
+            tagged = Counter({tags + stack: n for stack, n in stacks.items()})
+            collapsed = "".join(f"{';'.join(s)} {n}\n" for s, n in tagged.items())
+            _write(base, {
+                "speedscope.json": json.dumps(_speedscope(tagged, INTERVAL_MS, f"{page_name} · {interaction}")),
+                "collapsed.txt":   collapsed,
+                "top.txt":         header + _top_from_samples(stacks, INTERVAL_MS, TOP_N),
+            }, collapsed)
+        st.session_state["_profile_last"] = base
+
+
+def _profile_calls(fn, page):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return fn(*args, **kwargs)
+        with profiled(fn.__name__, page=page):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def profile_rerun(fn):
+    # for main(): tagged with the page the rerun ended on
+    return _profile_calls(fn, lambda: st.session_state.get("page"))
+
+
+def profile_tab(fn):
+    # for tab_* functions (folded into the rerun's profile when main() is
+    # profiled too)
+    return _profile_calls(fn, fn.__name__)
+
+
+def latest_summary() -> str | None:
+    base = st.session_state.get("_profile_last")
+    if not base:
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{base}.top.txt")) as f:
+            return f.read()
+    except OSError:
+        return None
@@ -0,0 +1,227 @@
+# app/resilience.py
+#
+# Retries, deadlines and a circuit breaker around every Firestore RPC.
+# resilient(client) wraps the client the same way perf.instrument() does:
+# reference-building calls pass through, and each RPC (get, stream, set,
+# update, delete, create, commit, aggregation get) is retried on
+# DEADLINE_EXCEEDED / UNAVAILABLE / RESOURCE_EXHAUSTED with full-jitter
+# exponential backoff, inside a per-operation deadline that is also passed
+# to the client as its `timeout`. The client's own retry is switched off
+# (retry=None, or a never-retrying policy for stream(), whose resume logic
+# reads it), so attempts don't multiply.
+#
+# Operations that still fail count against a circuit breaker per kind
+# (read / write). After BREAKER_FAILURES consecutive failures the circuit
+# opens for BREAKER_COOLDOWN seconds and calls fail fast with
+# CircuitOpenError; the first call after that is the trial that closes it.
+# Of the errors that aren't retried, only server faults (INTERNAL, UNKNOWN,
+# DATA_LOSS, ...) count as failures; the service answering NotFound or
+# InvalidArgument is a success, and a local error (bad arguments, a
+# too-large batch) doesn't touch the breaker except to end a trial.
+# Loaders behind shared_cache serve their last good value meanwhile and
+# note it, so the page can show a "stale data" notice.
+
+import os
+import random
+import threading
+import time
+from google.api_core import exceptions as gexc
+from google.api_core.retry import Retry
+
+READ_DEADLINE = float(os.environ.get("TERRAPUMP_READ_DEADLINE", "10"))
+WRITE_DEADLINE = float(os.environ.get("TERRAPUMP_WRITE_DEADLINE", "20"))
+MAX_ATTEMPTS = int(os.environ.get("TERRAPUMP_RETRY_ATTEMPTS", "5"))
+BACKOFF_BASE = 0.1
+BACKOFF_CAP = 2.0
+BREAKER_FAILURES = int(os.environ.get("TERRAPUMP_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("TERRAPUMP_BREAKER_COOLDOWN", "30"))
+
+RETRYABLE = (gexc.DeadlineExceeded, gexc.ServiceUnavailable, gexc.ResourceExhausted)
+
+_READS = {"get", "stream"}
+_WRITES = {"set", "update", "delete", "create", "commit"}
+# auto-id add() is not idempotent: a retry after a lost response duplicates it
+_NO_RETRY = {"add"}
+# Query.stream() resumes after a dropped stream by asking its retry policy,
+# so it needs a policy object rather than None
+_STREAM_NO_RETRY = Retry(predicate=lambda exc: False)
+_CHAIN = {
+    "collection", "collection_group", "document", "where", "order_by", "limit",
+    "limit_to_last", "offset", "select", "start_at", "start_after", "end_at",
+    "end_before", "batch", "count", "sum", "avg",
+}
+
+
+class CircuitOpenError(gexc.ServiceUnavailable):
+    pass
+
+
+def is_unavailable(exc: BaseException) -> bool:
+    # errors a read may answer with cached data
+    return isinstance(exc, RETRYABLE)
+
+
+def is_server_fault(exc: BaseException) -> bool:
+    # non-retryable errors that still say the service is unhealthy
+    return isinstance(exc, gexc.ServerError) and not isinstance(exc, gexc.MethodNotImplemented)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial:
+                raise CircuitOpenError(f"Firestore {self.name} circuit open")
+            self._trial = True
+
+    def success(self):
+        with self._lock:
+            self.failures, self.opened_at, self._trial = 0, None, False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                if self.opened_at is None or self._trial:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+    def release(self):
+        # the call never reached the service: let the next one be the trial
+        with self._lock:
+            self._trial = False
+
+
+breakers = {"read": CircuitBreaker("read"), "write": CircuitBreaker("write")}
+counters = {"retries": 0, "failures": 0, "fast_fails": 0}
+_counter_lock = threading.Lock()
+
+
+def _bump(name: str):
+    with _counter_lock:
+        counters[name] += 1
+
+
+def call_with_retry(fn, kind: str = "read", deadline: float | None = None, retry: bool = True):
+    # fn(timeout) -> result; retried within `deadline` seconds
+    breaker = breakers[kind]
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        _bump("fast_fails")
+        raise
+    deadline = deadline or (READ_DEADLINE if kind == "read" else WRITE_DEADLINE)
+    start = time.monotonic()
+    attempt = 0
+    while True:
+        remaining = deadline - (time.monotonic() - start)
+        try:
+            result = fn(max(remaining, 0.001))
+        except RETRYABLE as e:
+            attempt += 1
+            sleep = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            out_of_time = time.monotonic() - start + sleep >= deadline
+            if not retry or attempt >= MAX_ATTEMPTS or out_of_time:
+                _bump("failures")
+                breaker.failure()
+                raise e
+            _bump("retries")
+            time.sleep(sleep)
+            continue
+        except gexc.GoogleAPICallError as e:
+            if is_server_fault(e):
+                _bump("failures")
+                breaker.failure()
+            else:
+                # the service answered (NotFound, InvalidArgument, ...)
+                breaker.success()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.success()
+        return result
+
+
+def _unwrap(v):
+    return v._target if isinstance(v, _Resilient) else v
+
+
+class _Resilient:
+    __slots__ = ("_target", "_in_batch")
+
+    def __init__(self, target, in_batch=False):
+        self._target = target
+        self._in_batch = in_batch
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            args = [_unwrap(a) for a in args]
+            kwargs = {k: _unwrap(v) for k, v in kwargs.items()}
+            if self._in_batch and name != "commit":
+                # batch set/update/delete only queue locally
+                return attr(*args, **kwargs)
+            if name == "stream":
+                # errors surface while iterating, so read it all in the retry
+                return iter(call_with_retry(
+                    lambda t: list(attr(*args, **{"retry": _STREAM_NO_RETRY, "timeout": t, **kwargs})),
+                    "read"))
+            if name in _READS or name in _WRITES or name in _NO_RETRY:
+                kind = "read" if name in _READS else "write"
+                return call_with_retry(
+                    lambda t: attr(*args, **{"retry": None, "timeout": t, **kwargs}), kind,
+                    retry=name not in _NO_RETRY)
+            result = attr(*args, **kwargs)
+            if name == "batch":
+                return _Resilient(result, in_batch=True)
+            if name in _CHAIN:
+                return _Resilient(result)
+            return result
+        return call
+
+
+def resilient(client):
+    return _Resilient(client)
+
+
+def breaker_status() -> dict:
+    return {name: {"state": b.state, "failures": b.failures, "trips": b.trips}
+            for name, b in breakers.items()} | {"counters": dict(counters)}
+
+# --- Stale-data notices (per script thread, i.e. per rerun) ---
+
+_stale = threading.local()
+
+
+def note_stale(source: str):
+    if not hasattr(_stale, "sources"):
+        _stale.sources = set()
+    _stale.sources.add(source)
+
+
+def pop_stale() -> set[str]:
+    sources = getattr(_stale, "sources", set())
+    _stale.sources = set()
+    return sources
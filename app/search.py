@@ -0,0 +1,175 @@
+# app/search.py
+
+import datetime
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from .utils import build_stats_key, slugify
+
+# how fast "recently used" fades out of the ranking
+USAGE_HALF_LIFE_DAYS = 14.0
+# a just-used exercise gets this much on top of its text score (max 1.0)
+USAGE_WEIGHT = 0.5
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _norm(text: str) -> str:
+    return " ".join(_WORD_RE.findall((text or "").lower()))
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ExerciseIndex:
+    # Items are dicts with at least "kind" (library | machine | attachment),
+    # "name", "type" and "key" (the exercise_stats key used for ranking).
+    # Cable exercises also carry "key_prefix": their usage is logged per
+    # attachment ("<exercise>--<attachment>"), so all of those count.
+    # Postings hold integer item ids so a search is a few dict lookups plus
+    # a counter over the candidates.
+
+    def __init__(self, items: list[dict]):
+        self.items = items
+        self._text = [_norm(" ".join(filter(None, (it["name"], it.get("brand"), it.get("type")))))
+                      for it in items]
+        self._gram_count = []
+        self._grams = defaultdict(list)
+        self._prefix = defaultdict(list)
+        for i, text in enumerate(self._text):
+            grams = _trigrams(text)
+            self._gram_count.append(len(grams))
+            for g in grams:
+                self._grams[g].append(i)
+            seen = set()
+            for word in text.split():
+                for n in range(1, min(len(word), 3) + 1):
+                    p = word[:n]
+                    if p not in seen:
+                        seen.add(p)
+                        self._prefix[p].append(i)
+
+    def __len__(self):
+        return len(self.items)
+
+    def search(self, query: str, limit: int = 10, usage: dict | None = None) -> list[dict]:
+        q = _norm(query)
+        if not q:
+            return []
+        usage_scores = _usage_scores(usage or {})
+
+        scores = {}
+        words = q.split()
+        if len(q) < 3:
+            # too short for trigrams: every word must prefix-match a token
+            cand = None
+            for w in words:
+                ids = self._prefix.get(w, ())
+                cand = set(ids) if cand is None else cand.intersection(ids)
+            scores = dict.fromkeys(cand or (), 0.5)
+        else:
+            qgrams = _trigrams(q)
+            shared_counts = Counter()
+            for g in qgrams:
+                shared_counts.update(self._grams.get(g, ()))
+            nq = len(qgrams)
+            # a candidate can't reach the similarity floor with fewer shared grams
+            min_shared = max(1, int(0.15 * nq))
+            for i, shared in shared_counts.items():
+                if shared < min_shared:
+                    continue
+                # Jaccard over trigram sets, ignore weak matches
+                sim = shared / (nq + self._gram_count[i] - shared)
+                if sim < 0.15:
+                    continue
+                if self._text[i].startswith(q):
+                    sim += 0.25
+                scores[i] = sim
+
+        for i in scores:
+            scores[i] += USAGE_WEIGHT * usage_scores(self.items[i])
+        best = heapq.nlargest(limit, scores.items(), key=lambda kv: kv[1])
+        return [self.items[i] | {"score": round(s, 3)} for i, s in best]
+
+
+def _usage_scores(usage: dict):
+    # usage is {stats_key: updated_at}; decay each by age, and fold
+    # "<exercise>--<attachment>" keys into their attachment and (for Cable
+    # items' key_prefix) their exercise too
+    now = datetime.datetime.now(datetime.timezone.utc)
+    by_key, by_attach, by_prefix = {}, {}, {}
+    for key, ts in usage.items():
+        if hasattr(ts, "to_datetime"):
+            ts = ts.to_datetime()
+        if not isinstance(ts, datetime.datetime):
+            continue
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=datetime.timezone.utc)
+        age = max((now - ts).total_seconds() / 86400, 0.0)
+        w = math.exp(-math.log(2) * age / USAGE_HALF_LIFE_DAYS)
+        by_key[key] = max(by_key.get(key, 0.0), w)
+        if "--" in key:
+            head, tail = key.rsplit("--", 1)
+            by_attach[tail] = max(by_attach.get(tail, 0.0), w)
+            by_prefix[f"{head}--"] = max(by_prefix.get(f"{head}--", 0.0), w)
+
+    def score(item):
+        if item["kind"] == "attachment":
+            return by_attach.get(slugify(item["name"]), 0.0)
+        if "key_prefix" in item:
+            return by_prefix.get(item["key_prefix"], 0.0)
+        return by_key.get(item["key"], 0.0)
+    return score
+
+
+def _cable(item: dict) -> dict:
+    if item["type"] == "Cable":
+        item["key_prefix"] = f"{slugify(item['name'])}--"
+    return item
+
+
+def build_exercise_index(library: list[dict], machines: list[dict], attachments: list[dict]) -> ExerciseIndex:
+    items = []
+    for e in library:
+        if not e.get("name"):
+            continue
+        ex_type = e.get("type", "")
+        items.append(_cable({
+            "kind": "library",
+            "name": e["name"],
+            "type": ex_type,
+            "key":  build_stats_key(ex_type, e["name"], None, None),
+        }))
+    for m in machines:
+        if not m.get("name"):
+            continue
+        ex_type = m.get("type", "Machine")
+        items.append(_cable({
+            "kind":     "machine",
+            "name":     m["name"],
+            "type":     ex_type,
+            "brand":    m.get("brand"),
+            "brand_id": m.get("brand_id"),
+            "key":      build_stats_key(ex_type, m["name"], m.get("brand"), None),
+        }))
+    for a in attachments:
+        if not a.get("name"):
+            continue
+        items.append({
+            "kind": "attachment",
+            "name": a["name"],
+            "type": a.get("type", "Cable"),
+            "key":  slugify(a["name"]),
+        })
+    return ExerciseIndex(items)
+
+
+def search_label(item: dict) -> str:
+    if item["kind"] == "machine":
+        return f"{item['name']} ({item.get('brand')}) · {item['type']}"
+    if item["kind"] == "attachment":
+        return f"{item['name']} · attachment"
+    return f"{item['name']} · {item['type']}"
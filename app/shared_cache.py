@@ -0,0 +1,399 @@
+# app/shared_cache.py
+#
+# Cache for the Firestore loaders in utils.py that every replica can share.
+# st.cache_data is per process, so each replica used to re-read the same
+# catalog and entries and never heard about the others' invalidations.
+#
+# Keys are versioned per namespace ("catalog", "entries/<uid>", ...):
+#
+#   tp:ver:<namespace>                 integer, bumped by invalidate()
+#   tp:val:<namespace>:v<n>:<call>     pickled loader result
+#
+# so invalidating is one INCR and stale values simply stop being addressed.
+# The in-process backend drops a namespace's older versions right away; the
+# others let them age out through their TTL (the file backend sweeps
+# expired files as it writes). Replicas keep the version numbers in a
+# short-lived local copy (TERRAPUMP_CACHE_LOCAL_TTL seconds); backends with
+# pub/sub drop that copy as soon as another replica invalidates.
+#
+# Every load also keeps an unversioned "last good" copy that outlives the
+# value (TERRAPUMP_CACHE_LAST_TTL seconds, a day by default); when the
+# loader fails because Firestore is unavailable (see resilience.py) or the
+# user is out of read budget (budget.py) that copy is served instead and
+# the namespace is noted as stale / throttled. The in-process backend holds
+# at most TERRAPUMP_CACHE_MEMORY_MB of values, least recently used first out.
+#
+# TERRAPUMP_CACHE_URL picks the backend:
+#   memory://                 in-process (default; one replica)
+#   file:///var/tmp/tp-cache  one file per key, shared by processes on one host
+#   diskcache:///path         diskcache.Cache (pip install diskcache)
+#   redis://host:6379/0       Redis or anything speaking its protocol
+#                             (pip install redis)
+#
+# File backend entries are a small header (magic, expiry, value type), an
+# HMAC-SHA256 of header and value, then the raw bytes or counter; a file
+# whose MAC doesn't verify is treated as missing, so nothing written into
+# the directory by anyone without the key is ever unpickled. The key is
+# TERRAPUMP_CACHE_SECRET, or one generated into <dir>/.key (mode 0600) and
+# shared by every process using that directory. Sweeping reads only the
+# header.
+
+import fcntl
+import functools
+import hashlib
+import hmac
+import os
+import pickle
+import secrets
+import struct
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+from .budget import BudgetExceeded, note_throttled
+from .resilience import is_unavailable, note_stale
+
+CACHE_URL = os.environ.get("TERRAPUMP_CACHE_URL", "memory://")
+LOCAL_TTL = float(os.environ.get("TERRAPUMP_CACHE_LOCAL_TTL", "5"))
+LAST_TTL = float(os.environ.get("TERRAPUMP_CACHE_LAST_TTL", str(24 * 3600)))
+MEMORY_MB = float(os.environ.get("TERRAPUMP_CACHE_MEMORY_MB", "64"))
+CACHE_SECRET = os.environ.get("TERRAPUMP_CACHE_SECRET", "")
+SWEEP_INTERVAL = 60
+PREFIX = "tp"
+CHANNEL = f"{PREFIX}:invalidate"
+
+
+class MemoryBackend:
+    # single process; publish() calls subscribers inline. Byte values count
+    # towards max_bytes and are evicted least recently used first; counters
+    # (the version numbers) are never evicted.
+    shared = False
+
+    def __init__(self, max_bytes: int = int(MEMORY_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()   # key -> (value, expires_at | None)
+        self._bytes = 0
+        self._subs = []
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        hit = self._data.pop(key, None)
+        if hit is not None and isinstance(hit[0], bytes):
+            self._bytes -= len(hit[0])
+        return hit
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            value, expires_at = hit
+            if expires_at is not None and expires_at < time.time():
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value: bytes, ttl: float | None = None):
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            if isinstance(value, bytes):
+                self._bytes += len(value)
+            if self._bytes > self.max_bytes:
+                for k, (v, _) in list(self._data.items()):
+                    if self._bytes <= self.max_bytes:
+                        break
+                    if isinstance(v, bytes) and k != key:
+                        self._pop(k)
+
+    def incr(self, key) -> int:
+        with self._lock:
+            value = int(self._data.get(key, (0, None))[0]) + 1
+            self._data[key] = (value, None)
+            return value
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [k for k in self._data if k.startswith(prefix)]
+            for k in keys:
+                self._pop(k)
+            return len(keys)
+
+    def publish(self, channel, message: str):
+        for callback in list(self._subs):
+            callback(message)
+
+    def subscribe(self, channel, callback):
+        self._subs.append(callback)
+
+
+class FileBackend:
+    # one file per key under `root`; the version counter is the only thing
+    # that needs a lock. No pub/sub: replicas see new versions within
+    # LOCAL_TTL seconds. Values are bytes (pickles made by SharedCache) or
+    # int counters, stored as-is behind a signed header.
+    shared = True
+    MAGIC = b"TPC1"
+    HEADER = struct.Struct("<4sdc")      # magic, expires_at (0 = never), b"b" / b"i"
+    MAC_SIZE = hashlib.sha256().digest_size
+
+    def __init__(self, root: str, secret: str = CACHE_SECRET):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._key = secret.encode() if secret else self._load_key()
+        self._swept_at = 0.0
+
+    def _load_key(self) -> bytes:
+        # first process to get here creates it; the others read theirs
+        path = os.path.join(self.root, ".key")
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _path(self, key) -> str:
+        return os.path.join(self.root, hashlib.sha1(key.encode()).hexdigest())
+
+    def _mac(self, header: bytes, body: bytes) -> bytes:
+        return hmac.new(self._key, header + body, hashlib.sha256).digest()
+
+    def sweep(self) -> int:
+        # remove expired files, superseded versions included, and files in
+        # any other format; only the header is read
+        removed, now = 0, time.time()
+        for name in os.listdir(self.root):
+            if name.startswith(".") or len(name) != 40:
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                with open(path, "rb") as f:
+                    head = f.read(self.HEADER.size)
+                magic, expires_at, _ = self.HEADER.unpack(head) if len(head) == self.HEADER.size \
+                    else (None, 0.0, None)
+                if magic != self.MAGIC or 0 < expires_at < now:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        size = self.HEADER.size
+        if len(data) < size + self.MAC_SIZE:
+            return None
+        header, mac, body = data[:size], data[size:size + self.MAC_SIZE], data[size + self.MAC_SIZE:]
+        magic, expires_at, kind = self.HEADER.unpack(header)
+        if magic != self.MAGIC or not hmac.compare_digest(mac, self._mac(header, body)):
+            return None
+        if 0 < expires_at < time.time():
+            return None
+        return int(body) if kind == b"i" else body
+
+    def set(self, key, value, ttl: float | None = None):
+        if isinstance(value, int):
+            kind, body = b"i", str(value).encode()
+        else:
+            kind, body = b"b", bytes(value)
+        header = self.HEADER.pack(self.MAGIC, time.time() + ttl if ttl else 0.0, kind)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(header + self._mac(header, body) + body)
+        os.replace(tmp, path)
+        if time.time() - self._swept_at > SWEEP_INTERVAL:
+            self._swept_at = time.time()
+            self.sweep()
+
+    def incr(self, key) -> int:
+        with open(os.path.join(self.root, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                value = int(self.get(key) or 0) + 1
+                self.set(key, value)
+                return value
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def publish(self, channel, message):
+        pass
+
+    def subscribe(self, channel, callback):
+        pass
+
+
+class DiskCacheBackend:
+    shared = True
+
+    def __init__(self, directory: str):
+        import diskcache
+        self._cache = diskcache.Cache(directory)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl: float | None = None):
+        self._cache.set(key, value, expire=ttl)
+
+    def incr(self, key) -> int:
+        return self._cache.incr(key, default=0)
+
+    def publish(self, channel, message):
+        pass
+
+    def subscribe(self, channel, callback):
+        pass
+
+
+class RedisBackend:
+    shared = True
+
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._pubsub = None
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl: float | None = None):
+        self._client.set(key, value, ex=int(ttl) if ttl else None)
+
+    def incr(self, key) -> int:
+        return int(self._client.incr(key))
+
+    def publish(self, channel, message):
+        self._client.publish(channel, message)
+
+    def subscribe(self, channel, callback):
+        if self._pubsub is None:
+            self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{channel: lambda msg: callback(msg["data"].decode())})
+        self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+
+def backend_from_url(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemoryBackend()
+    if parsed.scheme == "file":
+        return FileBackend(parsed.path)
+    if parsed.scheme == "diskcache":
+        return DiskCacheBackend(parsed.path)
+    if parsed.scheme in ("redis", "rediss", "unix"):
+        return RedisBackend(url)
+    raise ValueError(f"unsupported TERRAPUMP_CACHE_URL: {url}")
+
+
+class SharedCache:
+    def __init__(self, backend, local_ttl: float = LOCAL_TTL):
+        self.backend = backend
+        self.local_ttl = local_ttl if backend.shared else 0
+        self._versions = {}   # namespace -> (version, read_at)
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0, "stale": 0}
+        backend.subscribe(CHANNEL, self._on_invalidate)
+
+    def _on_invalidate(self, namespace: str):
+        with self._lock:
+            self._versions.pop(namespace, None)
+
+    def version(self, namespace: str) -> int:
+        now = time.time()
+        with self._lock:
+            hit = self._versions.get(namespace)
+            if hit is not None and now - hit[1] < self.local_ttl:
+                return hit[0]
+        version = int(self.backend.get(f"{PREFIX}:ver:{namespace}") or 0)
+        with self._lock:
+            self._versions[namespace] = (version, now)
+        return version
+
+    def get_or_load(self, namespace: str, call_key: str, loader, ttl: float | None = None):
+        key = f"{PREFIX}:val:{namespace}:v{self.version(namespace)}:{call_key}"
+        raw = self.backend.get(key)
+        if raw is not None:
+            self.counters["hits"] += 1
+            # fresh objects on every read, like st.cache_data
+            return pickle.loads(raw)
+        self.counters["misses"] += 1
+        last_key = f"{PREFIX}:last:{namespace}:{call_key}"
+        try:
+            value = loader()
+        except Exception as e:
+            # Firestore down, circuit open or over budget: serve the last good value
+            throttled = isinstance(e, BudgetExceeded)
+            raw = self.backend.get(last_key) if throttled or is_unavailable(e) else None
+            if raw is None:
+                raise
+            self.counters["stale"] += 1
+            (note_throttled if throttled else note_stale)(namespace.split("/")[0])
+            return pickle.loads(raw)
+        raw = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.backend.set(key, raw, ttl)
+        self.backend.set(last_key, raw, LAST_TTL)   # the fallback outlives the value
+        return value
+
+    def invalidate(self, namespace: str) -> int:
+        version = self.backend.incr(f"{PREFIX}:ver:{namespace}")
+        purge = getattr(self.backend, "delete_prefix", None)
+        if purge is not None:
+            # nothing addresses the older versions any more
+            purge(f"{PREFIX}:val:{namespace}:")
+        with self._lock:
+            self._versions[namespace] = (version, time.time())
+            self.counters["invalidations"] += 1
+        self.backend.publish(CHANNEL, namespace)
+        return version
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> SharedCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SharedCache(backend_from_url(CACHE_URL))
+        return _cache
+
+
+def invalidate(namespace: str) -> int:
+    return get_shared_cache().invalidate(namespace)
+
+
+def namespace_version(namespace: str) -> int:
+    return get_shared_cache().version(namespace)
+
+
+def shared_cached(namespace, ttl: float | None = 600):
+    # namespace is a string, or a function of the call's arguments for
+    # per-user namespaces, e.g. lambda uid, *_: f"entries/{uid}"
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            ns = namespace(*args, **kwargs) if callable(namespace) else namespace
+            call_key = f"{fn.__module__}.{fn.__qualname__}:{args!r}:{sorted(kwargs.items())!r}"
+            return get_shared_cache().get_or_load(ns, call_key, lambda: fn(*args, **kwargs), ttl)
+        wrapper.uncached = fn
+        return wrapper
+    return deco
@@ -0,0 +1,167 @@
+# app/synthetic.py
+#
+# Synthetic users for load tests and benchmarks: daily entries, saved
+# workouts (legacy entry shape) and exercise_stats, plus a small catalog.
+# Everything is seeded so runs are reproducible.
+
+import datetime
+import random
+from .utils import build_stats_key, slugify
+
+BRANDS = {
+    "Hammer Strength": [
+        ("Chest Press", "Plate-loaded", 0), ("Iso-Lateral Row", "Plate-loaded", 0),
+        ("Leg Press", "Plate-loaded", 90), ("Shoulder Press", "Plate-loaded", 0),
+    ],
+    "Life Fitness": [
+        ("Leg Extension", "Machine", 20), ("Seated Leg Curl", "Machine", 20),
+        ("Pec Fly", "Machine", 15), ("Lat Pulldown", "Machine", 30),
+    ],
+}
+LIBRARY = [
+    ("Bench Press", "Barbell", 45), ("Back Squat", "Barbell", 45), ("Deadlift", "Barbell", 45),
+    ("Incline Dumbbell Press", "Dumbbell", 20), ("Dumbbell Curl", "Dumbbell", 15),
+    ("Lateral Raise", "Dumbbell", 10), ("Pull Up", "Bodyweight", 0), ("Dip", "Bodyweight", 0),
+    ("Tricep Pushdown", "Cable", 20), ("Cable Row", "Cable", 40), ("Face Pull", "Cable", 15),
+    ("Leg Extension", "Machine", 20),
+]
+ATTACHMENTS = [("Rope", 0), ("Straight Bar", 0), ("V Bar", 0), ("D Handle", 0)]
+SPLITS = ["Push", "Pull", "Legs", "Upper", "Lower"]
+
+
+def _exercise_pool():
+    pool = [(name, t, None, None, wt) for name, t, wt in LIBRARY if t not in ("Cable", "Machine")]
+    pool += [(name, t, None, att, wt) for name, t, wt in LIBRARY if t == "Cable" for att, _ in ATTACHMENTS[:2]]
+    pool += [(name, t, brand, None, wt) for brand, ms in BRANDS.items() for name, t, wt in ms]
+    return pool
+
+
+def synthetic_entries(days: int, seed: int = 0, end: datetime.date | None = None, gap_rate: float = 0.1) -> list[dict]:
+    rng = random.Random(seed)
+    end = end or datetime.date.today()
+    weight = rng.uniform(150, 220)
+    trend = rng.uniform(-0.05, 0.03)
+    out = []
+    for i in range(days):
+        day = end - datetime.timedelta(days=days - 1 - i)
+        weight += trend + rng.gauss(0, 0.6)
+        if rng.random() < gap_rate:
+            continue
+        trained = rng.random() < 0.6
+        out.append({
+            "Date":       str(day),
+            "Weight":     round(weight, 1) if rng.random() > 0.15 else 0,
+            "Calories":   int(rng.gauss(2400, 300)),
+            "Protein":    int(rng.gauss(160, 25)),
+            "Carbs":      int(rng.gauss(250, 40)),
+            "Fats":       int(rng.gauss(75, 15)),
+            "Steps":      int(max(rng.gauss(8500, 2500), 0)),
+            "SleepHours": round(rng.uniform(5.5, 9), 2),
+            "Training":   rng.choice(SPLITS) if trained else "Rest",
+            "Cardio":     int(rng.random() < 0.3) * rng.randint(10, 40),
+        })
+    return out
+
+
+def synthetic_workouts(days: int, seed: int = 0, per_week: float = 4, end: datetime.date | None = None) -> list[tuple[str, dict]]:
+    # [(doc_id, workouts doc)] in the shape End Workout has always written
+    rng = random.Random(seed + 1)
+    end = end or datetime.date.today()
+    pool = _exercise_pool()
+    out = []
+    for i in range(days):
+        if rng.random() > per_week / 7:
+            continue
+        day = end - datetime.timedelta(days=days - 1 - i)
+        start = datetime.datetime.combine(day, datetime.time(rng.randint(6, 20), rng.choice([0, 15, 30, 45])))
+        entries = []
+        for j, (name, ex_type, brand, att, base_wt) in enumerate(rng.sample(pool, rng.randint(3, 6))):
+            sets = rng.randint(2, 5)
+            unilateral = ex_type == "Dumbbell" and rng.random() < 0.2
+            wt = float(base_wt + 5 * rng.randint(0, 20))
+            reps = [rng.randint(5, 12) for _ in range(sets)]
+            weights = [wt] * sets
+            if unilateral:
+                reps = [{"left": r, "right": max(r - rng.randint(0, 1), 1)} for r in reps]
+                weights = [{"left": w, "right": w} for w in weights]
+            entries.append({
+                "exercise":   name,
+                "attachment": att,
+                "brand":      brand,
+                "sets":       sets,
+                "reps":       reps,
+                "weights":    weights,
+                "unilateral": unilateral,
+                "logged_at":  start + datetime.timedelta(minutes=8 * (j + 1)),
+                "type":       ex_type,
+            })
+        out.append((start.isoformat(), {
+            "name":      f"{rng.choice(SPLITS)} {day}",
+            "start":     start,
+            "entries":   entries,
+            "timestamp": start + datetime.timedelta(hours=1),
+        }))
+    return out
+
+
+def synthetic_stats(workouts: list[tuple[str, dict]]) -> dict:
+    # latest sets per exercise, keyed like the app's exercise_stats
+    stats = {}
+    for _, w in workouts:
+        for e in w["entries"]:
+            key = build_stats_key(e.get("type", ""), e["exercise"], e.get("brand"), e.get("attachment"))
+            stats[key] = {
+                "prev_sets":   e["sets"],
+                "prev_reps":   e["reps"],
+                "prev_weight": e["weights"],
+                "brand":       e.get("brand"),
+                "attachment":  e.get("attachment"),
+                "updated_at":  e["logged_at"],
+            }
+    return stats
+
+
+def _write_all(db, writes):
+    batch, n = db.batch(), 0
+    for ref, data in writes:
+        batch.set(ref, data)
+        n += 1
+        if n == 500:
+            batch.commit()
+            batch, n = db.batch(), 0
+    if n:
+        batch.commit()
+
+
+def seed_catalog(db):
+    writes = []
+    for brand, machines in BRANDS.items():
+        bid = slugify(brand)
+        writes.append((db.collection("brands").document(bid), {"name": brand}))
+        for name, t, wt in machines:
+            writes.append((
+                db.collection("brands").document(bid).collection("machines").document(slugify(name)),
+                {"name": name, "type": t, "default_starting_weight": float(wt)},
+            ))
+    for name, t, wt in LIBRARY:
+        writes.append((db.collection("exercise_library").document(slugify(name)),
+                       {"name": name, "type": t, "default_weight": float(wt)}))
+    for name, wt in ATTACHMENTS:
+        writes.append((db.collection("attachments").document(slugify(name)),
+                       {"name": name, "type": "Cable", "default_weight": float(wt)}))
+    _write_all(db, writes)
+
+
+def seed_user(db, uid: str, email: str, days: int, seed: int = 0) -> dict:
+    user_ref = db.collection("users").document(uid)
+    entries = synthetic_entries(days, seed)
+    workouts = synthetic_workouts(days, seed)
+    stats = synthetic_stats(workouts)
+    writes = [(user_ref, {"email": email, "created_at": datetime.datetime.now(datetime.timezone.utc)})]
+    writes += [(user_ref.collection("entries").document(e["Date"]), e) for e in entries]
+    for doc_id, w in workouts:
+        w = w | {"entries": [{k: v for k, v in e.items() if k != "type"} for e in w["entries"]]}
+        writes.append((user_ref.collection("workouts").document(doc_id), w))
+    writes += [(user_ref.collection("exercise_stats").document(k), v) for k, v in stats.items()]
+    _write_all(db, writes)
+    return {"entries": len(entries), "workouts": len(workouts), "exercise_stats": len(stats)}
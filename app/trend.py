@@ -0,0 +1,211 @@
+# app/trend.py
+#
+# Weight trend for the Graphs tab, all NumPy:
+#
+#   ewma   time-aware exponential moving average of the weigh-ins (half-life
+#          HALFLIFE_DAYS; a gap of k days decays the old value k times)
+#   rate   slope of a least-squares line through the weigh-ins of the last
+#          WINDOW_DAYS days, in lbs/day (NaN below MIN_POINTS weigh-ins)
+#
+# and project() turns the latest trend and rate into a date for a target
+# weight: none when the rate is below FLAT_RATE (a flat history fits to
+# float noise, not zero) or the date is over MAX_PROJECTION_DAYS away.
+#
+# fit() is incremental: given the previous WeightTrend and a history that
+# only appended weigh-ins to it, it computes the new rows only (the EWMA
+# continues from its last value, the regression from stored prefix sums)
+# instead of refitting the whole history. TrendCache keeps the fitted
+# trends within TERRAPUMP_TREND_MB, least recently used first out.
+
+import datetime
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+HALFLIFE_DAYS = 7.0
+WINDOW_DAYS = 28
+MIN_POINTS = 5
+FLAT_RATE = 1e-3             # lbs/day; slower than this is no trend
+MAX_PROJECTION_DAYS = 3650
+MAX_MB = float(os.environ.get("TERRAPUMP_TREND_MB", "16"))
+# per-row log-decay floor (a gap this long resets the average) and the
+# block span that keeps exp() of the rebased cumulative decay finite
+_MAX_ROW_DECAY = 50.0
+_BLOCK_DECAY = 500.0
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+@dataclass(slots=True)
+class WeightTrend:
+    days: np.ndarray        # int64 days since 1970-01-01, ascending, unique
+    weights: np.ndarray     # float64
+    ewma: np.ndarray        # float64
+    rate: np.ndarray        # float64 lbs/day, NaN where too few points
+    log_decay: np.ndarray   # float64 cumulative log decay (EWMA state)
+    sums: np.ndarray        # (n + 1, 5) prefix sums of 1, x, y, xy, xx
+
+    @property
+    def last_date(self) -> datetime.date | None:
+        return (_EPOCH + int(self.days[-1])).astype(datetime.date) if len(self.days) else None
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+
+def weigh_ins(dates, weights) -> tuple[np.ndarray, np.ndarray]:
+    # Date / Weight columns -> (days, weights): zeros and blanks dropped,
+    # one weigh-in per day (the last one), ascending
+    d = pd.to_datetime(pd.Series(dates), errors="coerce").to_numpy(dtype="datetime64[D]")
+    w = pd.to_numeric(pd.Series(weights), errors="coerce").to_numpy(dtype=np.float64)
+    keep = ~np.isnat(d) & np.isfinite(w) & (w > 0)
+    days = (d[keep] - _EPOCH).astype(np.int64)
+    w = w[keep]
+    order = np.argsort(days, kind="stable")
+    days, w = days[order], w[order]
+    last = np.r_[days[1:] != days[:-1], True] if len(days) else np.zeros(0, dtype=bool)
+    return days[last], w[last]
+
+
+def _ewma(days, weights, prev_days, prev_ewma, prev_log):
+    # blocks of rows whose rebased cumulative decay stays under _BLOCK_DECAY;
+    # inside a block the recurrence e_i = (1 - a_i) e_{i-1} + a_i w_i is
+    #   e_i = D_i (seed + sum_{j<=i} a_j w_j / D_j),  D_i = prod (1 - a_k)
+    n = len(days)
+    rate = np.log(2) / HALFLIFE_DAYS
+    if prev_days is None:
+        gaps = np.r_[0.0, np.diff(days).astype(np.float64)]
+        seed, base = weights[0], 0.0
+    else:
+        gaps = np.diff(np.r_[prev_days, days]).astype(np.float64)
+        seed, base = prev_ewma, prev_log
+    log_keep = -np.minimum(gaps * rate, _MAX_ROW_DECAY)   # log(1 - a_i)
+    alpha = -np.expm1(log_keep)
+    cum = base + np.cumsum(log_keep)
+    out = np.empty(n)
+    block = np.floor((base - cum) / _BLOCK_DECAY).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, block[1:] != block[:-1]])
+    for s, e in zip(starts, np.r_[starts[1:], n]):
+        ref = cum[s - 1] if s else base
+        rel = cum[s:e] - ref
+        decay = np.exp(rel)
+        out[s:e] = decay * (seed + np.cumsum(alpha[s:e] * weights[s:e] / decay))
+        seed = out[e - 1]
+    return out, cum
+
+
+def _rate(sums, lo, hi):
+    # slope over rows [lo, hi) per output row, from prefix sums
+    s = sums[hi] - sums[lo]
+    n, sx, sy, sxy, sxx = s.T
+    den = n * sxx - sx * sx
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * sxy - sx * sy) / den
+    return np.where((n >= MIN_POINTS) & (den > 0), slope, np.nan)
+
+
+def fit(days: np.ndarray, weights: np.ndarray, prev: WeightTrend | None = None) -> WeightTrend:
+    n = len(days)
+    if n == 0:
+        z = np.zeros(0)
+        return WeightTrend(days, weights, z, z, z, np.zeros((1, 5)))
+    k = len(prev.days) if prev is not None else 0
+    extends = (prev is not None and 0 < k <= n
+               and np.array_equal(days[:k], prev.days) and np.array_equal(weights[:k], prev.weights))
+    if not extends:
+        prev, k = None, 0
+    if prev is not None and k == n:
+        return prev
+
+    new_days, new_w = days[k:], weights[k:]
+    if prev is None:
+        ewma, log_decay = _ewma(new_days, new_w, None, None, None)
+    else:
+        ewma, log_decay = _ewma(new_days, new_w, prev.days[-1], prev.ewma[-1], prev.log_decay[-1])
+        ewma, log_decay = np.r_[prev.ewma, ewma], np.r_[prev.log_decay, log_decay]
+
+    # x relative to the first weigh-in keeps the sums small
+    x = (new_days - days[0]).astype(np.float64)
+    rows = np.column_stack([np.ones_like(x), x, new_w, x * new_w, x * x])
+    tail = np.cumsum(rows, axis=0) + (prev.sums[-1] if prev is not None else 0.0)
+    sums = np.vstack([prev.sums if prev is not None else np.zeros((1, 5)), tail])
+
+    idx = np.arange(k, n)
+    lo = np.searchsorted(days, days[idx] - (WINDOW_DAYS - 1), side="left")
+    rate = _rate(sums, lo, idx + 1)
+    if prev is not None:
+        rate = np.r_[prev.rate, rate]
+    return WeightTrend(days, weights, ewma, rate, log_decay, sums)
+
+
+def project(trend: WeightTrend, target: float | None) -> dict | None:
+    # {"current", "rate_per_week", "target", "date" | None, "days" | None,
+    # "too_far"}; date is None when the trend is flat, heading away from the
+    # target, or only gets there after MAX_PROJECTION_DAYS (too_far)
+    if not len(trend.days):
+        return None
+    current = float(trend.ewma[-1])
+    rate = float(trend.rate[-1])
+    if np.isfinite(rate) and abs(rate) < FLAT_RATE:
+        rate = 0.0
+    out = {"current": current, "rate_per_week": rate * 7 if np.isfinite(rate) else None,
+           "target": target, "date": None, "days": None, "too_far": False}
+    if not target or not np.isfinite(rate) or rate == 0:
+        return out
+    days_needed = (target - current) / rate
+    if days_needed < 0:
+        return out
+    if days_needed > MAX_PROJECTION_DAYS:
+        out["too_far"] = True
+        return out
+    out["days"] = int(np.ceil(days_needed))
+    out["date"] = trend.last_date + datetime.timedelta(days=out["days"])
+    return out
+
+
+def trend_frame(trend: WeightTrend) -> pd.DataFrame:
+    return pd.DataFrame({
+        "DateNorm": (_EPOCH + trend.days).astype("datetime64[ns]"),
+        "Trend":    trend.ewma.astype("float32"),
+        "Rate":     (trend.rate * 7).astype("float32"),
+    })
+
+
+class TrendCache:
+    # uid -> (data version, WeightTrend); a new version refits from the
+    # previous trend, which only computes appended weigh-ins. Past
+    # max_bytes the least recently used trends are dropped.
+    def __init__(self, max_bytes: int = int(MAX_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self._trends = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "fits": 0, "evictions": 0}
+
+    def get(self, uid: str, version: str, dates, weights) -> WeightTrend:
+        with self._lock:
+            hit = self._trends.get(uid)
+            if hit is not None:
+                self._trends.move_to_end(uid)
+                if hit[0] == version:
+                    self.counters["hits"] += 1
+                    return hit[1]
+        trend = fit(*weigh_ins(dates, weights), prev=hit[1] if hit else None)
+        with self._lock:
+            old = self._trends.pop(uid, None)
+            if old is not None:
+                self._bytes -= old[1].nbytes
+            self._trends[uid] = (version, trend)
+            self._bytes += trend.nbytes
+            self.counters["fits"] += 1
+            # least recently used first; the one being served stays
+            for key in list(self._trends):
+                if self._bytes <= self.max_bytes:
+                    break
+                if key != uid:
+                    self._bytes -= self._trends.pop(key)[1].nbytes
+                    self.counters["evictions"] += 1
+        return trend
@@ -3,6 +3,9 @@ import pandas as pd
 import re
 from firebase_admin import firestore
 from .firebase_config import auth, db
+from .entries_store import fetch_entry_rows
+from .entry_windows import get_entry_windows
+from .shared_cache import shared_cached
 
 # --- Sidebar Styling ---
 
@@ -85,21 +88,31 @@ def show_signup_page():
 
 # --- Firestore Entry Fetching ---
 
+@shared_cached(lambda uid: f"entries/{uid}", ttl=3600)
+def fetch_entry_rows_cached(uid):
+    # daily or month-bucketed docs, depending on TERRAPUMP_ENTRIES_LAYOUT
+    return fetch_entry_rows(uid)
+
+ENTRY_COLUMNS = ["Date", "Weight", "Calories", "Protein", "Carbs", "Fats", "Steps", "Training", "Cardio", "doc_id"]
+
+def fetch_entries(uid, start=None, end=None):
+    # entries with start <= Date <= end ("YYYY-MM-DD"; None = open), oldest
+    # first. The whole history comes from the shared cache; a range only
+    # reads the days this process hasn't read yet
+    if start is None and end is None:
+        rows = sorted(fetch_entry_rows_cached(uid), key=lambda r: str(r.get("Date") or r.get("doc_id"))[:10])
+    else:
+        rows = get_entry_windows().rows(uid, start, end)
+    return pd.DataFrame(rows) if rows else pd.DataFrame(columns=ENTRY_COLUMNS)
+
 def fetch_all_entries(uid):
     try:
-        docs = db.collection("users").document(uid).collection("entries").stream()
-        entries = [doc.to_dict() | {"doc_id": doc.id} for doc in docs]
+        entries = fetch_entry_rows_cached(uid)
         if entries:
             return pd.DataFrame(entries)
         else:
             # return empty DataFrame with predefined columns
-            return pd.DataFrame(
-                columns=[
-                    "Date", "Weight", "Calories", "Protein",
-                    "Carbs", "Fats", "Steps", "Training",
-                    "Cardio", "doc_id"
-                ]
-            )
+            return pd.DataFrame(columns=ENTRY_COLUMNS)
     except Exception as e:
         st.error(f"Error fetching entries: {e}")
         return pd.DataFrame()
@@ -125,17 +138,46 @@ def get_day_name(date_obj):
         date_obj = pd.to_datetime(date_obj)
     return date_obj.strftime("%A")
 
+@shared_cached("catalog", ttl=600)
 def fetch_exercise_library():
     docs = db.collection("exercise_library").stream()
     # assume each doc has at least “name” and optionally “default_weight”
     return [doc.to_dict() for doc in docs]
 
+@shared_cached("catalog", ttl=600)
 def fetch_attachments():
     docs = db.collection("attachments").stream()
     # each dict will have whatever fields you set in Firestore,
     # e.g. {"name":"EZ Bar","type":"Cable"}
     return [doc.to_dict() for doc in docs]
 
+@shared_cached("catalog", ttl=600)
+def fetch_all_machines():
+    # every brand's machines in one collection-group query, tagged with the brand
+    brands = {b.id: b.to_dict().get("name", b.id) for b in db.collection("brands").stream()}
+    machines = []
+    for m in db.collection_group("machines").stream():
+        parent = m.reference.parent.parent
+        if parent is None or parent.id not in brands:
+            continue
+        machines.append(m.to_dict() | {"brand_id": parent.id, "brand": brands[parent.id]})
+    return machines
+
+@shared_cached(lambda uid, *_, **__: f"stats/{uid}", ttl=300)
+def fetch_exercise_usage(uid: str, limit: int = 300) -> dict:
+    # {stats_key: updated_at} for the user's most recently touched exercises
+    ref = db.collection("users").document(uid).collection("exercise_stats")
+    docs = (ref.order_by("updated_at", direction=firestore.Query.DESCENDING)
+               .limit(limit)
+               .select(["updated_at"])
+               .stream())
+    usage = {}
+    for d in docs:
+        ts = (d.to_dict() or {}).get("updated_at")
+        if ts is not None:
+            usage[d.id] = ts
+    return usage
+
 def resolve_default_wt(item: dict, fallback: float) -> float:
     if "default_starting_weight" in item:
         try:
@@ -180,6 +222,10 @@ def slug_variants(name: str) -> list[str]:
     # also strip duplicate separators
     return list(dict.fromkeys([hy, us]))
 
+@shared_cached("catalog", ttl=600)
+def fetch_brand_ids() -> list[str]:
+    return [b.id for b in db.collection("brands").stream()]
+
 def brand_id_from_display(display_name: str | None) -> str | None:
     if not display_name:
         return None
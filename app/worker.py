@@ -0,0 +1,326 @@
+# app/worker.py
+#
+# Background maintenance, run outside Streamlit (cron, a container job…):
+#
+#   expire   close active_log workouts left open longer than --stale-hours:
+#            saved as a workout (auto_closed) if anything was logged, then
+#            the field is removed
+#   rollup   recompute users/{uid}/rollups/weekly (workouts, sets and
+#            volume per ISO week), archived workouts included
+#
+# and, only when asked for with --tasks, since they rewrite or delete data:
+#
+#   migrate  rename exercise_stats docs still on legacy keys to the current
+#            build_stats_key() form, and move entries to month buckets when
+#            TERRAPUMP_ENTRIES_LAYOUT isn't "daily"
+#   compact  re-encode legacy workouts ("entries" list) to the packed set
+#            encoding, keeping entry fields it doesn't cover in "extra";
+#            with --delete-daily also drop daily entry docs of users already
+#            migrated to month buckets
+#   archive  move workouts older than --archive-days into compressed
+#            per-year bundles (archive.py); only run when asked for
+#   index    rebuild the exercise -> workout index (workout_index.py) from
+#            the full history; the backfill for it, only run when asked for
+#
+# Users are processed in parallel by a process pool (--workers 0 runs them
+# in-process). Progress is checkpointed to a JSON file after every user, so
+# an interrupted run (or one where some users failed) picks up where it
+# stopped; --fresh starts over. A run that gets through every user removes
+# the checkpoint, so the next scheduled run starts from scratch.
+#
+# --dry-run writes nothing (checkpoint included) and reports what expire,
+# migrate, compact and rollup would change. The fake backend lives in one
+# process's memory, so with it users are always processed in-process.
+#
+#   python -m app.worker --all
+#   python -m app.worker --all --tasks migrate,compact --dry-run
+#   python -m app.worker --uid abc --tasks expire,rollup --workers 0
+#   python -m app.worker --all --tasks archive --archive-days 365
+#   python -m app.worker --all --tasks index
+
+import argparse
+import datetime
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import traceback
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from firebase_admin import firestore
+from .archive import ARCHIVE_AFTER_DAYS, archive_cutoff, archive_user, iter_archived
+from .entries_store import LAYOUT, _daily_rows, _is_migrated, migrate_user
+from .firebase_config import BACKEND, db
+from .utils import slugify
+from .workout_index import backfill_user
+from .workout_log import (
+    WorkoutLog, WORKOUT_ENCODING, encode_workout_sets, entry_extras, from_epoch, to_epoch,
+    workout_arrays, workout_items,
+)
+
+TASKS = ("expire", "migrate", "compact", "rollup", "archive", "index")
+DEFAULT_TASKS = ("expire", "rollup")
+DRY_RUN_TASKS = ("expire", "migrate", "compact", "rollup")
+DEFAULT_CHECKPOINT = os.environ.get("TERRAPUMP_WORKER_CHECKPOINT", ".terrapump_worker.json")
+BATCH_LIMIT = 400
+
+
+def _commit_all(db, ops, dry_run: bool = False):
+    # ops: [("set", ref, data) | ("delete", ref, None)]
+    if dry_run:
+        return len(ops)
+    batch, n = db.batch(), 0
+    for op, ref, data in ops:
+        if op == "set":
+            batch.set(ref, data)
+        else:
+            batch.delete(ref)
+        n += 1
+        if n == BATCH_LIMIT:
+            batch.commit()
+            batch, n = db.batch(), 0
+    if n:
+        batch.commit()
+    return len(ops)
+
+# --- Tasks (each takes the user ref and returns a small result dict) ---
+
+def expire_active_log(db, user_ref, stale_hours: float, now: datetime.datetime,
+                      dry_run: bool = False) -> dict:
+    doc = user_ref.get()
+    log = WorkoutLog.decode((doc.to_dict() or {}).get("active_log")) if doc.exists else None
+    if log is None:
+        return {"expired": 0}
+    # epoch seconds, so a naive now and an aware start compare fine
+    age = datetime.timedelta(seconds=now.timestamp() - log.start)
+    if age < datetime.timedelta(hours=stale_hours):
+        return {"expired": 0}
+    if dry_run:
+        return {"expired": 1, "saved": int(bool(log.exercises))}
+    if log.exercises:
+        user_ref.collection("workouts").document(log.start_dt.isoformat()).set({
+            "name":        log.name,
+            "start":       log.start_dt,
+            "enc":         WORKOUT_ENCODING,
+            "sets":        encode_workout_sets(log.exercises),
+            "auto_closed": True,
+            "timestamp":   firestore.SERVER_TIMESTAMP,
+        })
+    user_ref.update({"active_log": firestore.DELETE_FIELD})
+    return {"expired": 1, "saved": int(bool(log.exercises))}
+
+
+def _canonical_stats_key(key: str) -> str:
+    # hyphen/underscore variants -> slugify(); "brand--ex--noattach" loses the
+    # suffix. "ex--noattach" is left alone, it is also the Cable form.
+    parts = [slugify(p) for p in key.split("--")]
+    if len(parts) == 3 and parts[2] == "noattach":
+        parts = parts[:2]
+    return "--".join(p for p in parts if p)
+
+
+def _newer(a: dict, b: dict) -> bool:
+    ta, tb = a.get("updated_at"), b.get("updated_at")
+    if ta is None or tb is None:
+        return tb is None and ta is not None
+    return ta > tb
+
+
+def migrate_user_keys(db, user_ref, dry_run: bool = False) -> dict:
+    stats = {d.id: d.to_dict() or {} for d in user_ref.collection("exercise_stats").stream()}
+    ops = []
+    for key, data in list(stats.items()):
+        new_key = _canonical_stats_key(key)
+        if not new_key or new_key == key:
+            continue
+        current = stats.get(new_key)
+        if current is None or _newer(data, current):
+            ops.append(("set", user_ref.collection("exercise_stats").document(new_key), data))
+            stats[new_key] = data
+        ops.append(("delete", user_ref.collection("exercise_stats").document(key), None))
+    renamed = sum(op == "delete" for op, _, _ in ops)
+    _commit_all(db, ops, dry_run)
+
+    out = {"stats_renamed": renamed}
+    if LAYOUT != "daily" and not _is_migrated(user_ref.id):
+        if dry_run:
+            out["entries_months"] = len({str(r.get("Date") or r["doc_id"])[:7] for r in _daily_rows(user_ref.id)})
+        else:
+            out["entries_months"] = migrate_user(user_ref.id)["months"]
+    return out
+
+
+def compact_user(db, user_ref, delete_daily: bool, dry_run: bool = False) -> dict:
+    ops = []
+    for doc in user_ref.collection("workouts").stream():
+        w = doc.to_dict() or {}
+        if w.get("enc") == WORKOUT_ENCODING or "entries" not in w:
+            continue
+        sets = encode_workout_sets(workout_items(w))
+        extras = entry_extras(w["entries"] or [])
+        w = {k: v for k, v in w.items() if k != "entries"} | {"enc": WORKOUT_ENCODING, "sets": sets}
+        if extras:
+            w["extra"] = extras
+        ops.append(("set", doc.reference, w))
+    out = {"workouts_reencoded": _commit_all(db, ops, dry_run)}
+
+    if delete_daily:
+        if _is_migrated(user_ref.id):
+            daily = [("delete", d.reference, None) for d in user_ref.collection("entries").select([]).stream()]
+            out["daily_deleted"] = _commit_all(db, daily, dry_run)
+    return out
+
+
+def rebuild_rollups(db, user_ref, now: datetime.datetime, dry_run: bool = False) -> dict:
+    weeks = defaultdict(lambda: {"workouts": 0, "sets": 0, "volume": 0.0})
+    hot = ((doc.id, doc.to_dict() or {}) for doc in user_ref.collection("workouts").stream())
+    seen = set()
+    for workout_id, w in itertools.chain(hot, iter_archived(user_ref)):
+        # an interrupted archive run can leave a workout in both places
+        if workout_id in seen:
+            continue
+        seen.add(workout_id)
+        start = from_epoch(to_epoch(w.get("start")))
+        if start is None:
+            continue
+        year, week, _ = start.isocalendar()
+        arr = workout_arrays(w)
+        row = weeks[f"{year}-W{week:02d}"]
+        row["workouts"] += 1
+        row["sets"] += int(arr["sets"].sum())
+        # unilateral sets count both sides
+        uni = np.repeat(arr["unilateral"], arr["sets"])
+        volume = arr["reps"] * arr["weights"]
+        row["volume"] += float(volume.sum() + (arr["reps_right"] * arr["weights_right"])[uni].sum())
+    if dry_run:
+        return {"weeks": len(weeks)}
+    user_ref.collection("rollups").document("weekly").set({
+        "weeks":      dict(sorted(weeks.items())),
+        "updated_at": now,
+    })
+    return {"weeks": len(weeks)}
+
+
+def process_user(uid: str, tasks: list[str], opts: dict) -> dict:
+    # spawned pool processes import this module, and so build their own client
+    user_ref = db.collection("users").document(uid)
+    now = datetime.datetime.now()
+    dry_run = opts.get("dry_run", False)
+    out = {}
+    for task in tasks:
+        if task == "expire":
+            out[task] = expire_active_log(db, user_ref, opts["stale_hours"], now, dry_run)
+        elif task == "migrate":
+            out[task] = migrate_user_keys(db, user_ref, dry_run)
+        elif task == "compact":
+            out[task] = compact_user(db, user_ref, opts["delete_daily"], dry_run)
+        elif task == "rollup":
+            out[task] = rebuild_rollups(db, user_ref, now, dry_run)
+        elif task == "archive":
+            out[task] = archive_user(db, user_ref, archive_cutoff(opts["archive_days"], now))
+        elif task == "index":
+            out[task] = backfill_user(db, user_ref)
+    return out
+
+# --- Checkpointing ---
+
+def load_checkpoint(path: str, tasks: list[str]) -> set[str]:
+    # uids already done by a previous run of the same task list
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    return set(state.get("done", [])) if state.get("tasks") == tasks else set()
+
+
+def save_checkpoint(path: str, tasks: list[str], done: set[str], failed: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"tasks": tasks, "done": sorted(done), "failed": failed,
+                   "saved_at": datetime.datetime.now().isoformat()}, f)
+    os.replace(tmp, path)
+
+
+def _run_one(uid, tasks, opts):
+    # pool entry point: errors come back as text, the run carries on
+    try:
+        return uid, process_user(uid, tasks, opts), None
+    except Exception:
+        return uid, None, traceback.format_exc(limit=3)
+
+
+def run(uids: list[str], tasks: list[str], opts: dict, workers: int, checkpoint: str | None) -> int:
+    # checkpoint None: no progress file (dry runs)
+    done = load_checkpoint(checkpoint, tasks) if checkpoint else set()
+    todo = [u for u in uids if u not in done]
+    failed = {}
+    print(f"{len(todo)} users to process ({len(done)} already done), tasks: {', '.join(tasks)}")
+
+    def record(uid, result, err):
+        if err:
+            failed[uid] = err.strip().splitlines()[-1]
+            print(f"{uid}: FAILED {failed[uid]}", file=sys.stderr)
+        else:
+            done.add(uid)
+            print(f"{uid}: {json.dumps(result, sort_keys=True)}")
+        if checkpoint:
+            save_checkpoint(checkpoint, tasks, done, failed)
+
+    if workers == 0:
+        for uid in todo:
+            record(*_run_one(uid, tasks, opts))
+    else:
+        # spawn: gRPC channels don't survive fork
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = [pool.submit(_run_one, uid, tasks, opts) for uid in todo]
+            for fut in as_completed(futures):
+                record(*fut.result())
+    print(f"done: {len(done)}  failed: {len(failed)}")
+    if failed or not checkpoint:
+        return int(bool(failed))
+    # finished: the next run of these tasks is a new pass over everyone
+    try:
+        os.remove(checkpoint)
+    except OSError:
+        pass
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="TerraPump background maintenance worker")
+    who = ap.add_mutually_exclusive_group(required=True)
+    who.add_argument("--uid", action="append", help="user id (repeatable)")
+    who.add_argument("--all", action="store_true", help="every user")
+    ap.add_argument("--tasks", default=",".join(DEFAULT_TASKS), help=f"comma-separated subset of {','.join(TASKS)}")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="processes (0 = in-process)")
+    ap.add_argument("--stale-hours", type=float, default=12, help="age at which an active workout expires")
+    ap.add_argument("--archive-days", type=int, default=ARCHIVE_AFTER_DAYS, help="archive: age in days of workouts to archive")
+    ap.add_argument("--delete-daily", action="store_true", help="compact: drop daily docs of migrated users")
+    ap.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="progress file")
+    ap.add_argument("--fresh", action="store_true", help="ignore the checkpoint and start over")
+    ap.add_argument("--dry-run", action="store_true", help="write nothing, report what would change")
+    args = ap.parse_args(argv)
+
+    tasks = [t.strip() for t in args.tasks.split(",") if t.strip()]
+    unknown = set(tasks) - set(TASKS)
+    if unknown:
+        ap.error(f"unknown task(s): {', '.join(sorted(unknown))}")
+    if args.dry_run and set(tasks) - set(DRY_RUN_TASKS):
+        ap.error(f"--dry-run only covers {', '.join(DRY_RUN_TASKS)}")
+    if args.fresh and not args.dry_run and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    uids = args.uid or [u.id for u in db.collection("users").select([]).stream()]
+    opts = {"stale_hours": args.stale_hours, "delete_daily": args.delete_daily,
+            "archive_days": args.archive_days, "dry_run": args.dry_run}
+    # spawned workers would each get their own, empty, fake store
+    workers = 0 if BACKEND == "fake" else args.workers
+    return run(uids, tasks, opts, workers, None if args.dry_run else args.checkpoint)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+# app/workout_index.py
+#
+# Inverted index from exercises to the workouts they were logged in, so
+# "every session of this exercise" is one document read instead of opening
+# every workout. One doc per term under users/{uid}/workout_index/{term}:
+#
+#   {"w": {workout_id: {"s": start, "n": workout name}}, "label": ..., "updated_at": ...}
+#
+# Terms for each logged exercise:
+#
+#   <build_stats_key()>      the exercise_stats key ("brand--ex", "ex--attach", "ex")
+#   exercise:<slug>          the exercise on any machine / attachment
+#   brand:<slug>             anything on that brand's machines
+#   attachment:<slug>        anything with that cable attachment
+#
+# Saved workouts don't record the exercise type, so the stats key is
+# inferred: a brand means Machine, an attachment means Cable (Cable logs
+# always carry one, "None" included, which is the "ex--noattach" key).
+# Each doc also keeps a readable label, since the ids are slugs and
+# "a--b" can be brand--exercise or exercise--attachment.
+#
+# End Workout and workout deletes keep it current (a term left without
+# workouts is deleted); the worker's "index" task rebuilds it from the full
+# history (hot and archived workouts). Each of those bumps the shared-cache
+# namespace "workouts/<uid>", which term_labels_cached() is read through.
+
+import datetime
+from firebase_admin import firestore
+from .archive import iter_archived
+from .firebase_config import db as default_db
+from .shared_cache import invalidate, shared_cached
+from .utils import build_stats_key, slugify
+from .workout_log import from_epoch, to_epoch, workout_items
+
+COLLECTION = "workout_index"
+BATCH_LIMIT = 400
+
+
+def item_terms(item) -> dict[str, str]:
+    # term -> label
+    attachment = item.attachment if item.attachment and item.attachment.lower() != "none" else None
+    ex_type = "Machine" if item.brand else "Cable" if item.attachment else ""
+    exercise = item.exercise or ""
+    key_label = f"{exercise} – {item.brand}" if item.brand \
+        else f"{exercise} – {attachment or 'no attachment'}" if item.attachment else exercise
+    terms = {build_stats_key(ex_type, exercise, item.brand, item.attachment): key_label,
+             f"exercise:{slugify(exercise)}": f"{exercise} (any equipment)"}
+    if item.brand:
+        terms[f"brand:{slugify(item.brand)}"] = f"Brand: {item.brand}"
+    if attachment:
+        terms[f"attachment:{slugify(attachment)}"] = f"Attachment: {attachment}"
+    return {t: label for t, label in terms.items() if t and not t.endswith(":")}
+
+
+def workout_terms(items) -> dict[str, str]:
+    out = {}
+    for item in items or ():
+        out |= item_terms(item)
+    return out
+
+
+def term_label(term: str) -> str:
+    # for docs indexed before labels were stored
+    kind, _, slug = term.rpartition(":")
+    words = " – ".join(p.replace("_", " ").replace("-", " ").title() for p in slug.split("--"))
+    return f"{kind.title()}: {words}" if kind else words
+
+
+def _commit(db, writes):
+    # writes: [(ref, data)] as merge-sets
+    batch, n = db.batch(), 0
+    for ref, data in writes:
+        batch.set(ref, data, merge=True)
+        n += 1
+        if n == BATCH_LIMIT:
+            batch.commit()
+            batch, n = db.batch(), 0
+    if n:
+        batch.commit()
+
+
+def index_workout(db, user_ref, workout_id: str, start, name: str, items):
+    col = user_ref.collection(COLLECTION)
+    entry = {"s": start, "n": name}
+    _commit(db, [(col.document(t), {"w": {workout_id: entry}, "label": label,
+                                    "updated_at": firestore.SERVER_TIMESTAMP})
+                 for t, label in sorted(workout_terms(items).items())])
+    invalidate(f"workouts/{user_ref.id}")
+
+
+def unindex_workout(db, user_ref, workout_id: str, items):
+    # one read per term, to drop the terms this was the last workout of
+    col = user_ref.collection(COLLECTION)
+    batch, n = db.batch(), 0
+    for t in sorted(workout_terms(items)):
+        ref = col.document(t)
+        doc = ref.get()
+        if not doc.exists:
+            continue
+        if set((doc.to_dict() or {}).get("w", {})) <= {workout_id}:
+            batch.delete(ref)
+        else:
+            batch.set(ref, {"w": {workout_id: firestore.DELETE_FIELD},
+                            "updated_at": firestore.SERVER_TIMESTAMP}, merge=True)
+        n += 1
+        if n == BATCH_LIMIT:
+            batch.commit()
+            batch, n = db.batch(), 0
+    if n:
+        batch.commit()
+    invalidate(f"workouts/{user_ref.id}")
+
+
+def find_workouts(user_ref, term: str) -> list[dict]:
+    # [{"id", "start", "name"}], newest first
+    doc = user_ref.collection(COLLECTION).document(term).get()
+    hits = (doc.to_dict() or {}).get("w", {}) if doc.exists else {}
+    rows = [{"id": wid, "start": from_epoch(to_epoch(e.get("s"))), "name": e.get("n", "Workout")}
+            for wid, e in hits.items()]
+    rows.sort(key=lambda r: r["start"] or datetime.datetime.min, reverse=True)
+    return rows
+
+
+def list_terms(user_ref) -> list[str]:
+    return sorted(d.id for d in user_ref.collection(COLLECTION).select([]).stream())
+
+
+def term_labels(user_ref) -> dict[str, str]:
+    # term -> label, ordered by label
+    labels = {d.id: (d.to_dict() or {}).get("label") or term_label(d.id)
+              for d in user_ref.collection(COLLECTION).select(["label"]).stream()}
+    return dict(sorted(labels.items(), key=lambda kv: kv[1].lower()))
+
+
+@shared_cached(lambda uid: f"workouts/{uid}", ttl=3600)
+def term_labels_cached(uid: str) -> dict[str, str]:
+    return term_labels(default_db.collection("users").document(uid))
+
+
+def backfill_user(db, user_ref) -> dict:
+    # rebuilds every term doc from scratch; terms nothing maps to are dropped
+    postings, labels = {}, {}
+    hot = ((d.id, d.to_dict() or {}) for d in user_ref.collection("workouts").stream())
+    seen = set()
+    for stream in (hot, iter_archived(user_ref)):
+        for workout_id, w in stream:
+            if workout_id in seen:
+                continue
+            seen.add(workout_id)
+            entry = {"s": w.get("start"), "n": w.get("name", "Workout")}
+            for term, label in workout_terms(workout_items(w)).items():
+                postings.setdefault(term, {})[workout_id] = entry
+                labels[term] = label
+    col = user_ref.collection(COLLECTION)
+    stale = set(list_terms(user_ref)) - set(postings)
+    batch, n = db.batch(), 0
+    ops = [("set", term, {"w": hits, "label": labels[term], "updated_at": firestore.SERVER_TIMESTAMP})
+           for term, hits in sorted(postings.items())]
+    ops += [("delete", term, None) for term in sorted(stale)]
+    for op, term, data in ops:
+        if op == "set":
+            batch.set(col.document(term), data)
+        else:
+            batch.delete(col.document(term))
+        n += 1
+        if n == BATCH_LIMIT:
+            batch.commit()
+            batch, n = db.batch(), 0
+    if n:
+        batch.commit()
+    invalidate(f"workouts/{user_ref.id}")
+    return {"workouts": len(seen), "terms": len(postings), "dropped": len(stale)}
@@ -0,0 +1,356 @@
+# app/workout_log.py
+
+import datetime
+from dataclasses import dataclass, field
+import numpy as np
+
+# Version tag written into active_log. Docs without it are the legacy
+# list-of-dicts shape: [{"name", "start"}, {"exercise", ...}, ...]
+LOG_VERSION = 2
+
+
+def to_epoch(value) -> float | None:
+    # epoch seconds; datetimes keep their microseconds
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if hasattr(value, "to_datetime"):
+        value = value.to_datetime()
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    return None
+
+
+def from_epoch(value: float | None, tz: datetime.tzinfo | None = None) -> datetime.datetime | None:
+    # naive local time unless a tz is given
+    return datetime.datetime.fromtimestamp(value, tz=tz) if value is not None else None
+
+
+def utc_offset(value) -> int | None:
+    # UTC offset in seconds of an aware datetime (or Firestore timestamp), else None
+    if hasattr(value, "to_datetime"):
+        value = value.to_datetime()
+    if isinstance(value, datetime.datetime) and value.utcoffset() is not None:
+        return int(value.utcoffset().total_seconds())
+    return None
+
+
+def _num(v, cast, default):
+    try:
+        return cast(v)
+    except (TypeError, ValueError):
+        return default
+
+
+def _pad(values: list, n: int, default) -> list:
+    return values + [values[-1] if values else default] * (n - len(values))
+
+
+@dataclass(slots=True)
+class SetRecord:
+    reps: int
+    weight: float
+    reps_right: int | None = None
+    weight_right: float | None = None
+
+
+@dataclass(slots=True)
+class LoggedExercise:
+    # reps/weights are per set; for unilateral exercises they hold the left
+    # side and reps_right/weights_right the right side
+    exercise: str
+    brand: str | None = None
+    attachment: str | None = None
+    unilateral: bool = False
+    reps: list[int] = field(default_factory=list)
+    weights: list[float] = field(default_factory=list)
+    reps_right: list[int] | None = None
+    weights_right: list[float] | None = None
+    logged_at: int | None = None
+
+    @property
+    def sets(self) -> int:
+        return len(self.reps)
+
+    def iter_sets(self):
+        # a right side missing a set repeats the left one
+        reps_right, weights_right = self.reps_right or [], self.weights_right or []
+        for i in range(self.sets):
+            weight = self.weights[i] if i < len(self.weights) else 0.0
+            if self.unilateral:
+                yield SetRecord(self.reps[i], weight,
+                                reps_right[i] if i < len(reps_right) else self.reps[i],
+                                weights_right[i] if i < len(weights_right) else weight)
+            else:
+                yield SetRecord(self.reps[i], weight)
+
+    # — legacy dict shape (workouts docs, old active_log) —
+
+    @classmethod
+    def from_entry(cls, entry: dict) -> "LoggedExercise":
+        # reps, weights and the "sets" count can disagree in old docs: the
+        # longest wins and the shorter lists repeat their last value
+        reps, weights = list(entry.get("reps", []) or []), list(entry.get("weights", []) or [])
+        n = max(len(reps), len(weights), _num(entry.get("sets"), int, 0))
+        reps, weights = _pad(reps, n, 0), _pad(weights, n, 0.0)
+        unilateral = bool(entry.get("unilateral")) or any(isinstance(r, dict) for r in reps)
+        item = cls(
+            exercise=entry.get("exercise", "Unnamed"),
+            brand=entry.get("brand"),
+            attachment=entry.get("attachment"),
+            unilateral=unilateral,
+            logged_at=to_epoch(entry.get("logged_at")),
+        )
+        if unilateral:
+            item.reps_right, item.weights_right = [], []
+        for r, w in zip(reps, weights):
+            if unilateral:
+                r = r if isinstance(r, dict) else {"left": r, "right": r}
+                w = w if isinstance(w, dict) else {"left": w, "right": w}
+                item.reps.append(_num(r.get("left"), int, 0))
+                item.reps_right.append(_num(r.get("right"), int, 0))
+                item.weights.append(_num(w.get("left"), float, 0.0))
+                item.weights_right.append(_num(w.get("right"), float, 0.0))
+            else:
+                item.reps.append(_num(r, int, 0))
+                item.weights.append(_num(w, float, 0.0))
+        return item
+
+    def to_entry(self) -> dict:
+        rows = list(self.iter_sets())
+        if self.unilateral:
+            reps = [{"left": s.reps, "right": s.reps_right} for s in rows]
+            weights = [{"left": s.weight, "right": s.weight_right} for s in rows]
+        else:
+            reps, weights = [s.reps for s in rows], [s.weight for s in rows]
+        return {
+            "exercise":   self.exercise,
+            "attachment": self.attachment,
+            "brand":      self.brand,
+            "sets":       self.sets,
+            "reps":       reps,
+            "weights":    weights,
+            "unilateral": self.unilateral,
+            "logged_at":  from_epoch(self.logged_at),
+        }
+
+    # — compact shape: short keys, parallel arrays, epoch seconds —
+
+    def encode(self) -> dict:
+        out = {"n": self.exercise, "r": self.reps, "w": self.weights}
+        if self.brand:
+            out["b"] = self.brand
+        if self.attachment:
+            out["a"] = self.attachment
+        if self.unilateral:
+            out["u"] = True
+            out["rr"] = self.reps_right
+            out["wr"] = self.weights_right
+        if self.logged_at is not None:
+            out["t"] = self.logged_at
+        return out
+
+    @classmethod
+    def decode(cls, raw: dict) -> "LoggedExercise":
+        unilateral = bool(raw.get("u"))
+        return cls(
+            exercise=raw.get("n", "Unnamed"),
+            brand=raw.get("b"),
+            attachment=raw.get("a"),
+            unilateral=unilateral,
+            reps=[int(x) for x in raw.get("r", [])],
+            weights=[float(x) for x in raw.get("w", [])],
+            reps_right=[int(x) for x in raw.get("rr", [])] if unilateral else None,
+            weights_right=[float(x) for x in raw.get("wr", [])] if unilateral else None,
+            logged_at=raw.get("t"),
+        )
+
+
+@dataclass(slots=True)
+class WorkoutLog:
+    # start is epoch seconds; tz the UTC offset (seconds) when the start was
+    # an aware datetime, so start_dt (and the workout doc id built from its
+    # isoformat()) comes back exactly as it went in
+    name: str
+    start: float
+    exercises: list[LoggedExercise] = field(default_factory=list)
+    tz: int | None = None
+
+    @classmethod
+    def new(cls, name: str, start: datetime.datetime | None = None) -> "WorkoutLog":
+        start = start or datetime.datetime.now()
+        return cls(name=name, start=to_epoch(start), tz=utc_offset(start))
+
+    @property
+    def start_dt(self) -> datetime.datetime:
+        tz = datetime.timezone(datetime.timedelta(seconds=self.tz)) if self.tz is not None else None
+        return from_epoch(self.start, tz)
+
+    def entries(self) -> list[dict]:
+        return [e.to_entry() for e in self.exercises]
+
+    def encode(self) -> dict:
+        out = {
+            "v":     LOG_VERSION,
+            "name":  self.name,
+            "start": self.start,
+            "ex":    [e.encode() for e in self.exercises],
+        }
+        if self.tz is not None:
+            out["tz"] = self.tz
+        return out
+
+    @classmethod
+    def decode(cls, raw) -> "WorkoutLog | None":
+        # accepts the compact map or the legacy [header, entry, ...] list
+        if not raw:
+            return None
+        if isinstance(raw, dict) and raw.get("v") == LOG_VERSION:
+            return cls(
+                name=raw.get("name", ""),
+                start=to_epoch(raw.get("start")) or to_epoch(datetime.datetime.now()),
+                exercises=[LoggedExercise.decode(e) for e in raw.get("ex", [])],
+                tz=raw.get("tz"),
+            )
+        if isinstance(raw, list):
+            header = raw[0] if isinstance(raw[0], dict) else {}
+            return cls(
+                name=header.get("name", ""),
+                start=to_epoch(header.get("start")) or to_epoch(datetime.datetime.now()),
+                exercises=[LoggedExercise.from_entry(e) for e in raw[1:] if isinstance(e, dict)],
+                tz=utc_offset(header.get("start")),
+            )
+        return None
+
+
+# --- Saved workouts: columnar set encoding ---
+#
+# workouts docs written at End Workout carry {"enc": 3, "sets": {...}} instead
+# of the legacy "entries" list. Per exercise: name/brand/attachment/logged_at
+# lists plus set counts; per set: little-endian typed arrays packed as bytes
+# (reps int16, weights float64). Right-side arrays only hold the sets of
+# unilateral exercises, which are flagged in a packed bitmask. Encoding 2
+# packed weights as float32; those docs still decode, rounded to
+# WEIGHT_DECIMALS so 47.3 doesn't come back as 47.29999923706055.
+
+WORKOUT_ENCODING = 3
+WEIGHT_DECIMALS = 3
+_WEIGHT_DTYPES = {2: "<f4", 3: "<f8"}
+# legacy entry keys the encoding covers; others are kept per exercise in the
+# doc's "extra" list (see entry_extras())
+ENTRY_FIELDS = {"exercise", "attachment", "brand", "sets", "reps", "weights", "unilateral", "logged_at"}
+
+
+def entry_extras(entries: list[dict]) -> list[dict] | None:
+    # per-entry fields encode_workout_sets() would drop, or None if there are none
+    extras = [{k: v for k, v in e.items() if k not in ENTRY_FIELDS} for e in entries]
+    return extras if any(extras) else None
+
+
+def encode_workout_sets(exercises: list[LoggedExercise]) -> dict:
+    # iter_sets() fills in missing weights and right sides, so every array
+    # has one value per set
+    uni = np.array([e.unilateral for e in exercises], dtype=bool)
+    sets = [list(e.iter_sets()) for e in exercises]
+    reps = [s.reps for rows in sets for s in rows]
+    weights = [s.weight for rows in sets for s in rows]
+    reps_r = [s.reps_right for e, rows in zip(exercises, sets) if e.unilateral for s in rows]
+    weights_r = [s.weight_right for e, rows in zip(exercises, sets) if e.unilateral for s in rows]
+    return {
+        "n":  [e.exercise for e in exercises],
+        "b":  [e.brand for e in exercises],
+        "a":  [e.attachment for e in exercises],
+        "t":  [e.logged_at for e in exercises],
+        "s":  np.array([e.sets for e in exercises], dtype="<u2").tobytes(),
+        "u":  np.packbits(uni).tobytes(),
+        "r":  np.array(reps, dtype="<i2").tobytes(),
+        "w":  np.array(weights, dtype="<f8").tobytes(),
+        "rr": np.array(reps_r, dtype="<i2").tobytes(),
+        "wr": np.array(weights_r, dtype="<f8").tobytes(),
+    }
+
+
+def _legacy_arrays(entries: list[dict]) -> dict:
+    items = [LoggedExercise.from_entry(e) for e in entries]
+    return decode_workout_sets(encode_workout_sets(items))
+
+
+def _weights(raw: bytes, version: int) -> np.ndarray:
+    weights = np.frombuffer(raw, dtype=_WEIGHT_DTYPES[version]).astype(np.float64)
+    return weights if version == WORKOUT_ENCODING else weights.round(WEIGHT_DECIMALS)
+
+
+def decode_workout_sets(enc: dict, version: int = WORKOUT_ENCODING) -> dict:
+    # -> names/brands/attachments/logged_at lists, and NumPy arrays:
+    #    sets (per exercise), offsets (len+1), unilateral (per exercise),
+    #    reps/weights/reps_right/weights_right (per set; right == left
+    #    for bilateral sets, and for unilateral sets a short right side
+    #    didn't cover)
+    sets = np.frombuffer(enc.get("s", b""), dtype="<u2").astype(np.int64)
+    n_ex = len(sets)
+    uni = np.unpackbits(np.frombuffer(enc.get("u", b""), dtype=np.uint8), count=n_ex).astype(bool) \
+        if n_ex else np.zeros(0, dtype=bool)
+    reps = np.frombuffer(enc.get("r", b""), dtype="<i2").astype(np.int32)
+    weights = _weights(enc.get("w", b""), version)
+    uni_sets = np.flatnonzero(np.repeat(uni, sets))
+    reps_right, weights_right = reps.copy(), weights.copy()
+    rr = np.frombuffer(enc.get("rr", b""), dtype="<i2")[:len(uni_sets)]
+    wr = _weights(enc.get("wr", b""), version)[:len(uni_sets)]
+    reps_right[uni_sets[:len(rr)]] = rr
+    weights_right[uni_sets[:len(wr)]] = wr
+    offsets = np.zeros(n_ex + 1, dtype=np.int64)
+    np.cumsum(sets, out=offsets[1:])
+    return {
+        "names":         list(enc.get("n", [])),
+        "brands":        list(enc.get("b", [None] * n_ex)),
+        "attachments":   list(enc.get("a", [None] * n_ex)),
+        "logged_at":     list(enc.get("t", [None] * n_ex)),
+        "sets":          sets,
+        "offsets":       offsets,
+        "unilateral":    uni,
+        "reps":          reps,
+        "weights":       weights,
+        "reps_right":    reps_right,
+        "weights_right": weights_right,
+    }
+
+
+def workout_arrays(doc: dict) -> dict:
+    # either encoding -> the decode_workout_sets() arrays
+    if doc.get("enc") in _WEIGHT_DTYPES:
+        return decode_workout_sets(doc.get("sets") or {}, doc["enc"])
+    return _legacy_arrays(doc.get("entries") or [])
+
+
+def workout_items(doc: dict) -> list[LoggedExercise]:
+    # either encoding -> LoggedExercise list
+    if doc.get("enc") not in _WEIGHT_DTYPES:
+        return [LoggedExercise.from_entry(e) for e in doc.get("entries") or []]
+    arr = workout_arrays(doc)
+    items = []
+    for i, name in enumerate(arr["names"]):
+        lo, hi = arr["offsets"][i], arr["offsets"][i + 1]
+        uni = bool(arr["unilateral"][i])
+        items.append(LoggedExercise(
+            exercise=name,
+            brand=arr["brands"][i],
+            attachment=arr["attachments"][i],
+            unilateral=uni,
+            reps=arr["reps"][lo:hi].tolist(),
+            weights=arr["weights"][lo:hi].tolist(),
+            reps_right=arr["reps_right"][lo:hi].tolist() if uni else None,
+            weights_right=arr["weights_right"][lo:hi].tolist() if uni else None,
+            logged_at=arr["logged_at"][i],
+        ))
+    return items
+
+
+def workout_entries(doc: dict) -> list[dict]:
+    # either encoding -> legacy entry dicts, with any "extra" fields put back
+    if doc.get("enc") not in _WEIGHT_DTYPES:
+        extras = entry_extras(doc.get("entries") or [])
+    else:
+        extras = doc.get("extra")
+    entries = [e.to_entry() for e in workout_items(doc)]
+    return [(extra or {}) | e for e, extra in zip(entries, extras)] if extras else entries
@@ -0,0 +1,11 @@
+# tests/conftest.py
+#
+# Tests run against the in-memory Firestore / auth stand-in
+# (app/fake_firestore.py); it has to be chosen before anything imports
+# app.firebase_config.
+
+import os
+import sys
+
+os.environ.setdefault("TERRAPUMP_BACKEND", "fake")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,79 @@
+# tests/test_analytics.py
+
+import datetime
+import pytest
+from app.analytics import _merge, _top, compute_usage, load_summary, run_analytics
+from app.archive import archive_user
+from app.fake_firestore import FakeFirestore
+from app.workout_log import WORKOUT_ENCODING, LoggedExercise, encode_workout_sets
+
+NOW = datetime.datetime(2024, 6, 30, tzinfo=datetime.timezone.utc)
+
+
+def _press(sets=3):
+    return LoggedExercise("Chest Press", brand="Hammer", reps=[10] * sets, weights=[50.0] * sets)
+
+
+def _pushdown():
+    return LoggedExercise("Pushdown", attachment="Rope", reps=[12, 10], weights=[20.0, 22.5])
+
+
+@pytest.fixture
+def db():
+    client = FakeFirestore()
+    plans = {"ann": [[_press(), _pushdown()], [_press(2)]], "bob": [[_press(4)]], "cy": [[_pushdown()]]}
+    for uid, workouts in plans.items():
+        user_ref = client.collection("users").document(uid)
+        for day, items in enumerate(workouts, 1):
+            start = datetime.datetime(2024, 6, day, 18)
+            user_ref.collection("workouts").document(start.isoformat()).set(
+                {"name": "W", "start": start, "enc": WORKOUT_ENCODING, "sets": encode_workout_sets(items)})
+        user_ref.collection("exercise_stats").document("hammer--chest_press").set(
+            {"updated_at": NOW - datetime.timedelta(days=5 if uid == "ann" else 90)})
+    archive_user(client, client.collection("users").document("ann"), datetime.datetime(2024, 6, 2))
+    return client
+
+
+def _rows(summary, table):
+    return {r["name"]: r for r in summary[table]}
+
+
+def test_usage_counts_hot_and_archived_workouts(db):
+    summary = compute_usage(db, count=1, now=NOW)
+    machine = _rows(summary, "machine")["Hammer · Chest Press"]
+    assert (machine["sets"], machine["logs"], machine["workouts"], machine["users"]) == (9, 3, 3, 2)
+    rope = _rows(summary, "attachment")["Rope"]
+    assert (rope["sets"], rope["users"]) == (4, 2)
+    assert summary["totals"] == {"users": 3, "workouts": 4, "logs": 5, "sets": 13, "exercises": 2}
+    stats = _rows(summary, "stats")["hammer--chest_press"]
+    assert (stats["users"], stats["active"]) == (3, 1)
+
+
+@pytest.mark.parametrize("count", [2, 3, 8])
+def test_partitions_merge_to_the_same_summary(db, count):
+    one = compute_usage(db, count=1, now=NOW)
+    many = compute_usage(db, count=count, now=NOW)
+    assert many["partitions"]["workouts"] > 1
+    for key in ("brand", "machine", "attachment", "exercise", "stats", "totals"):
+        assert many[key] == one[key]
+
+
+def test_merge_unions_users_and_adds_counts():
+    a = {"x": {"sets": 2, "users": {"u1"}}}
+    b = {"x": {"sets": 3, "users": {"u1", "u2"}}, "y": {"sets": 1, "users": {"u3"}}}
+    merged = _merge([a, b])
+    assert merged["x"] == {"sets": 5, "users": {"u1", "u2"}}
+    assert merged["y"] == {"sets": 1, "users": {"u3"}}
+
+
+def test_top_sorts_by_count_then_name():
+    rows = {"b": {"sets": 5, "users": {"u1"}}, "a": {"sets": 5, "users": {"u2", "u3"}},
+            "c": {"sets": 9, "users": set()}, "d": {"sets": 1, "users": set()}}
+    assert _top(rows, 3, "sets") == [{"name": "c", "sets": 9, "users": 0}, {"name": "a", "sets": 5, "users": 2},
+                                     {"name": "b", "sets": 5, "users": 1}]
+    assert [r["name"] for r in _top(rows, 10, "users")][:2] == ["a", "b"]
+
+
+def test_run_writes_the_summary_doc(db):
+    run_analytics(db, count=2)
+    assert load_summary(db)["totals"]["users"] == 3
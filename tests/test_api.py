@@ -0,0 +1,165 @@
+# tests/test_api.py
+
+import datetime
+import json
+import uuid
+from tornado.testing import AsyncHTTPTestCase
+from app.api import make_app
+from app.archive import archive_user
+from app.firebase_config import auth, db
+
+
+class ApiTestCase(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app()
+
+    def setUp(self):
+        super().setUp()
+        account = auth.create_user_with_email_and_password(f"{uuid.uuid4().hex}@example.com", "pw123456")
+        self.uid, self.token = account["localId"], account["idToken"]
+
+    def request(self, method, path, body=None, token=None, headers=None):
+        headers = dict(headers or {})
+        if token is not False:
+            headers["Authorization"] = f"Bearer {token or self.token}"
+        return self.fetch(path, method=method, headers=headers, raise_error=False,
+                          body=None if body is None else json.dumps(body),
+                          allow_nonstandard_methods=True)
+
+    def json(self, method, path, body=None, status=200, **kw):
+        resp = self.request(method, path, body, **kw)
+        self.assertEqual(resp.code, status, resp.body)
+        return json.loads(resp.body)
+
+
+class AuthTest(ApiTestCase):
+    def test_health_needs_no_token(self):
+        self.assertTrue(self.json("GET", "/api/v1/health", token=False)["ok"])
+
+    def test_missing_token(self):
+        body = self.json("GET", "/api/v1/entries", token=False, status=401)
+        self.assertEqual(body, {"error": "missing bearer token", "status": 401})
+
+    def test_invalid_token(self):
+        self.json("GET", "/api/v1/entries", token="fake-nobody", status=401)
+
+    def test_unknown_path(self):
+        self.json("GET", "/api/v1/nope", status=404)
+
+
+class EntriesTest(ApiTestCase):
+    def test_put_then_get(self):
+        saved = self.json("PUT", "/api/v1/entries/2025-03-01", {"Weight": "180.5", "Steps": 9000})
+        self.assertEqual(saved, {"Date": "2025-03-01", "Weight": 180.5, "Steps": 9000})
+        self.assertEqual(self.json("GET", "/api/v1/entries/2025-03-01")["Weight"], 180.5)
+        self.json("GET", "/api/v1/entries/2025-03-02", status=404)
+
+    def test_patch_merges_and_put_replaces(self):
+        self.json("PUT", "/api/v1/entries/2025-03-01", {"Weight": 180, "Calories": 2500})
+        patched = self.json("PATCH", "/api/v1/entries/2025-03-01", {"Steps": 4000})
+        self.assertEqual((patched["Weight"], patched["Calories"], patched["Steps"]), (180.0, 2500, 4000))
+        replaced = self.json("PUT", "/api/v1/entries/2025-03-01", {"Steps": 5000})
+        self.assertNotIn("Weight", replaced)
+
+    def test_bad_bodies(self):
+        self.json("PUT", "/api/v1/entries/2025-03-01", {"Mood": "good"}, status=400)
+        self.json("PUT", "/api/v1/entries/2025-03-01", {"Steps": "many"}, status=400)
+        self.json("PUT", "/api/v1/entries/2025-13-01", {"Steps": 1}, status=400)
+        resp = self.request("PUT", "/api/v1/entries/2025-03-01", [1, 2])
+        self.assertEqual(resp.code, 400)
+
+    def test_cursor_pages_newest_first(self):
+        for day in range(1, 6):
+            self.json("PUT", f"/api/v1/entries/2025-03-0{day}", {"Steps": day})
+        seen, cursor = [], None
+        while True:
+            page = self.json("GET", "/api/v1/entries?limit=2" + (f"&cursor={cursor}" if cursor else ""))
+            seen += [e["Date"] for e in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, [f"2025-03-0{d}" for d in range(5, 0, -1)])
+
+    def test_date_range(self):
+        for day in range(1, 6):
+            self.json("PUT", f"/api/v1/entries/2025-03-0{day}", {"Steps": day})
+        page = self.json("GET", "/api/v1/entries?since=2025-03-02&until=2025-03-03")
+        self.assertEqual([e["Date"] for e in page["items"]], ["2025-03-03", "2025-03-02"])
+
+    def test_etag_and_304(self):
+        self.json("PUT", "/api/v1/entries/2025-03-01", {"Steps": 1})
+        first = self.request("GET", "/api/v1/entries")
+        etag = first.headers["Etag"]
+        again = self.request("GET", "/api/v1/entries", headers={"If-None-Match": etag})
+        self.assertEqual(again.code, 304)
+        self.json("PATCH", "/api/v1/entries/2025-03-01", {"Steps": 2})
+        changed = self.request("GET", "/api/v1/entries", headers={"If-None-Match": etag})
+        self.assertEqual(changed.code, 200)
+        self.assertNotEqual(changed.headers["Etag"], etag)
+
+
+class WorkoutsAndStatsTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        user_ref = db.collection("users").document(self.uid)
+        base = datetime.datetime(2025, 3, 1, 18, 0)
+        for i in range(5):
+            start = base + datetime.timedelta(days=i)
+            user_ref.collection("workouts").document(start.isoformat()).set(
+                {"name": f"W{i}", "start": start, "entries": []})
+            user_ref.collection("exercise_stats").document(f"ex_{i}").set(
+                {"sets": 3, "updated_at": start})
+
+    def _pages(self, path):
+        out, cursor = [], None
+        while True:
+            page = self.json("GET", f"{path}?limit=2" + (f"&cursor={cursor}" if cursor else ""))
+            out += page["items"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return out
+
+    def test_workouts_cursor(self):
+        names = [w["name"] for w in self._pages("/api/v1/workouts")]
+        self.assertEqual(names, ["W4", "W3", "W2", "W1", "W0"])
+
+    def test_workout_detail(self):
+        workout = self.json("GET", "/api/v1/workouts/2025-03-02T18:00:00")
+        self.assertEqual((workout["name"], workout["archived"]), ("W1", False))
+        self.json("GET", "/api/v1/workouts/missing", status=404)
+
+    def test_stats_cursor(self):
+        keys = [s["key"] for s in self._pages("/api/v1/stats")]
+        self.assertEqual(keys, ["ex_4", "ex_3", "ex_2", "ex_1", "ex_0"])
+        self.assertEqual(self.json("GET", "/api/v1/stats/ex_2")["sets"], 3)
+
+    def test_users_only_see_their_own_data(self):
+        other = auth.create_user_with_email_and_password(f"{uuid.uuid4().hex}@example.com", "pw123456")
+        page = self.json("GET", "/api/v1/workouts", token=other["idToken"])
+        self.assertEqual(page, {"items": [], "next_cursor": None})
+
+    def test_equal_timestamps_are_not_skipped(self):
+        user_ref = db.collection("users").document(self.uid)
+        same = datetime.datetime(2025, 4, 1, 7, 0)
+        for i in range(5):
+            user_ref.collection("exercise_stats").document(f"tie_{i}").set({"sets": 1, "updated_at": same})
+        keys = [s["key"] for s in self._pages("/api/v1/stats")]
+        self.assertEqual(sorted(keys), sorted([f"tie_{i}" for i in range(5)] + [f"ex_{i}" for i in range(5)]))
+        self.assertEqual(len(keys), len(set(keys)))
+
+    def test_bad_cursor(self):
+        for cursor in ("nope", "bm9wZQ", "WzEsMl0"):
+            self.json("GET", f"/api/v1/workouts?cursor={cursor}", status=400)
+            self.json("GET", f"/api/v1/stats?cursor={cursor}", status=400)
+
+    def test_archived_workout_detail(self):
+        user_ref = db.collection("users").document(self.uid)
+        archive_user(db, user_ref, datetime.datetime(2025, 3, 3))
+        workout = self.json("GET", "/api/v1/workouts/2025-03-02T18:00:00")
+        self.assertEqual((workout["name"], workout["archived"]), ("W1", True))
+        self.json("GET", "/api/v1/workouts/2024-03-02T18:00:00", status=404)
+
+    def test_bytes_come_back_base64(self):
+        user_ref = db.collection("users").document(self.uid)
+        user_ref.collection("exercise_stats").document("packed").set({"raw": b"\x01\x02"})
+        self.assertEqual(self.json("GET", "/api/v1/stats/packed")["raw"], "AQI=")
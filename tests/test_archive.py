@@ -0,0 +1,74 @@
+# tests/test_archive.py
+
+import datetime
+import uuid
+import pytest
+from app import archive
+from app.archive import (
+    SUMMARY_DOC, archive_user, archived_count, delete_archived, find_archived, iter_archived,
+    list_archived,
+)
+from app.firebase_config import db
+
+
+@pytest.fixture
+def user_ref():
+    ref = db.collection("users").document(uuid.uuid4().hex)
+    for year in (2022, 2023):
+        for day in range(1, 6):
+            start = datetime.datetime(year, 3, day, 18, 0)
+            ref.collection("workouts").document(start.isoformat()).set(
+                {"name": f"W{year}-{day}", "start": start, "entries": [], "note": "x" * 2000})
+    return ref
+
+
+def _summary(user_ref):
+    return user_ref.collection(SUMMARY_DOC[0]).document(SUMMARY_DOC[1]).get().to_dict()
+
+
+def test_archive_lists_finds_and_counts(user_ref):
+    assert archive_user(db, user_ref, datetime.datetime(2023, 3, 3)) == {"archived": 7, "years": [2022, 2023]}
+    assert archived_count(user_ref) == 7
+    assert len(list(user_ref.collection("workouts").stream())) == 3
+    rows = list_archived(user_ref)
+    assert [r["name"] for r in rows[:3]] == ["W2023-2", "W2023-1", "W2022-5"]
+    assert find_archived(user_ref, "2022-03-04T18:00:00")["name"] == "W2022-4"
+    assert find_archived(user_ref, "2023-03-04T18:00:00") is None
+    assert find_archived(user_ref, "not-an-id") is None
+    assert sorted(w["name"] for _, w in iter_archived(user_ref))[0] == "W2022-1"
+
+
+def test_summary_holds_counts_not_indexes(user_ref, monkeypatch):
+    monkeypatch.setattr(archive, "MAX_BUNDLE_BYTES", 60)
+    archive_user(db, user_ref, datetime.datetime(2024, 1, 1))
+    summary = _summary(user_ref)
+    assert summary["count"] == 10
+    assert all(isinstance(v, int) for v in summary["bundles"].values())
+    assert len(summary["bundles"]) > 2          # years split into parts
+    assert len(list_archived(user_ref)) == 10
+
+
+def test_delete_rewrites_the_year(user_ref):
+    archive_user(db, user_ref, datetime.datetime(2024, 1, 1))
+    row = next(r for r in list_archived(user_ref) if r["name"] == "W2022-2")
+    assert delete_archived(user_ref, row["bundle"], row["id"])
+    assert archived_count(user_ref) == 9
+    assert find_archived(user_ref, row["id"]) is None
+    assert not delete_archived(user_ref, row["bundle"], row["id"])
+
+
+def test_reads_summaries_that_held_indexes(user_ref):
+    archive_user(db, user_ref, datetime.datetime(2024, 1, 1))
+    ref = user_ref.collection(SUMMARY_DOC[0]).document(SUMMARY_DOC[1])
+    ref.set({"bundles": {bid: [{"id": str(i)} for i in range(n)] for bid, n in _summary(user_ref)["bundles"].items()}})
+    assert archived_count(user_ref) == 10
+    ref.delete()
+    assert archived_count(user_ref) == 10
+
+
+def test_listing_is_cached_until_the_archive_changes(user_ref):
+    archive_user(db, user_ref, datetime.datetime(2024, 1, 1))
+    assert len(archive.list_archived_cached(user_ref.id)) == 10
+    row = archive.list_archived_cached(user_ref.id)[0]
+    delete_archived(user_ref, row["bundle"], row["id"])
+    assert len(archive.list_archived_cached(user_ref.id)) == 9
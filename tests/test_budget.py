@@ -0,0 +1,82 @@
+# tests/test_budget.py
+
+import time
+import pytest
+from app import budget
+from app.budget import BudgetExceeded, Governor, budget_scope, govern
+from app.catalog import CatalogApplyError, apply_catalog_changes
+from app.fake_firestore import FakeFirestore
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    gov = Governor(user_reads=60, user_writes=60, process_reads=0, process_writes=0)
+    monkeypatch.setattr(budget, "governor", gov)
+    return gov
+
+
+def _store(n=5):
+    client = FakeFirestore()
+    for i in range(n):
+        client.document(f"users/u{i}").set({"i": i})
+    return client
+
+
+def test_stream_is_charged_as_it_yields(governor):
+    db = govern(_store(5))
+    with budget_scope("a"):
+        docs = db.collection("users").stream()
+        assert governor.usage["a"]["reads"] == 1
+        next(docs)
+        assert governor.usage["a"]["reads"] == 1
+        assert len(list(docs)) == 4
+    assert governor.usage["a"]["reads"] == 5
+
+
+def test_empty_stream_costs_one_read(governor):
+    db = govern(FakeFirestore())
+    with budget_scope("a"):
+        assert list(db.collection("users").stream()) == []
+    assert governor.usage["a"]["reads"] == 1
+
+
+def test_user_out_of_reads_is_refused(governor):
+    db = govern(_store(1))
+    governor.charge("a", "read", 60 * 16 + 1)
+    with budget_scope("a"), pytest.raises(BudgetExceeded):
+        db.document("users/u0").get()
+    with budget_scope("b"):
+        assert db.document("users/u0").get().exists
+
+
+def test_maintenance_writes_skip_the_user_budget(governor):
+    db = govern(FakeFirestore())
+    changes = [{"op": "insert", "path": f"brands/b{i}", "data": {"name": f"B{i}"}, "fields": ["name"]}
+               for i in range(60 * 16 + 500)]
+    with budget_scope("admin"):
+        with pytest.raises(CatalogApplyError) as exc:
+            apply_catalog_changes(db, changes)
+        assert isinstance(exc.value.__cause__, BudgetExceeded)
+        with budget_scope(None):
+            assert apply_catalog_changes(db, changes) == len(changes)
+    assert governor.usage["*"]["writes"] > governor.usage["admin"]["writes"]
+
+
+def test_idle_users_are_forgotten_once_refilled():
+    gov = Governor(user_reads=6000, user_writes=0, idle_seconds=0)
+    gov.charge("a", "read", 50)
+    gov.charge("b", "read", 1)
+    time.sleep(0.05)
+    assert gov.prune() == 1              # b refilled, a still owes
+    assert "b" not in gov.usage and "a" in gov.usage
+    time.sleep(0.5)
+    assert gov.prune() == 1
+    assert set(gov.usage) == {"*"} and not gov.report()["users"]
+    assert gov.usage["*"]["reads"] == 51
+
+
+def test_tracked_users_are_capped():
+    gov = Governor(user_reads=600, max_users=2)
+    for uid in ("a", "b", "a", "c"):
+        gov.charge(uid, "read", 1)
+    assert set(gov.report()["users"]) == {"a", "c"}
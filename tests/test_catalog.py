@@ -0,0 +1,100 @@
+# tests/test_catalog.py
+
+import json
+import pytest
+from app.catalog import (
+    BATCH_LIMIT, CatalogApplyError, apply_catalog_changes, diff_catalog, load_catalog_snapshot,
+    parse_catalog_file,
+)
+from app.fake_firestore import FakeFirestore
+
+
+def _csv(*lines):
+    return ("kind,brand,name,type,default_weight,subtype\n" + "\n".join(lines) + "\n").encode()
+
+
+@pytest.fixture
+def db():
+    client = FakeFirestore()
+    client.document("brands/hammer").set({"name": "Hammer"})
+    client.document("brands/hammer/machines/chest_press").set(
+        {"name": "Chest Press", "type": "Plate-loaded", "default_starting_weight": 45.0, "subtype": "press"})
+    client.document("exercise_library/curl").set({"name": "Curl", "type": "Dumbbell", "default_weight": 20.0})
+    return client
+
+
+def _apply(db, raw, filename="catalog.csv", **kw):
+    changes = diff_catalog(parse_catalog_file(filename, raw), load_catalog_snapshot(db), **kw)
+    apply_catalog_changes(db, changes)
+    return changes
+
+
+def test_blank_cells_leave_stored_values_alone(db):
+    changes = _apply(db, _csv("machine,Hammer,Chest Press,,,", "exercise,,Curl,,,"))
+    assert changes == []
+    assert db.document("brands/hammer/machines/chest_press").get().to_dict()["default_starting_weight"] == 45.0
+
+
+def test_filled_cells_update_only_themselves(db):
+    (change,) = _apply(db, _csv("machine,Hammer,Chest Press,,50,"))
+    assert change["fields"] == ["default_starting_weight"]
+    doc = db.document("brands/hammer/machines/chest_press").get().to_dict()
+    assert (doc["type"], doc["default_starting_weight"], doc["subtype"]) == ("Plate-loaded", 50.0, "press")
+
+
+def test_dash_clears_the_subtype(db):
+    (change,) = _apply(db, _csv("machine,Hammer,Chest Press,,,-"))
+    assert change["fields"] == ["subtype"]
+    assert "subtype" not in db.document("brands/hammer/machines/chest_press").get().to_dict()
+    assert _apply(db, _csv("machine,Hammer,Chest Press,,,-")) == []
+
+
+def test_inserts_get_defaults(db):
+    raw = json.dumps({"machines": [{"brand": "Life Fitness", "name": "Row"}],
+                      "exercises": [{"name": "Plank"}]}).encode()
+    _apply(db, raw, "catalog.json")
+    assert db.document("brands/life_fitness").get().to_dict() == {"name": "Life Fitness"}
+    assert db.document("brands/life_fitness/machines/row").get().to_dict() == {
+        "name": "Row", "type": "Machine", "default_starting_weight": 0.0}
+    assert db.document("exercise_library/plank").get().to_dict() == {
+        "name": "Plank", "type": "", "default_weight": 0.0}
+
+
+def test_deletes_are_opt_in_and_scoped(db):
+    db.document("brands/other/machines/x").set({"name": "X"})
+    db.document("brands/other").set({"name": "Other"})
+    raw = _csv("machine,Hammer,Leg Press,,,")
+    assert [c["op"] for c in _apply(db, raw)] == ["insert"]
+    ops = [(c["op"], c["path"]) for c in _apply(db, raw, allow_deletes=True)]
+    assert ops == [("delete", "brands/hammer/machines/chest_press")]
+    assert db.document("brands/other/machines/x").get().exists
+
+
+def test_bad_rows_are_reported():
+    with pytest.raises(ValueError) as e:
+        parse_catalog_file("c.csv", _csv("machine,,Row,,,", "gizmo,,X,,,", "exercise,,Curl,,heavy,"))
+    assert "row 1" in str(e.value) and "row 2" in str(e.value) and "row 3" in str(e.value)
+    with pytest.raises(ValueError):
+        parse_catalog_file("c.json", b'{"machines": {"name": "Row"}}')
+
+
+def test_a_failed_apply_resumes_from_the_same_file(db, monkeypatch):
+    raw = _csv(*[f"exercise,,Move {i},Bodyweight,," for i in range(BATCH_LIMIT + 10)])
+    rows = parse_catalog_file("c.csv", raw)
+    changes = diff_catalog(rows, load_catalog_snapshot(db))
+    commit, calls = type(db.batch()).commit, []
+
+    def flaky(self):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("unavailable")
+        return commit(self)
+    monkeypatch.setattr(type(db.batch()), "commit", flaky)
+    with pytest.raises(CatalogApplyError) as e:
+        apply_catalog_changes(db, changes)
+    assert e.value.written == BATCH_LIMIT
+
+    rest = diff_catalog(rows, load_catalog_snapshot(db))
+    assert len(rest) == 10
+    assert apply_catalog_changes(db, rest) == 10
+    assert diff_catalog(rows, load_catalog_snapshot(db)) == []
@@ -0,0 +1,45 @@
+# tests/test_entries_store.py
+
+import datetime
+import uuid
+import pytest
+from app.entries_store import fetch_entry_window, has_legacy_dates, normalize_dates, save_entry
+from app.entry_windows import EntryWindows
+from app.firebase_config import db
+
+
+@pytest.fixture
+def uid():
+    uid = uuid.uuid4().hex
+    for day in (1, 2, 3):
+        save_entry(uid, f"2024-03-0{day}", {"Weight": 180.0 + day})
+    return uid
+
+
+def _daily(uid, doc_id):
+    return db.collection("users").document(uid).collection("entries").document(doc_id)
+
+
+def test_iso_dates_are_not_legacy(uid):
+    assert not has_legacy_dates(uid)
+    assert [r["Date"] for r in fetch_entry_window(uid, "2024-03-02", "2024-03-03")] == ["2024-03-02", "2024-03-03"]
+
+
+def test_windows_read_everything_while_timestamp_dates_remain(uid):
+    _daily(uid, "2024-03-04").set({"Date": datetime.datetime(2024, 3, 4), "Weight": 184.0})
+    assert has_legacy_dates(uid)
+    assert fetch_entry_window(uid, "2024-03-04", "2024-03-04") == []
+    windows = EntryWindows()
+    rows = windows.rows(uid, "2024-03-03", "2024-03-04")
+    assert [r["Weight"] for r in rows] == [183.0, 184.0]
+    assert windows.spans(uid) == [("0001-01-01", "9999-12-31")]
+
+
+def test_normalize_dates_rewrites_legacy_docs(uid):
+    _daily(uid, "2024-03-04").set({"Date": datetime.datetime(2024, 3, 4), "Weight": 184.0})
+    _daily(uid, "2024-03-05").set({"Date": "2024-3-5", "Weight": 185.0})
+    assert normalize_dates(uid) == {"uid": uid, "fixed": 2, "skipped": 0}
+    assert not has_legacy_dates(uid)
+    rows = fetch_entry_window(uid, "2024-03-04", "2024-03-05")
+    assert [(r["Date"], r["Weight"]) for r in rows] == [("2024-03-04", 184.0), ("2024-03-05", 185.0)]
+    assert normalize_dates(uid)["fixed"] == 0
@@ -0,0 +1,68 @@
+# tests/test_entry_windows.py
+
+import uuid
+import pytest
+from app.entries_store import save_entry
+from app.entry_windows import MAX_DATE, MIN_DATE, EntryWindows, _row_bytes, merge_spans, missing_spans
+from app.shared_cache import invalidate
+
+
+@pytest.fixture
+def uid():
+    uid = uuid.uuid4().hex
+    for day in range(1, 31):
+        save_entry(uid, f"2024-04-{day:02d}", {"Weight": 180.0 + day / 10})
+    return uid
+
+
+def test_merge_spans_joins_overlapping_and_adjacent():
+    spans = [("2024-03-10", "2024-03-20"), ("2024-03-01", "2024-03-05"), ("2024-03-06", "2024-03-08"),
+             ("2024-03-15", "2024-03-25"), ("2024-04-01", "2024-04-02")]
+    assert merge_spans(spans) == [("2024-03-01", "2024-03-08"), ("2024-03-10", "2024-03-25"),
+                                  ("2024-04-01", "2024-04-02")]
+    assert merge_spans([("2024-12-31", MAX_DATE), ("2024-01-01", "2024-12-30")]) == [("2024-01-01", MAX_DATE)]
+    assert merge_spans([]) == []
+
+
+def test_missing_spans_are_the_uncovered_parts():
+    spans = [("2024-03-05", "2024-03-10"), ("2024-03-20", "2024-03-25")]
+    assert missing_spans(spans, "2024-03-01", "2024-03-31") == [
+        ("2024-03-01", "2024-03-04"), ("2024-03-11", "2024-03-19"), ("2024-03-26", "2024-03-31")]
+    assert missing_spans(spans, "2024-03-06", "2024-03-09") == []
+    assert missing_spans(spans, "2024-03-08", "2024-03-22") == [("2024-03-11", "2024-03-19")]
+    assert missing_spans([], MIN_DATE, MAX_DATE) == [(MIN_DATE, MAX_DATE)]
+    assert missing_spans([(MIN_DATE, "2024-03-10")], MIN_DATE, "2024-03-12") == [("2024-03-11", "2024-03-12")]
+
+
+def test_widening_a_window_reads_only_the_gap(uid):
+    windows = EntryWindows()
+    assert len(windows.rows(uid, "2024-04-20", "2024-04-30")) == 11
+    assert len(windows.rows(uid, "2024-04-10", "2024-04-30")) == 21
+    assert windows.counters["rows_read"] == 21
+    assert windows.rows(uid, "2024-04-12", "2024-04-14")[0]["Date"] == "2024-04-12"
+    assert windows.counters["hits"] == 1
+    assert windows.spans(uid) == [("2024-04-10", "2024-04-30")]
+
+
+def test_a_save_retires_the_spans(uid):
+    windows = EntryWindows()
+    windows.rows(uid, "2024-04-01", "2024-04-30")
+    save_entry(uid, "2024-04-15", {"Weight": 170.0})
+    invalidate(f"entries/{uid}")
+    assert windows.rows(uid, "2024-04-15", "2024-04-15")[0]["Weight"] == 170.0
+    assert windows.spans(uid) == [("2024-04-15", "2024-04-15")]
+
+
+def test_least_recently_used_users_go_past_the_byte_budget(uid):
+    other = uuid.uuid4().hex
+    for day in range(1, 31):
+        save_entry(other, f"2024-04-{day:02d}", {"Weight": 150.0})
+    probe = EntryWindows()
+    one_user = sum(_row_bytes(r) for r in probe.rows(uid, "2024-04-01", "2024-04-30"))
+    windows = EntryWindows(max_bytes=one_user + one_user // 2)
+    windows.rows(uid, "2024-04-01", "2024-04-30")
+    windows.rows(other, "2024-04-01", "2024-04-30")
+    stats = windows.stats()
+    assert stats["users"] == 1 and stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert windows.spans(uid) == [] and windows.spans(other) == [("2024-04-01", "2024-04-30")]
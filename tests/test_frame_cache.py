@@ -0,0 +1,78 @@
+# tests/test_frame_cache.py
+
+import pandas as pd
+import pytest
+from app.frame_cache import FrameCache, frame_nbytes
+
+
+@pytest.fixture(autouse=True)
+def copy_on_write():
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+
+def _frame(n=100):
+    return pd.DataFrame({"Date": [f"2025-01-{i % 28 + 1:02d}" for i in range(n)],
+                         "Calories": range(n), "Weight": [180.0] * n})
+
+
+def test_needs_copy_on_write():
+    with pd.option_context("mode.copy_on_write", False):
+        with pytest.raises(RuntimeError):
+            FrameCache(1 << 20)
+
+
+def test_writes_to_a_handed_out_frame_stay_local():
+    cache = FrameCache(1 << 20)
+    cache.put("u1", _frame())
+    hit = cache.get("u1")
+    hit.loc[0, "Calories"] = 5
+    hit["Extra"] = 1
+    assert cache.get("u1").loc[0, "Calories"] == 0
+    assert "Extra" not in cache.get("u1").columns
+
+
+def test_writes_to_the_put_frame_stay_local():
+    cache = FrameCache(1 << 20)
+    df = _frame()
+    cache.put("u1", df)
+    df.loc[0, "Calories"] = 5
+    assert cache.get("u1").loc[0, "Calories"] == 0
+
+
+def test_evicts_least_recently_used_within_budget():
+    one = frame_nbytes(_frame())
+    cache = FrameCache(one * 2 + one // 2)
+    for key in ("a", "b"):
+        cache.put(key, _frame())
+    cache.get("a")
+    cache.put("c", _frame())
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["bytes"] <= cache.budget_bytes
+
+
+def test_spills_and_reads_back(tmp_path):
+    one = frame_nbytes(_frame())
+    cache = FrameCache(one + one // 2, spill_dir=str(tmp_path))
+    cache.put("a", _frame())
+    cache.put("b", _frame())
+    assert cache.stats()["spills"] == 1
+    assert cache.get("a")["Calories"].tolist() == list(range(100))
+    assert cache.stats()["spill_hits"] == 1
+    cache.clear()
+    assert not list(tmp_path.iterdir())
+
+
+def test_a_new_version_removes_the_old_spill(tmp_path):
+    one = frame_nbytes(_frame())
+    cache = FrameCache(one + one // 2, spill_dir=str(tmp_path))
+    cache.put("u1:v1", _frame())
+    cache.put("u2:v1", _frame())
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["u1_v1.parquet"]
+    cache.put("u1:v2", _frame())
+    assert "u1_v1.parquet" not in {p.name for p in tmp_path.iterdir()}
+    assert cache.get("u1:v1") is None
+    assert cache.get("u1:v2") is not None
+    cache.put("u11:v3", _frame())
+    assert cache.get("u1:v2") is not None
@@ -0,0 +1,52 @@
+# tests/test_metrics.py
+
+import datetime
+import uuid
+import pytest
+from app import metrics
+from app.entries_store import save_entry
+from app.firebase_config import db
+from app.metrics import aggregate, aggregate_rows, headline_metrics, quick_stats_window
+
+TODAY = datetime.date(2024, 6, 30)
+
+
+@pytest.fixture
+def uid():
+    uid = uuid.uuid4().hex
+    user_ref = db.collection("users").document(uid)
+    for back in range(40):
+        day = TODAY - datetime.timedelta(days=back)
+        save_entry(uid, day.isoformat(), {"Calories": 2000 + back, "Protein": 150, "Steps": "n/a" if back == 3 else 8000})
+    for back in (0, 2, 8, 20):
+        start = datetime.datetime.combine(TODAY - datetime.timedelta(days=back), datetime.time(18))
+        user_ref.collection("workouts").document(start.isoformat()).set({"name": "W", "start": start})
+    return uid
+
+
+def test_aggregate_rows_skips_non_numbers():
+    rows = [{"a": 1, "b": True}, {"a": 2.5, "b": "x"}, {}]
+    assert aggregate_rows(rows, sums=["a"], avgs=["a", "b"]) == {
+        "count": 3, "sum_a": 3.5, "avg_a": 1.75, "avg_b": None}
+
+
+def test_server_and_local_aggregation_agree(uid, monkeypatch):
+    query = db.collection("users").document(uid).collection("entries").where("Date", ">=", "2024-06-25")
+    server = aggregate(query, sums=["Calories"], avgs=["Steps"])
+    monkeypatch.setattr(metrics, "_server_ok", False)
+    assert aggregate(query, sums=["Calories"], avgs=["Steps"]) == server
+    assert server == {"count": 6, "sum_Calories": sum(2000 + b for b in range(6)), "avg_Steps": 8000}
+
+
+def test_headline_metrics(uid):
+    out = headline_metrics(uid, today=TODAY)
+    assert (out["workouts_total"], out["workouts_7d"], out["workouts_prev_7d"]) == (4, 2, 1)
+    assert out["entries_30d"] == 30
+    assert out["avg_Calories_30d"] == pytest.approx(2014.5)
+    assert out["avg_Steps_30d"] == 8000
+
+
+def test_quick_stats_window_ends_at_the_latest_entry(uid):
+    rows = quick_stats_window(uid)
+    assert sorted(r["Date"] for r in rows) == [(TODAY - datetime.timedelta(days=b)).isoformat() for b in range(6, -1, -1)]
+    assert quick_stats_window(uuid.uuid4().hex) == []
@@ -0,0 +1,71 @@
+# tests/test_prefetch.py
+
+import datetime
+import uuid
+import pytest
+from app.firebase_config import db
+from app.prefetch import StatsPrefetcher
+from app.workout_log import WORKOUT_ENCODING, LoggedExercise, encode_workout_sets
+
+
+@pytest.fixture
+def uid():
+    uid = uuid.uuid4().hex
+    user_ref = db.collection("users").document(uid)
+    stats = user_ref.collection("exercise_stats")
+    stats.document("hammer--chest_press").set({"last_sets": 3, "updated_at": datetime.datetime(2024, 5, 1)})
+    stats.document("curl").set({"last_sets": 2, "updated_at": datetime.datetime(2024, 4, 1)})
+    start = datetime.datetime(2024, 5, 1, 18)
+    items = [LoggedExercise("Chest Press", brand="Hammer", reps=[10], weights=[50.0]),
+             LoggedExercise("Pushdown", attachment="Rope", reps=[12], weights=[20.0])]
+    user_ref.collection("workouts").document(start.isoformat()).set(
+        {"name": "Push", "start": start, "enc": WORKOUT_ENCODING, "sets": encode_workout_sets(items)})
+    return uid
+
+
+def _warmed(uid, ex_type=None):
+    p = StatsPrefetcher(db, uid)
+    p.warm(ex_type)
+    thread = p._thread
+    if thread is not None:
+        thread.join(5)
+    return p
+
+
+def test_warm_answers_lookups_from_memory(uid):
+    p = _warmed(uid)
+    assert p.lookup("hammer--chest_press")["last_sets"] == 3
+    assert p.lookup("pushdown--rope") == {}          # known missing, no read
+    assert p.counters["hits"] == 2 and p.counters["misses"] == 0
+    assert p.lookup("squat") == {}
+    assert p.counters["misses"] == 1
+
+
+def test_legacy_fallbacks(uid):
+    p = StatsPrefetcher(db, uid)
+    assert p.lookup("Curl_New", legacy_fallbacks=["curl"])["last_sets"] == 2
+
+
+def test_forget_reads_the_write_back(uid):
+    p = _warmed(uid)
+    db.collection("users").document(uid).collection("exercise_stats").document("curl").set({"last_sets": 5})
+    assert p.lookup("curl")["last_sets"] == 2
+    p.forget("curl")
+    assert p.lookup("curl")["last_sets"] == 5
+
+
+def test_a_read_from_before_a_forget_isnt_stored(uid):
+    p = StatsPrefetcher(db, uid)
+    gen = p._generation()
+    p.forget("curl")
+    p._store({"curl": {"last_sets": 2}}, gen)
+    assert "curl" not in p._stats
+    p._store({"curl": {"last_sets": 5}}, p._generation())
+    assert p.lookup("curl")["last_sets"] == 5
+
+
+def test_a_failed_warm_leaves_lookups_to_firestore(uid, monkeypatch):
+    monkeypatch.setattr(StatsPrefetcher, "_warm", lambda self, ex_type: 1 / 0)
+    p = _warmed(uid)
+    assert p._thread is None
+    assert p.lookup("curl")["last_sets"] == 2
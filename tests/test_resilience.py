@@ -0,0 +1,188 @@
+# tests/test_resilience.py
+
+import time
+import pytest
+from google.api_core import exceptions as gexc
+from app import resilience
+from app.fake_firestore import FakeFirestore, FaultPlan
+from app.resilience import CircuitBreaker, CircuitOpenError, call_with_retry, pop_stale, resilient
+from app.shared_cache import MemoryBackend, SharedCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    # no backoff sleeps, and breakers / counters that start closed and at zero
+    monkeypatch.setattr(resilience, "BACKOFF_BASE", 0)
+    monkeypatch.setattr(resilience, "breakers", {
+        "read": CircuitBreaker("read", failures=3, cooldown=0.05),
+        "write": CircuitBreaker("write", failures=3, cooldown=0.05),
+    })
+    monkeypatch.setattr(resilience, "counters", {"retries": 0, "failures": 0, "fast_fails": 0})
+    pop_stale()
+    return resilience.breakers
+
+
+def _failing(*errors, result="ok"):
+    # fn(timeout) raising `errors` in turn, then returning `result`
+    errors = list(errors)
+
+    def fn(timeout):
+        if errors:
+            raise errors.pop(0)
+        return result
+    return fn
+
+
+def _store(faults=None):
+    client = FakeFirestore()
+    client.document("users/u1").set({"name": "a"})
+    client.faults = faults
+    return client
+
+
+def test_transient_errors_are_retried():
+    fn = _failing(gexc.ServiceUnavailable("x"), gexc.DeadlineExceeded("x"))
+    assert call_with_retry(fn) == "ok"
+    assert resilience.counters["retries"] == 2
+    assert resilience.breakers["read"].failures == 0
+
+
+def test_gives_up_after_max_attempts(fresh_breakers):
+    fn = _failing(*[gexc.ResourceExhausted("x")] * resilience.MAX_ATTEMPTS)
+    with pytest.raises(gexc.ResourceExhausted):
+        call_with_retry(fn)
+    assert resilience.counters["retries"] == resilience.MAX_ATTEMPTS - 1
+    assert fresh_breakers["read"].failures == 1
+
+
+def test_unretried_calls_fail_on_the_first_error():
+    fn = _failing(gexc.ServiceUnavailable("x"))
+    with pytest.raises(gexc.ServiceUnavailable):
+        call_with_retry(fn, "write", retry=False)
+    assert resilience.counters["retries"] == 0
+
+
+def test_reads_against_a_faulty_store_succeed():
+    faults = FaultPlan(unavailable=0.3, deadline=0.1, seed=7)
+    db = resilient(_store(faults))
+    for _ in range(30):
+        assert db.document("users/u1").get().to_dict() == {"name": "a"}
+        assert [d.id for d in db.collection("users").stream()] == ["u1"]
+    assert sum(faults.injected.values()) > 0
+    assert resilience.counters["retries"] == sum(faults.injected.values())
+
+
+def test_breaker_opens_then_fails_fast(fresh_breakers):
+    db = resilient(_store(FaultPlan(unavailable=1.0)))
+    for _ in range(3):
+        with pytest.raises(gexc.ServiceUnavailable):
+            db.document("users/u1").get()
+    assert fresh_breakers["read"].state == "open"
+    with pytest.raises(CircuitOpenError):
+        db.document("users/u1").get()
+    assert resilience.counters["fast_fails"] == 1
+    # writes have their own breaker
+    assert fresh_breakers["write"].state == "closed"
+
+
+def test_half_open_trial_closes_or_reopens(fresh_breakers):
+    client = _store(FaultPlan(unavailable=1.0))
+    db = resilient(client)
+    for _ in range(3):
+        with pytest.raises(gexc.ServiceUnavailable):
+            db.document("users/u1").get()
+    time.sleep(0.06)
+    assert fresh_breakers["read"].state == "half-open"
+    with pytest.raises(gexc.ServiceUnavailable):
+        db.document("users/u1").get()
+    # the failed trial reopens it straight away
+    assert fresh_breakers["read"].state == "open"
+    assert fresh_breakers["read"].trips == 2
+
+    time.sleep(0.06)
+    client.faults = None
+    assert db.document("users/u1").get().exists
+    assert fresh_breakers["read"].state == "closed"
+    assert fresh_breakers["read"].failures == 0
+
+
+def test_answers_from_the_service_count_as_success(fresh_breakers):
+    breaker = fresh_breakers["read"]
+    breaker.failures = 2
+    with pytest.raises(gexc.NotFound):
+        call_with_retry(_failing(gexc.NotFound("x")))
+    assert breaker.failures == 0
+
+
+def test_server_faults_count_against_the_breaker(fresh_breakers):
+    for _ in range(3):
+        with pytest.raises(gexc.InternalServerError):
+            call_with_retry(_failing(gexc.InternalServerError("x")))
+    assert fresh_breakers["read"].state == "open"
+    assert resilience.counters["retries"] == 0
+
+
+def test_local_errors_leave_the_breaker_alone(fresh_breakers):
+    breaker = fresh_breakers["write"]
+    breaker.failures = 2
+    with pytest.raises(ValueError):
+        call_with_retry(_failing(ValueError("too many writes")), "write")
+    assert breaker.failures == 2
+
+    # ... but don't hold up the trial of a half-open circuit
+    breaker.failure()
+    time.sleep(0.06)
+    with pytest.raises(ValueError):
+        call_with_retry(_failing(ValueError("x")), "write")
+    assert call_with_retry(_failing(), "write") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_client_retry_is_switched_off():
+    seen = {}
+
+    class Target:
+        def get(self, **kwargs):
+            seen["get"] = kwargs
+
+        def stream(self, **kwargs):
+            seen["stream"] = kwargs
+            return iter(())
+
+    db = resilient(Target())
+    db.get()
+    list(db.stream())
+    assert seen["get"]["retry"] is None
+    assert seen["stream"]["retry"] is resilience._STREAM_NO_RETRY
+    assert not seen["stream"]["retry"]._predicate(gexc.ServiceUnavailable("x"))
+    assert seen["get"]["timeout"] > 0
+
+
+def test_add_is_not_retried():
+    db = resilient(_store(FaultPlan(unavailable=1.0)))
+    with pytest.raises(gexc.ServiceUnavailable):
+        db.collection("users").add({"name": "b"})
+    assert resilience.counters["retries"] == 0
+
+
+def test_loader_serves_last_good_value_while_unavailable():
+    client = _store()
+    db = resilient(client)
+    cache = SharedCache(MemoryBackend(), local_ttl=0)
+
+    def load():
+        return [d.to_dict() for d in db.collection("users").stream()]
+
+    assert cache.get_or_load("catalog", "users", load, ttl=60) == [{"name": "a"}]
+    cache.invalidate("catalog")
+    client.faults = FaultPlan(unavailable=1.0)
+    assert cache.get_or_load("catalog", "users", load, ttl=60) == [{"name": "a"}]
+    assert cache.counters["stale"] == 1
+    assert pop_stale() == {"catalog"}
+
+    # once the circuit is open the fallback is served without touching Firestore
+    for _ in range(2):
+        cache.get_or_load("catalog", "users", load, ttl=60)
+    injected = sum(client.faults.injected.values())
+    assert cache.get_or_load("catalog", "users", load, ttl=60) == [{"name": "a"}]
+    assert sum(client.faults.injected.values()) == injected
@@ -0,0 +1,70 @@
+# tests/test_search.py
+
+import datetime
+from app.search import build_exercise_index, search_label
+
+LIBRARY = [
+    {"name": "Bench Press", "type": "Barbell"},
+    {"name": "Incline Bench Press", "type": "Dumbbell"},
+    {"name": "Tricep Pushdown", "type": "Cable"},
+    {"name": "Triceps Dip", "type": "Bodyweight"},
+    {"name": ""},
+]
+MACHINES = [{"name": "Chest Press", "type": "Machine", "brand": "Hammer", "brand_id": "hammer"}]
+ATTACHMENTS = [{"name": "Rope"}, {"name": "Straight Bar"}]
+
+
+def _index():
+    return build_exercise_index(LIBRARY, MACHINES, ATTACHMENTS)
+
+
+def _days_ago(n):
+    return datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=n)
+
+
+def _names(hits):
+    return [h["name"] for h in hits]
+
+
+def test_builds_keys_and_skips_nameless_items():
+    index = _index()
+    assert len(index) == 7
+    keys = {it["name"]: it["key"] for it in index.items}
+    assert keys["Chest Press"] == "hammer--chest_press"
+    assert keys["Tricep Pushdown"] == "tricep_pushdown--noattach"
+
+
+def test_prefix_match_ranks_first():
+    assert _names(_index().search("bench"))[:2] == ["Bench Press", "Incline Bench Press"]
+    assert _names(_index().search("press hammer"))[0] == "Chest Press"
+
+
+def test_short_queries_prefix_match_words():
+    assert set(_names(_index().search("tr"))) == {"Tricep Pushdown", "Triceps Dip"}
+    assert set(_names(_index().search("d"))) == {"Triceps Dip", "Incline Bench Press"}
+    assert _index().search("  ") == []
+
+
+def test_typos_still_match():
+    assert _names(_index().search("tricep pushdwn"))[0] == "Tricep Pushdown"
+
+
+def test_recent_usage_breaks_ties():
+    usage = {"incline_bench_press": _days_ago(1), "bench_press": _days_ago(60)}
+    assert _names(_index().search("bench", usage=usage))[0] == "Incline Bench Press"
+
+
+def test_cable_usage_counts_under_any_attachment():
+    index = _index()
+    plain = {h["name"]: h["score"] for h in index.search("tricep")}
+    used = {h["name"]: h["score"] for h in index.search("tricep", usage={"tricep_pushdown--rope": _days_ago(0)})}
+    assert used["Tricep Pushdown"] > plain["Tricep Pushdown"]
+    assert used["Triceps Dip"] == plain["Triceps Dip"]
+    rope = {h["name"]: h["score"] for h in index.search("rope", usage={"tricep_pushdown--rope": _days_ago(0)})}
+    assert rope["Rope"] > index.search("rope")[0]["score"]
+
+
+def test_labels():
+    hits = {h["name"]: h for h in _index().search("chest press")}
+    assert search_label(hits["Chest Press"]) == "Chest Press (Hammer) · Machine"
+    assert search_label(_index().search("rope")[0]) == "Rope · attachment"
@@ -0,0 +1,142 @@
+# tests/test_shared_cache.py
+
+import os
+import time
+import pytest
+from google.api_core.exceptions import ServiceUnavailable
+from app.budget import BudgetExceeded, pop_throttled
+from app.resilience import pop_stale
+from app.shared_cache import FileBackend, MemoryBackend, SharedCache
+
+
+@pytest.fixture(params=["memory", "file"])
+def backend(request, tmp_path):
+    return MemoryBackend() if request.param == "memory" else FileBackend(str(tmp_path))
+
+
+def test_get_or_load_caches_until_invalidated(backend):
+    cache = SharedCache(backend, local_ttl=0)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {"rows": len(calls)}
+
+    assert cache.get_or_load("entries/u1", "k", loader, ttl=60) == {"rows": 1}
+    assert cache.get_or_load("entries/u1", "k", loader, ttl=60) == {"rows": 1}
+    assert cache.invalidate("entries/u1") == 1
+    assert cache.get_or_load("entries/u1", "k", loader, ttl=60) == {"rows": 2}
+    assert cache.counters["hits"] == 1 and cache.counters["misses"] == 2
+
+
+def test_values_are_fresh_copies(backend):
+    cache = SharedCache(backend, local_ttl=0)
+    first = cache.get_or_load("catalog", "k", lambda: {"a": [1]}, ttl=60)
+    first["a"].append(2)
+    assert cache.get_or_load("catalog", "k", lambda: None, ttl=60) == {"a": [1]}
+
+
+def test_replicas_share_versions_through_the_backend(tmp_path):
+    one = SharedCache(FileBackend(str(tmp_path)), local_ttl=0)
+    two = SharedCache(FileBackend(str(tmp_path)), local_ttl=0)
+    one.get_or_load("catalog", "k", lambda: "old", ttl=60)
+    assert two.get_or_load("catalog", "k", lambda: "new", ttl=60) == "old"
+    two.invalidate("catalog")
+    assert one.get_or_load("catalog", "k", lambda: "new", ttl=60) == "new"
+
+
+def test_memory_invalidate_drops_superseded_versions():
+    backend = MemoryBackend()
+    cache = SharedCache(backend)
+    for i in range(5):
+        cache.get_or_load("entries/u1", "k", lambda: b"x" * 1000, ttl=3600)
+        cache.get_or_load("entries/u10", "k", lambda: b"y", ttl=3600)
+        cache.invalidate("entries/u1")
+    keys = [k for k in backend._data if k.startswith("tp:val:")]
+    # only u10's value is left: u1's versions went with each invalidate
+    assert keys == ["tp:val:entries/u10:v0:k"]
+
+
+def test_memory_backend_stays_within_its_byte_budget():
+    backend = MemoryBackend(max_bytes=10_000)
+    for i in range(50):
+        backend.set(f"tp:val:ns:v0:{i}", b"x" * 1000, ttl=60)
+    backend.incr("tp:ver:ns")
+    assert backend._bytes <= 10_000
+    assert backend.get("tp:val:ns:v0:49") is not None
+    assert backend.get("tp:val:ns:v0:0") is None
+    assert backend.get("tp:ver:ns") == 1
+
+
+def test_file_backend_sweeps_expired_files(tmp_path):
+    backend = FileBackend(str(tmp_path))
+    backend.set("tp:val:ns:v0:old", b"x", ttl=0.01)
+    backend.set("tp:ver:ns", 3)
+    time.sleep(0.02)
+    assert backend.sweep() == 1
+    assert backend.get("tp:ver:ns") == 3
+    assert len([n for n in os.listdir(tmp_path) if not n.startswith(".")]) == 1
+
+
+def test_ttl_expiry(backend):
+    backend.set("k", b"v", ttl=0.01)
+    assert backend.get("k") == b"v"
+    time.sleep(0.02)
+    assert backend.get("k") is None
+
+
+@pytest.mark.parametrize("error, pop", [
+    (ServiceUnavailable("down"), pop_stale),
+    (BudgetExceeded("read", "user", 30), pop_throttled),
+])
+def test_last_good_copy_served_when_loader_fails(backend, error, pop):
+    cache = SharedCache(backend, local_ttl=0)
+    pop()
+    cache.get_or_load("stats/u1", "k", lambda: ["saved"], ttl=60)
+    cache.invalidate("stats/u1")
+
+    def failing():
+        raise error
+
+    assert cache.get_or_load("stats/u1", "k", failing, ttl=60) == ["saved"]
+    assert pop() == {"stats"}
+    assert cache.counters["stale"] == 1
+
+
+def test_other_errors_and_missing_fallback_propagate(backend):
+    cache = SharedCache(backend, local_ttl=0)
+
+    def failing():
+        raise BudgetExceeded("read", "user", 30)
+
+    with pytest.raises(BudgetExceeded):
+        cache.get_or_load("stats/u2", "k", failing, ttl=60)
+    cache.get_or_load("stats/u2", "k", lambda: 1, ttl=60)
+    cache.invalidate("stats/u2")
+    with pytest.raises(KeyError):
+        cache.get_or_load("stats/u2", "k", lambda: {}["missing"], ttl=60)
+
+
+def test_file_backend_ignores_files_it_didnt_sign(tmp_path):
+    backend = FileBackend(str(tmp_path))
+    backend.set("tp:val:ns:v0:k", b"real", ttl=60)
+    path = backend._path("tp:val:ns:v0:k")
+    with open(path, "r+b") as f:
+        data = f.read()
+        f.seek(0)
+        f.write(data[:-4] + b"fake")
+    assert backend.get("tp:val:ns:v0:k") is None
+    assert FileBackend(str(tmp_path), secret="other").get("tp:ver:ns") is None
+    backend.incr("tp:ver:ns")
+    assert FileBackend(str(tmp_path)).get("tp:ver:ns") == 1
+
+
+def test_file_backend_sweep_reads_only_headers(tmp_path, monkeypatch):
+    backend = FileBackend(str(tmp_path))
+    backend.set("tp:val:ns:v0:k", b"x" * 1000, ttl=60)
+    with open(os.path.join(tmp_path, "0" * 40), "wb") as f:
+        f.write(b"legacy pickle")
+    monkeypatch.setattr("pickle.load", None)
+    monkeypatch.setattr("pickle.loads", None)
+    assert backend.sweep() == 1
+    assert backend.get("tp:val:ns:v0:k") == b"x" * 1000
@@ -0,0 +1,85 @@
+# tests/test_trend.py
+
+import datetime
+import numpy as np
+import pytest
+from app.trend import MAX_PROJECTION_DAYS, MIN_POINTS, TrendCache, fit, project, weigh_ins
+
+
+def _history(n, start=180.0, per_day=-0.1):
+    days = np.arange(19000, 19000 + n, dtype=np.int64)
+    return days, start + per_day * np.arange(n, dtype=np.float64)
+
+
+def test_weigh_ins_drop_blanks_and_keep_each_days_last():
+    days, weights = weigh_ins(["2024-01-02", "2024-01-01", "", "2024-01-02", "2024-01-03", "2024-01-04"],
+                              [181.0, 180.0, 179.0, 182.0, 0, "n/a"])
+    assert (days - days[0]).tolist() == [0, 1]
+    assert weights.tolist() == [180.0, 182.0]
+    days, weights = weigh_ins([], [])
+    assert len(days) == 0 and len(weights) == 0
+
+
+def test_fit_matches_a_plain_ewma_and_slope():
+    days, weights = _history(40)
+    trend = fit(days, weights)
+    e = weights[0]
+    for w in weights[1:]:
+        e = 0.5 ** (1 / 7) * e + (1 - 0.5 ** (1 / 7)) * w
+    assert trend.ewma[-1] == pytest.approx(e)
+    assert trend.rate[-1] == pytest.approx(-0.1)
+    assert np.isnan(trend.rate[MIN_POINTS - 2]) and np.isfinite(trend.rate[MIN_POINTS - 1])
+
+
+def test_fit_extends_the_previous_trend():
+    days, weights = _history(60)
+    full = fit(days, weights)
+    part = fit(days[:35], weights[:35])
+    grown = fit(days, weights, prev=part)
+    np.testing.assert_allclose(grown.ewma, full.ewma)
+    np.testing.assert_allclose(grown.rate, full.rate, equal_nan=True)
+    assert fit(days[:35], weights[:35], prev=part) is part
+    edited = weights.copy()
+    edited[3] += 5
+    np.testing.assert_allclose(fit(days, edited, prev=part).ewma, fit(days, edited).ewma)
+
+
+def test_project_reaches_a_target_in_the_trends_direction():
+    trend = fit(*_history(60))
+    out = project(trend, 170.0)
+    assert out["rate_per_week"] == pytest.approx(-0.7)
+    assert out["date"] == trend.last_date + datetime.timedelta(days=out["days"])
+    assert not out["too_far"]
+
+
+def test_project_flat_rate_gives_no_date():
+    out = project(fit(*_history(60, per_day=0.0)), 170.0)
+    assert out["rate_per_week"] == 0.0 and out["date"] is None
+
+
+def test_project_wrong_direction_gives_no_date():
+    out = project(fit(*_history(60)), 200.0)
+    assert out["date"] is None and not out["too_far"]
+
+
+def test_project_too_far():
+    out = project(fit(*_history(60, per_day=-0.002)), 100.0)
+    assert out["too_far"] and out["date"] is None
+    assert (out["current"] - 100.0) / 0.002 > MAX_PROJECTION_DAYS
+    assert project(fit(*_history(0)), 170.0) is None
+
+
+def test_cache_refits_on_new_versions_and_stays_within_budget():
+    dates = [f"2024-01-{d:02d}" for d in range(1, 29)]
+    weights = [180.0 - d / 10 for d in range(28)]
+    one = fit(*weigh_ins(dates, weights)).nbytes
+    cache = TrendCache(max_bytes=one * 2)
+    first = cache.get("a", "v1", dates, weights)
+    assert cache.get("a", "v1", [], []) is first
+    assert cache.get("a", "v2", dates, weights) is first      # nothing appended
+    cache.get("b", "v1", dates, weights)
+    cache.get("a", "v2", dates, weights)
+    cache.get("c", "v1", dates, weights)
+    assert set(cache._trends) == {"a", "c"}
+    assert cache._bytes <= cache.max_bytes
+    assert cache.counters["evictions"] == 1
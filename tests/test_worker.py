@@ -0,0 +1,80 @@
+# tests/test_worker.py
+
+import datetime
+import json
+import uuid
+import pytest
+from app import worker
+from app.firebase_config import db
+from app.workout_log import WORKOUT_ENCODING, LoggedExercise, WorkoutLog, workout_entries
+
+LEGACY = {"name": "Legs", "start": datetime.datetime(2024, 5, 1, 18, 0), "entries": [
+    {"exercise": "Squat", "sets": 2, "reps": [5, 5], "weights": [100.5, 102.5], "rpe": 8, "notes": "deep"},
+]}
+
+
+@pytest.fixture
+def user():
+    user_ref = db.collection("users").document(uuid.uuid4().hex)
+    log = WorkoutLog.new("Push", datetime.datetime.now() - datetime.timedelta(hours=20))
+    log.exercises.append(LoggedExercise("Bench", reps=[8], weights=[60.0]))
+    user_ref.set({"active_log": log.encode()})
+    user_ref.collection("workouts").document("legacy").set(LEGACY)
+    user_ref.collection("exercise_stats").document("Bench_Press").set({"last_sets": 3})
+    return user_ref
+
+
+def _run(tmp_path, capsys, user_ref, *args):
+    code = worker.main(["--uid", user_ref.id, "--checkpoint", str(tmp_path / "cp.json"), *args])
+    out = capsys.readouterr().out
+    line = next(l for l in out.splitlines() if l.startswith(f"{user_ref.id}: "))
+    return code, json.loads(line.split(": ", 1)[1])
+
+
+def _stats(user_ref):
+    return sorted(d.id for d in user_ref.collection("exercise_stats").stream())
+
+
+def test_defaults_leave_stored_data_alone(tmp_path, capsys, user):
+    code, result = _run(tmp_path, capsys, user, "--workers", "4")
+    assert code == 0
+    assert result["expire"] == {"expired": 1, "saved": 1}
+    assert result["rollup"] == {"weeks": 2}
+    assert "entries" in user.collection("workouts").document("legacy").get().to_dict()
+    assert _stats(user) == ["Bench_Press"]
+    assert not (tmp_path / "cp.json").exists()
+
+
+def test_dry_run_counts_without_writing(tmp_path, capsys, user):
+    code, result = _run(tmp_path, capsys, user, "--tasks", "expire,migrate,compact", "--dry-run")
+    assert code == 0
+    assert result["migrate"]["stats_renamed"] == 1
+    assert result["compact"] == {"workouts_reencoded": 1}
+    assert result["expire"]["expired"] == 1
+    assert user.collection("workouts").document("legacy").get().to_dict()["entries"]
+    assert "active_log" in user.get().to_dict()
+    assert _stats(user) == ["Bench_Press"]
+
+
+def test_dry_run_refuses_tasks_it_cant_count(tmp_path, user):
+    with pytest.raises(SystemExit):
+        worker.main(["--uid", user.id, "--tasks", "archive", "--dry-run"])
+
+
+def test_compact_and_migrate_when_asked(tmp_path, capsys, user):
+    code, result = _run(tmp_path, capsys, user, "--tasks", "migrate,compact")
+    assert code == 0 and result["compact"] == {"workouts_reencoded": 1}
+    doc = user.collection("workouts").document("legacy").get().to_dict()
+    assert doc["enc"] == WORKOUT_ENCODING and "entries" not in doc
+    (entry,) = workout_entries(doc)
+    assert (entry["rpe"], entry["notes"]) == (8, "deep")
+    assert (entry["reps"], entry["weights"]) == ([5, 5], [100.5, 102.5])
+    assert _stats(user) == ["bench_press"]
+
+
+def test_checkpoint_skips_users_already_done(tmp_path, capsys, user):
+    path = tmp_path / "cp.json"
+    worker.save_checkpoint(str(path), list(worker.DEFAULT_TASKS), {user.id}, {})
+    assert worker.main(["--uid", user.id, "--checkpoint", str(path)]) == 0
+    assert "0 users to process (1 already done)" in capsys.readouterr().out
+    assert "active_log" in user.get().to_dict()
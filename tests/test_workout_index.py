@@ -0,0 +1,20 @@
+# tests/test_workout_index.py
+
+import datetime
+import uuid
+from app.firebase_config import db
+from app.workout_index import find_workouts, index_workout, term_labels_cached, unindex_workout
+from app.workout_log import LoggedExercise
+
+
+def test_labels_follow_index_and_unindex():
+    user_ref = db.collection("users").document(uuid.uuid4().hex)
+    start = datetime.datetime(2024, 5, 1, 18, 0)
+    items = [LoggedExercise("Chest Press", brand="Hammer", reps=[10], weights=[50.0])]
+    assert term_labels_cached(user_ref.id) == {}
+    index_workout(db, user_ref, start.isoformat(), start, "Push", items)
+    labels = term_labels_cached(user_ref.id)
+    assert labels["brand:hammer"] == "Brand: Hammer"
+    assert [w["name"] for w in find_workouts(user_ref, "exercise:chest_press")] == ["Push"]
+    unindex_workout(db, user_ref, start.isoformat(), items)
+    assert term_labels_cached(user_ref.id) == {}
@@ -0,0 +1,102 @@
+# tests/test_workout_log.py
+
+import datetime
+import numpy as np
+import pytest
+from app.workout_log import (
+    LOG_VERSION, LoggedExercise, WORKOUT_ENCODING, WorkoutLog, decode_workout_sets, encode_workout_sets,
+    workout_arrays, workout_entries, workout_items,
+)
+
+
+def _bench():
+    return LoggedExercise("Bench Press", brand="Hammer", reps=[10, 8, 6], weights=[47.3, 52.5, 57.7], logged_at=1.5)
+
+
+def _curl():
+    return LoggedExercise("Curl", attachment="Rope", unilateral=True, reps=[12, 10], weights=[20.1, 22.6],
+                          reps_right=[11, 9], weights_right=[20.1, 21.35])
+
+
+def _saved(*items):
+    return {"enc": WORKOUT_ENCODING, "sets": encode_workout_sets(list(items))}
+
+
+def test_sets_round_trip_exactly():
+    doc = _saved(_bench(), _curl())
+    assert workout_items(doc) == [_bench(), _curl()]
+    arr = workout_arrays(doc)
+    assert arr["weights"].tolist() == [47.3, 52.5, 57.7, 20.1, 22.6]
+    assert arr["weights_right"].tolist() == [47.3, 52.5, 57.7, 20.1, 21.35]
+    assert arr["offsets"].tolist() == [0, 3, 5]
+    assert arr["unilateral"].tolist() == [False, True]
+
+
+def test_empty_workout():
+    arr = decode_workout_sets(encode_workout_sets([]))
+    assert arr["names"] == [] and len(arr["reps"]) == 0 and arr["offsets"].tolist() == [0]
+
+
+def test_float32_docs_read_back_without_noise():
+    enc = encode_workout_sets([_bench()])
+    enc["w"] = np.array([47.3, 52.5, 57.7], dtype="<f4").tobytes()
+    enc["wr"] = np.array([], dtype="<f4").tobytes()
+    assert workout_arrays({"enc": 2, "sets": enc})["weights"].tolist() == [47.3, 52.5, 57.7]
+
+
+def test_short_right_side_repeats_the_left():
+    item = LoggedExercise("Row", unilateral=True, reps=[10, 8, 6], weights=[30.0, 35.0, 40.0],
+                          reps_right=[9], weights_right=[])
+    arr = workout_arrays(_saved(item))
+    assert arr["reps_right"].tolist() == [9, 8, 6]
+    assert arr["weights_right"].tolist() == [30.0, 35.0, 40.0]
+    assert [r["right"] for r in item.to_entry()["reps"]] == [9, 8, 6]
+
+
+def test_legacy_entries_keep_every_set():
+    doc = {"entries": [
+        {"exercise": "Squat", "sets": 3, "reps": [5, 5, 5], "weights": [100.5, 102.5]},
+        {"exercise": "Lunge", "sets": 2, "reps": [{"left": 10, "right": 9}, {"left": 8, "right": 8}],
+         "weights": [{"left": 12.3, "right": 12.3}, {"left": 14.1, "right": 14.1}]},
+        {"exercise": "Dip", "sets": 3, "reps": [12], "weights": [0]},
+    ]}
+    squat, lunge, dip = workout_items(doc)
+    assert (squat.reps, squat.weights) == ([5, 5, 5], [100.5, 102.5, 102.5])
+    assert lunge.unilateral and lunge.reps_right == [9, 8] and lunge.weights == [12.3, 14.1]
+    assert dip.reps == [12, 12, 12]
+    arr = workout_arrays(doc)
+    assert arr["sets"].tolist() == [3, 2, 3]
+    assert arr["weights"][:5].tolist() == [100.5, 102.5, 102.5, 12.3, 14.1]
+
+
+@pytest.mark.parametrize("item", [_bench(), _curl()])
+def test_entries_round_trip(item):
+    assert [LoggedExercise.from_entry(e) for e in workout_entries(_saved(item))] == [item]
+
+
+def test_active_log_round_trips():
+    start = datetime.datetime(2024, 5, 1, 18, 0, 0, 123456, tzinfo=datetime.timezone(datetime.timedelta(hours=-4)))
+    log = WorkoutLog.new("Push", start)
+    log.exercises += [_bench(), _curl()]
+    raw = log.encode()
+    assert raw["v"] == LOG_VERSION and raw["tz"] == -4 * 3600
+    back = WorkoutLog.decode(raw)
+    assert back == log
+    assert back.start_dt == start and back.start_dt.isoformat() == start.isoformat()
+    assert "rr" not in raw["ex"][0] and raw["ex"][1]["rr"] == [11, 9]
+
+
+def test_naive_start_stays_naive():
+    start = datetime.datetime(2024, 5, 1, 18, 0)
+    back = WorkoutLog.decode(WorkoutLog.new("Legs", start).encode())
+    assert back.tz is None and back.start_dt == start
+
+
+def test_legacy_list_log_decodes():
+    start = datetime.datetime(2024, 5, 1, 18, 0)
+    raw = [{"name": "Pull", "start": start},
+           {"exercise": "Row", "sets": 2, "reps": [10, 8], "weights": [50.0, 55.0]}, "junk"]
+    log = WorkoutLog.decode(raw)
+    assert (log.name, log.start_dt) == ("Pull", start)
+    assert [(e.exercise, e.reps, e.weights) for e in log.exercises] == [("Row", [10, 8], [50.0, 55.0])]
+    assert WorkoutLog.decode(None) is None and WorkoutLog.decode({"v": 1}) is None